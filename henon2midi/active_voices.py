@@ -0,0 +1,284 @@
+from typing import Any, Callable, Optional
+
+import numpy as np
+from mido import Message
+
+from henon2midi.midi import CONTROL_CHANGE, MIDI_EVENT_DTYPE, NOTE_OFF, NOTE_ON
+
+SUSTAIN_CONTROL = 64
+
+
+def _retime_message(msg: Message, time: int) -> Message:
+    return msg.copy(time=time)
+
+
+def _create_message(status: int, data1: int, data2: int) -> Message:
+    return Message.from_bytes([status, data1, data2])
+
+
+def _retime_packed_event(event: tuple, time: int) -> tuple:
+    return (time, *event[1:])
+
+
+def _create_packed_event(status: int, data1: int, data2: int) -> tuple:
+    return (0, status, data1, data2, 0)
+
+
+# How ActiveVoiceTable changes the delta time of an event and creates the messages it sends itself,
+# for mido messages and for the rows of packed events (see MIDI_EVENT_DTYPE).
+EventCodec = tuple[Callable[[Any, int], Any], Callable[[int, int, int], Any]]
+MESSAGE_CODEC: EventCodec = (_retime_message, _create_message)
+PACKED_EVENT_CODEC: EventCodec = (_retime_packed_event, _create_packed_event)
+
+
+class ActiveVoiceTable:
+    """
+    Tracks which notes are held and sounding on each channel and filters a stream of MIDI messages,
+    suppressing retriggers of notes that are already sounding and stealing the oldest voice once a
+    channel reaches max_polyphony. Notes released while the sustain pedal is down keep sounding
+    until the pedal is lifted.
+    """
+
+    def __init__(
+        self,
+        max_polyphony: Optional[int] = None,
+        suppress_duplicate_notes: bool = True,
+    ):
+        if max_polyphony is not None and max_polyphony < 1:
+            raise ValueError(f"max_polyphony must be at least 1: {max_polyphony}")
+        self.max_polyphony = max_polyphony
+        self.suppress_duplicate_notes = suppress_duplicate_notes
+        self.held = np.zeros((16, 128), dtype=np.int32)
+        self.key_down = np.zeros((16, 128), dtype=bool)
+        self.sounding = np.zeros((16, 128), dtype=bool)
+        self.onset = np.zeros((16, 128), dtype=np.int64)
+        self.voice_counts = np.zeros(16, dtype=np.int32)
+        self.pedal_down = np.zeros(16, dtype=bool)
+        self.stolen_voices = 0
+        self.suppressed_messages = 0
+        self._onset_counter = 0
+        self._pending_time = 0
+
+    def process(self, messages: list[Message]) -> list[Message]:
+        """
+        Returns the messages that should actually be sent. The delta time of any dropped message is
+        carried onto the next message that is sent, including across calls.
+        """
+        output: list[Message] = []
+        for msg in messages:
+            if msg.type == "note_on":
+                status = NOTE_ON | msg.channel
+                self._process_event(
+                    msg, msg.time, status, msg.note, msg.velocity, output, MESSAGE_CODEC
+                )
+            elif msg.type == "note_off":
+                status = NOTE_OFF | msg.channel
+                self._process_event(
+                    msg, msg.time, status, msg.note, msg.velocity, output, MESSAGE_CODEC
+                )
+            elif msg.type == "control_change":
+                status = CONTROL_CHANGE | msg.channel
+                self._process_event(
+                    msg, msg.time, status, msg.control, msg.value, output, MESSAGE_CODEC
+                )
+            else:
+                self._emit(msg, msg.time, output, MESSAGE_CODEC)
+        return output
+
+    def process_events(self, events: np.ndarray) -> np.ndarray:
+        """
+        process for packed MIDI events (see MIDI_EVENT_DTYPE), without creating any messages.
+        """
+        output: list[tuple] = []
+        for event in events.tolist():
+            self._process_event(
+                event,
+                event[0],
+                event[1],
+                event[2],
+                event[3],
+                output,
+                PACKED_EVENT_CODEC,
+            )
+        return np.array(output, dtype=MIDI_EVENT_DTYPE)
+
+    def release_all(self) -> list[Message]:
+        """
+        Returns note offs for every key still down and clears the table.
+        """
+        return self._release_all(MESSAGE_CODEC)
+
+    def release_all_events(self) -> np.ndarray:
+        """
+        release_all as packed MIDI events.
+        """
+        return np.array(self._release_all(PACKED_EVENT_CODEC), dtype=MIDI_EVENT_DTYPE)
+
+    def get_state(self) -> dict:
+        """
+        Returns the table as plain values, see set_state.
+        """
+        return {
+            "held": self.held.tolist(),
+            "key_down": self.key_down.tolist(),
+            "sounding": self.sounding.tolist(),
+            "onset": self.onset.tolist(),
+            "voice_counts": self.voice_counts.tolist(),
+            "pedal_down": self.pedal_down.tolist(),
+            "stolen_voices": self.stolen_voices,
+            "suppressed_messages": self.suppressed_messages,
+            "onset_counter": self._onset_counter,
+            "pending_time": self._pending_time,
+        }
+
+    def set_state(self, state: dict):
+        self.held[:] = state["held"]
+        self.key_down[:] = state["key_down"]
+        self.sounding[:] = state["sounding"]
+        self.onset[:] = state["onset"]
+        self.voice_counts[:] = state["voice_counts"]
+        self.pedal_down[:] = state["pedal_down"]
+        self.stolen_voices = state["stolen_voices"]
+        self.suppressed_messages = state["suppressed_messages"]
+        self._onset_counter = state["onset_counter"]
+        self._pending_time = state["pending_time"]
+
+    def clear(self):
+        self.held[:] = 0
+        self.key_down[:] = False
+        self.sounding[:] = False
+        self.voice_counts[:] = 0
+        self.pedal_down[:] = False
+        self._pending_time = 0
+
+    def _release_all(self, codec: EventCodec) -> list:
+        output: list = []
+        for channel, note in zip(*np.nonzero(self.key_down)):
+            self._emit(
+                codec[1](NOTE_OFF | int(channel), int(note), 0), 0, output, codec
+            )
+        self.clear()
+        return output
+
+    def _process_event(
+        self,
+        event: Any,
+        time: int,
+        status: int,
+        data1: int,
+        data2: int,
+        output: list,
+        codec: EventCodec,
+    ):
+        """
+        Handles event, whose delta time is time, by its status and data bytes.
+        """
+        message_type = status & 0xF0
+        if message_type == NOTE_ON and data2 > 0:
+            self._note_on(event, time, status & 0x0F, data1, output, codec)
+        elif message_type == NOTE_ON or message_type == NOTE_OFF:
+            self._note_off(event, time, status & 0x0F, data1, output, codec)
+        elif message_type == CONTROL_CHANGE and data1 == SUSTAIN_CONTROL:
+            self._sustain(status & 0x0F, data2)
+            self._emit(event, time, output, codec)
+        else:
+            self._emit(event, time, output, codec)
+
+    def _emit(self, event: Any, time: int, output: list, codec: EventCodec):
+        if self._pending_time:
+            event = codec[0](event, time + self._pending_time)
+            self._pending_time = 0
+        output.append(event)
+
+    def _drop(self, time: int):
+        self._pending_time += time
+        self.suppressed_messages += 1
+
+    def _note_on(
+        self,
+        event: Any,
+        time: int,
+        channel: int,
+        note: int,
+        output: list,
+        codec: EventCodec,
+    ):
+        self.held[channel, note] += 1
+        if self.sounding[channel, note]:
+            if self.suppress_duplicate_notes:
+                self._drop(time)
+                return
+        else:
+            if (
+                self.max_polyphony is not None
+                and self.voice_counts[channel] >= self.max_polyphony
+            ):
+                self._pending_time += time
+                event = codec[0](event, 0)
+                time = 0
+                self._steal_oldest_voice(channel, output, codec)
+            self.sounding[channel, note] = True
+            self.voice_counts[channel] += 1
+        self.key_down[channel, note] = True
+        self._onset_counter += 1
+        self.onset[channel, note] = self._onset_counter
+        self._emit(event, time, output, codec)
+
+    def _note_off(
+        self,
+        event: Any,
+        time: int,
+        channel: int,
+        note: int,
+        output: list,
+        codec: EventCodec,
+    ):
+        if self.held[channel, note] == 0:
+            self._drop(time)
+            return
+        self.held[channel, note] -= 1
+        if self.held[channel, note] > 0 or not self.key_down[channel, note]:
+            self._drop(time)
+            return
+        self.key_down[channel, note] = False
+        if not self.pedal_down[channel]:
+            self._release(channel, note)
+        self._emit(event, time, output, codec)
+
+    def _sustain(self, channel: int, value: int):
+        self.pedal_down[channel] = value >= 64
+        if not self.pedal_down[channel]:
+            for note in np.nonzero(self.sounding[channel] & ~self.key_down[channel])[0]:
+                self._release(channel, int(note))
+
+    def _release(self, channel: int, note: int):
+        if self.sounding[channel, note]:
+            self.sounding[channel, note] = False
+            self.voice_counts[channel] -= 1
+
+    def _steal_oldest_voice(self, channel: int, output: list, codec: EventCodec):
+        onsets = np.where(
+            self.sounding[channel], self.onset[channel], np.iinfo(np.int64).max
+        )
+        note = int(np.argmin(onsets))
+        if self.key_down[channel, note]:
+            self._emit(codec[1](NOTE_OFF | channel, note, 0), 0, output, codec)
+        self.key_down[channel, note] = False
+        self.held[channel, note] = 0
+        if self.pedal_down[channel]:
+            # The stolen voice is held by the pedal, which only lets it go when lifted, so the pedal
+            # is lifted and pressed again. That also stops the other voices only the pedal holds.
+            for value in (0, 127):
+                self._emit(
+                    codec[1](CONTROL_CHANGE | channel, SUSTAIN_CONTROL, value),
+                    0,
+                    output,
+                    codec,
+                )
+            for released_note in np.nonzero(
+                self.sounding[channel] & ~self.key_down[channel]
+            )[0]:
+                self._release(channel, int(released_note))
+        else:
+            self._release(channel, note)
+        self.stolen_voices += 1
@@ -1,6 +1,24 @@
 import random
+import shutil
+import threading
+from time import time
+from typing import Callable, Optional
 
-from henon2midi.math import rescale_number_to_range
+import numpy as np
+
+from henon2midi.henon_equations import HenonDataBatch
+from henon2midi.math import get_range_mapper
+
+# The range of frame rates of an AsciiArtVisualizer that paces itself.
+MIN_ADAPTIVE_FPS = 2.0
+MAX_ADAPTIVE_FPS = 30.0
+# The share of its time a self pacing AsciiArtVisualizer spends rendering frames.
+ADAPTIVE_FRAME_BUDGET = 0.2
+# Weight of the latest frame in the smoothed frame time.
+FRAME_TIME_SMOOTHING = 0.2
+MIN_CANVAS_SIZE = (16, 8)
+# The number of lines of the state shown above the canvas.
+STATE_LINES = 5
 
 
 class AsciiArtCanvas:
@@ -34,8 +52,12 @@ class AsciiArtCanvas:
         self.canvas = [[" " for _ in range(width)] for _ in range(height)]
 
     def draw_point(self, x: int, y: int, character: str = "X"):
+        """
+        Draws character at column x and row y, counted down from the top row, the coordinates
+        returned by canvas_coordinates_from_data_values.
+        """
         color_escape_code = self.COLORS[self.current_color]
-        self.canvas[-y][x] = color_escape_code + character
+        self.canvas[y][x] = color_escape_code + character
 
     def set_color(self, color: str):
         if color == "random":
@@ -74,24 +96,212 @@ def draw_data_point_on_canvas(
         ascii_art_canvas.clear()
     if is_new_orbit:
         ascii_art_canvas.set_color("next")
-    try:
-        x_canvas_coord = round(
-            rescale_number_to_range(
-                x,
-                (-1.0, 1.0),
-                (0, ascii_art_canvas.width - 1),
-                clip_value=clip,
-            )
+    x_canvas_coords, y_canvas_coords, drawn = canvas_coordinates_from_data_values(
+        np.array([x]),
+        np.array([y]),
+        ascii_art_canvas.width,
+        ascii_art_canvas.height,
+        clip=clip,
+    )
+    if drawn[0]:
+        ascii_art_canvas.draw_point(
+            int(x_canvas_coords[0]), int(y_canvas_coords[0]), character
         )
-        y_canvas_coord = round(
-            rescale_number_to_range(
-                y,
-                (-1.0, 1.0),
-                (0, ascii_art_canvas.height - 1),
-                clip_value=clip,
+
+
+def canvas_coordinates_from_data_values(
+    x: np.ndarray,
+    y: np.ndarray,
+    width: int,
+    height: int,
+    clip: bool = False,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Maps arrays of data values onto integer canvas coordinates, the column and the row counted down
+    from the top row so that increasing y is drawn upwards, also returning a mask of the points
+    that are drawn. Both the ASCII art canvas and the density image are drawn with these.
+    """
+    range_mapper_mode = "clip" if clip else "mask"
+    x_canvas_coords, x_valid = get_range_mapper(
+        (-1.0, 1.0), (0, width - 1), range_mapper_mode
+    ).rescale_array(x)
+    y_canvas_coords, y_valid = get_range_mapper(
+        (-1.0, 1.0), (0, height - 1), range_mapper_mode
+    ).rescale_array(y)
+    drawn = np.isfinite(x_canvas_coords) & np.isfinite(y_canvas_coords)
+    if not clip:
+        drawn &= x_valid & y_valid
+    return (
+        np.round(np.where(drawn, x_canvas_coords, 0)).astype(np.int64),
+        height - 1 - np.round(np.where(drawn, y_canvas_coords, 0)).astype(np.int64),
+        drawn,
+    )
+
+
+def draw_data_batch_on_canvas(
+    batch: HenonDataBatch,
+    ascii_art_canvas: AsciiArtCanvas,
+    clip: bool = False,
+    character: str = "█",
+):
+    x_canvas_coords, y_canvas_coords, drawn = canvas_coordinates_from_data_values(
+        batch.x, batch.y, ascii_art_canvas.width, ascii_art_canvas.height, clip=clip
+    )
+
+    for (
+        x_canvas_coord,
+        y_canvas_coord,
+        is_drawn,
+        is_new_orbit,
+        current_iteration,
+    ) in zip(
+        x_canvas_coords.tolist(),
+        y_canvas_coords.tolist(),
+        drawn.tolist(),
+        batch.new_orbit.tolist(),
+        batch.iteration.tolist(),
+    ):
+        if current_iteration == 1:
+            ascii_art_canvas.clear()
+        if is_new_orbit:
+            ascii_art_canvas.set_color("next")
+        if is_drawn:
+            ascii_art_canvas.draw_point(x_canvas_coord, y_canvas_coord, character)
+
+
+class AsciiArtVisualizer:
+    """
+    Draws the data points played by the live loop, and the current state, on its own thread. The
+    live loop calls show with each batch before playing from it and play with the position in it of
+    each data point it plays, neither of which waits for drawing. Every played point is drawn onto
+    the canvas, but frames are only rendered at fps, or when fps is None at a rate that keeps
+    rendering within ADAPTIVE_FRAME_BUDGET of the time, so frames in between are dropped rather than
+    slowing the loop down. The canvas fills the terminal below reserved_lines unless size is given.
+    refresh_screen is called with the state and art strings of each frame.
+    """
+
+    def __init__(
+        self,
+        refresh_screen: Callable[[str, str], None],
+        draw_art: bool = True,
+        fps: Optional[float] = None,
+        size: Optional[tuple[int, int]] = None,
+        reserved_lines: int = 0,
+        clip: bool = False,
+    ):
+        if fps is not None and fps <= 0:
+            raise ValueError(f"fps must be positive: {fps}")
+        self.refresh_screen = refresh_screen
+        self.draw_art = draw_art
+        self.fps = fps
+        self.size = size
+        self.reserved_lines = reserved_lines
+        self.clip = clip
+        self.frames = 0
+        self.points_drawn = 0
+        self.frame_time_s = 0.0
+        self.frame_interval_s = 1 / (fps or MAX_ADAPTIVE_FPS)
+        self.error: Optional[BaseException] = None
+        self.canvas: Optional[AsciiArtCanvas] = None
+        # The batches shown and not yet drawn to the end, as lists of the batch, the end of the
+        # points played from it once the next batch is shown, and the end of the points drawn.
+        self._batches: list[list] = []
+        self._played = -1
+        self._latest_point: Optional[tuple[HenonDataBatch, int]] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def show(self, batch: HenonDataBatch):
+        with self._lock:
+            if self._batches:
+                self._batches[-1][1] = self._played + 1
+            self._batches.append([batch, None, 0])
+            self._played = -1
+
+    def play(self, position: int):
+        self._played = position
+
+    def close(self):
+        """
+        Renders a last frame and stops the thread.
+        """
+        self._stop.set()
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def canvas_size(self) -> tuple[int, int]:
+        if self.size is not None:
+            return self.size
+        columns, lines = shutil.get_terminal_size()
+        return (
+            max(columns - 1, MIN_CANVAS_SIZE[0]),
+            max(lines - self.reserved_lines - STATE_LINES - 1, MIN_CANVAS_SIZE[1]),
+        )
+
+    def _run(self):
+        next_frame_time = time()
+        while True:
+            stopping = self._stop.wait(max(next_frame_time - time(), 0))
+            frame_start_time = time()
+            try:
+                self._render_frame()
+            except BaseException as e:
+                self.error = e
+                return
+            frame_time_s = time() - frame_start_time
+            self.frame_time_s += FRAME_TIME_SMOOTHING * (
+                frame_time_s - self.frame_time_s
+            )
+            if self.fps is None:
+                self.frame_interval_s = min(
+                    max(
+                        self.frame_time_s / ADAPTIVE_FRAME_BUDGET, 1 / MAX_ADAPTIVE_FPS
+                    ),
+                    1 / MIN_ADAPTIVE_FPS,
+                )
+            next_frame_time = frame_start_time + self.frame_interval_s
+            if stopping:
+                return
+
+    def _render_frame(self):
+        width, height = self.canvas_size()
+        if self.canvas is None or (self.canvas.width, self.canvas.height) != (
+            width,
+            height,
+        ):
+            self.canvas = AsciiArtCanvas(width, height)
+        with self._lock:
+            batches = [
+                (entry, self._played + 1 if entry[1] is None else entry[1])
+                for entry in self._batches
+            ]
+            self._batches = [entry for entry in self._batches if entry[1] is None]
+        for entry, end in batches:
+            batch, _, drawn = entry
+            if end <= drawn:
+                continue
+            if self.draw_art:
+                draw_data_batch_on_canvas(batch[drawn:end], self.canvas, clip=self.clip)
+            self.points_drawn += end - drawn
+            entry[2] = end
+            self._latest_point = (batch, end - 1)
+
+        state_string = ""
+        if self._latest_point is not None:
+            batch, position = self._latest_point
+            state_string = (
+                f"Current iteration: {batch.iteration[position]}\n"
+                f"Current orbit: {batch.orbit[position]}\n"
+                f"Current data point: {(float(batch.x[position]), float(batch.y[position]))}\n"
             )
+        state_string += (
+            f"Display: {1 / self.frame_interval_s:.1f} frames per second, "
+            f"{self.frame_time_s * 1000:.1f} ms per frame\n\n"
+        )
+        self.refresh_screen(
+            state_string, self.canvas.generate_string() if self.draw_art else ""
         )
-    except ValueError:
-        pass
-    else:
-        ascii_art_canvas.draw_point(x_canvas_coord, y_canvas_coord, character)
+        self.frames += 1
@@ -0,0 +1,243 @@
+import wave
+from typing import Optional
+
+import numpy as np
+from mido import MidiFile, merge_tracks
+
+from henon2midi.active_voices import SUSTAIN_CONTROL
+from henon2midi.midi import DEFAULT_TEMPO
+
+DEFAULT_SAMPLE_RATE = 44100
+DEFAULT_BLOCK_SIZE = 1024
+WAVEFORMS = ("sine", "saw", "square", "triangle")
+# A voice stolen for a new note fades out over this long rather than stopping mid-cycle.
+STOLEN_VOICE_RELEASE_SECONDS = 0.005
+
+
+class _Voice:
+    def __init__(self, note: int, velocity: int, start: int, release_samples: int):
+        self.note = note
+        self.velocity = velocity
+        self.start = start
+        self.release: Optional[float] = None
+        self.release_samples = release_samples
+        self.sustained = False
+        self.stolen = False
+
+
+class BlockSynthesizer:
+    """
+    A lightweight polyphonic synthesizer rendering one fixed size block of samples at a time, so memory
+    use depends only on the block size and the number of voices. Voices start and release on exact
+    sample positions within a block, with linear attack and release envelopes. Once max_voices are
+    playing, each new note steals the quietest voice, which fades out over
+    STOLEN_VOICE_RELEASE_SECONDS.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = DEFAULT_SAMPLE_RATE,
+        waveform: str = "sine",
+        attack_seconds: float = 0.005,
+        release_seconds: float = 0.05,
+        max_voices: int = 64,
+        gain: float = 0.2,
+    ):
+        if waveform not in WAVEFORMS:
+            raise ValueError(f"Unknown waveform: {waveform}")
+        self.sample_rate = sample_rate
+        self.waveform = waveform
+        self.attack_samples = max(1, round(attack_seconds * sample_rate))
+        self.release_samples = max(1, round(release_seconds * sample_rate))
+        self.stolen_release_samples = max(
+            1, round(STOLEN_VOICE_RELEASE_SECONDS * sample_rate)
+        )
+        self.max_voices = max_voices
+        self.gain = gain
+        self.voices: list[_Voice] = []
+        self.pedal_down = False
+
+    def note_on(self, note: int, velocity: int, sample: int):
+        playing_voices = [voice for voice in self.voices if not voice.stolen]
+        if len(playing_voices) >= self.max_voices:
+            self._steal_voice(playing_voices, sample)
+        self.voices.append(_Voice(note, velocity, sample, self.release_samples))
+
+    def _steal_voice(self, playing_voices: list[_Voice], sample: int):
+        """
+        Fades out the quietest of playing_voices at sample, the oldest of equally quiet ones, from
+        its current level so that it does not click. A silent voice is dropped at once.
+        """
+        levels = [
+            voice.velocity
+            * self._attack_level(voice, sample)
+            * self._release_level(voice, sample)
+            for voice in playing_voices
+        ]
+        quietest_level = min(levels)
+        voice = playing_voices[levels.index(quietest_level)]
+        if quietest_level == 0:
+            self.voices.remove(voice)
+            return
+        release_level = self._release_level(voice, sample)
+        voice.stolen = True
+        voice.sustained = False
+        voice.release_samples = self.stolen_release_samples
+        voice.release = sample - (1.0 - release_level) * self.stolen_release_samples
+
+    def _attack_level(self, voice: _Voice, sample: int) -> float:
+        return min(max((sample - voice.start) / self.attack_samples, 0.0), 1.0)
+
+    def _release_level(self, voice: _Voice, sample: int) -> float:
+        if voice.release is None:
+            return 1.0
+        return min(
+            max(1.0 - (sample - voice.release) / voice.release_samples, 0.0), 1.0
+        )
+
+    def note_off(self, note: int, sample: int):
+        for voice in self.voices:
+            if voice.note == note and voice.release is None and not voice.sustained:
+                if self.pedal_down:
+                    voice.sustained = True
+                else:
+                    voice.release = sample
+                return
+
+    def sustain(self, pedal_down: bool, sample: int):
+        self.pedal_down = pedal_down
+        if not pedal_down:
+            for voice in self.voices:
+                if voice.sustained:
+                    voice.sustained = False
+                    voice.release = sample
+
+    def is_silent(self) -> bool:
+        return len(self.voices) == 0
+
+    def render_block(self, block_start: int, block_size: int) -> np.ndarray:
+        block_end = block_start + block_size
+        voices = [voice for voice in self.voices if voice.start < block_end]
+        if not voices:
+            return np.zeros(block_size)
+
+        starts = np.array([voice.start for voice in voices], dtype=np.int64)
+        releases = np.array(
+            [np.inf if voice.release is None else voice.release for voice in voices]
+        )
+        release_lengths = np.array([voice.release_samples for voice in voices])
+        notes = np.array([voice.note for voice in voices])
+        cycles_per_sample = 440.0 * 2.0 ** ((notes - 69) / 12) / self.sample_rate
+        amplitudes = np.array([voice.velocity for voice in voices]) / 127 * self.gain
+
+        # Phases are computed in float64 at the start of the block and advanced in float32 within it,
+        # keeping precision for long renders.
+        block_offsets = np.arange(block_size, dtype=np.float32)
+        start_phases = ((block_start - starts) * cycles_per_sample) % 1.0
+        cycles = start_phases.astype(np.float32)[:, np.newaxis] + (
+            block_offsets[np.newaxis, :]
+            * cycles_per_sample.astype(np.float32)[:, np.newaxis]
+        )
+        voice_samples = self._oscillator(cycles)
+
+        in_envelope = (starts + self.attack_samples > block_start) | (
+            releases < block_end
+        )
+        if in_envelope.any():
+            samples = np.arange(block_start, block_end)
+            samples_since_start = samples - starts[in_envelope, np.newaxis]
+            samples_since_release = samples - releases[in_envelope, np.newaxis]
+            envelope = np.clip(samples_since_start / self.attack_samples, 0.0, 1.0)
+            envelope *= np.clip(
+                1.0 - samples_since_release / release_lengths[in_envelope, np.newaxis],
+                0.0,
+                1.0,
+            )
+            voice_samples[in_envelope] *= envelope.astype(np.float32)
+
+        mix = amplitudes.astype(np.float32) @ voice_samples
+
+        self.voices = [
+            voice
+            for voice in self.voices
+            if voice.release is None
+            or voice.release + voice.release_samples > block_end
+        ]
+        return mix
+
+    def _oscillator(self, cycles: np.ndarray) -> np.ndarray:
+        if self.waveform == "sine":
+            return np.sin(np.float32(2 * np.pi) * cycles)
+        phase = cycles % np.float32(1.0)
+        if self.waveform == "saw":
+            return np.float32(2.0) * phase - np.float32(1.0)
+        if self.waveform == "square":
+            return np.where(phase < 0.5, np.float32(1.0), np.float32(-1.0))
+        return np.float32(1.0) - np.float32(4.0) * np.abs(phase - np.float32(0.5))
+
+
+def render_midi_file_to_wav(
+    mid: MidiFile,
+    path: str,
+    sample_rate: int = DEFAULT_SAMPLE_RATE,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    waveform: str = "sine",
+    attack_seconds: float = 0.005,
+    release_seconds: float = 0.05,
+    max_voices: int = 64,
+) -> int:
+    """
+    Renders a MIDI file to a mono 16 bit WAV file with BlockSynthesizer, writing each block as it is
+    rendered. Returns the number of samples written.
+    """
+    synthesizer = BlockSynthesizer(
+        sample_rate=sample_rate,
+        waveform=waveform,
+        attack_seconds=attack_seconds,
+        release_seconds=release_seconds,
+        max_voices=max_voices,
+    )
+    tempo = DEFAULT_TEMPO
+    seconds = 0.0
+    block_start = 0
+
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+
+        def write_blocks_until(sample: int):
+            nonlocal block_start
+            while block_start + block_size <= sample:
+                mix = synthesizer.render_block(block_start, block_size)
+                wav_file.writeframes(_to_pcm(mix))
+                block_start += block_size
+
+        for msg in merge_tracks(mid.tracks):
+            seconds += msg.time * tempo * 1e-6 / mid.ticks_per_beat
+            sample = round(seconds * sample_rate)
+            write_blocks_until(sample)
+            if msg.type == "set_tempo":
+                tempo = msg.tempo
+            elif msg.type == "note_on" and msg.velocity > 0:
+                synthesizer.note_on(msg.note, msg.velocity, sample)
+            elif msg.type == "note_off" or msg.type == "note_on":
+                synthesizer.note_off(msg.note, sample)
+            elif msg.type == "control_change" and msg.control == SUSTAIN_CONTROL:
+                synthesizer.sustain(msg.value >= 64, sample)
+
+        end_sample = round(seconds * sample_rate)
+        synthesizer.sustain(False, end_sample)
+        for voice in synthesizer.voices:
+            if voice.release is None:
+                voice.release = end_sample
+        while not synthesizer.is_silent() or block_start < end_sample:
+            mix = synthesizer.render_block(block_start, block_size)
+            wav_file.writeframes(_to_pcm(mix))
+            block_start += block_size
+
+    return block_start
+
+
+def _to_pcm(mix: np.ndarray) -> bytes:
+    return (np.tanh(mix) * 32767).astype("<i2").tobytes()
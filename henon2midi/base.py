@@ -1,13 +1,19 @@
-from mido import Message, MidiFile
+from typing import Generator, Optional
 
-from henon2midi.data_point_to_midi_conversion import (
-    create_midi_messages_from_data_point,
+import numpy as np
+from mido import Message, MetaMessage, MidiFile
+
+from henon2midi.henon_equations import (
+    HenonDataBatch,
+    RadiallyExpandingHenonMappingsGenerator,
 )
-from henon2midi.henon_equations import RadiallyExpandingHenonMappingsGenerator
 from henon2midi.midi import create_midi_file_from_messages
+from henon2midi.midi_file import format_orbit_marker
+from henon2midi.point_stream import PointStreamWriter
+from henon2midi.render_plan import RenderPlan, compile_render_plan
 
 
-def create_midi_file_from_data_generator(
+def generate_midi_messages_from_data_generator(
     henon_midi_generator: RadiallyExpandingHenonMappingsGenerator,
     ticks_per_beat: int = 960,
     bpm: int = 120,
@@ -22,29 +28,194 @@ def create_midi_file_from_data_generator(
     midi_range_y: tuple[int, int] = (0, 127),
     default_note: int = 64,
     default_velocity: int = 64,
-) -> MidiFile:
-    messages = []
-    if sustain:
+    *,
+    max_polyphony: Optional[int] = None,
+    suppress_duplicate_notes: bool = False,
+    scale: str = "chromatic",
+    key: str = "C",
+    duration_grid_ticks: Optional[int] = None,
+    duration_mode: str = "fixed",
+    min_duration_ticks: int = 60,
+    max_duration_ticks: int = 960,
+    articulation: float = 1.0,
+    merge_rests: bool = False,
+    orbit_markers: bool = False,
+    point_stream_writer: Optional[PointStreamWriter] = None,
+) -> Generator[tuple[list[Message], bool], None, None]:
+    """
+    Yields the MIDI messages of each data point of the generator as they are created, alongside
+    whether the data point starts a new orbit, so arbitrarily long renders can be streamed. The
+    last messages are the end of track, after the rest following the last data point.
+    The settings are compiled into a RenderPlan, see compile_render_plan, before anything is
+    rendered.
+    """
+    render_plan = compile_render_plan(
+        {
+            "ticks_per_beat": ticks_per_beat,
+            "bpm": bpm,
+            "notes_per_beat": notes_per_beat,
+            "sustain": sustain,
+            "clip": clip,
+            "x_midi_parameter_mappings": x_midi_parameter_mappings_set,
+            "y_midi_parameter_mappings": y_midi_parameter_mappings_set,
+            "source_range_x": source_range_x,
+            "source_range_y": source_range_y,
+            "midi_range_x": midi_range_x,
+            "midi_range_y": midi_range_y,
+            "default_note": default_note,
+            "default_velocity": default_velocity,
+            "max_polyphony": max_polyphony,
+            "suppress_duplicate_notes": suppress_duplicate_notes,
+            "scale": scale,
+            "key": key,
+            "duration_grid_ticks": duration_grid_ticks,
+            "duration_mode": duration_mode,
+            "min_duration_ticks": min_duration_ticks,
+            "max_duration_ticks": max_duration_ticks,
+            "articulation": articulation,
+            "merge_rests": merge_rests,
+            "orbit_markers": orbit_markers,
+        }
+    )
+    yield from generate_midi_messages_from_render_plan(
+        henon_midi_generator, render_plan, point_stream_writer=point_stream_writer
+    )
+
+
+def generate_midi_messages_from_render_plan(
+    henon_midi_generator: RadiallyExpandingHenonMappingsGenerator,
+    render_plan: RenderPlan,
+    point_stream_writer: Optional[PointStreamWriter] = None,
+) -> Generator[tuple[list[Message], bool], None, None]:
+    """
+    generate_midi_messages_from_data_generator with the settings of a compiled RenderPlan.
+    """
+    data_points_to_midi_converter = render_plan.create_converter()
+    active_voice_table = render_plan.create_active_voice_table()
+    if render_plan.sustain:
         sustain_on_msg = Message(
             "control_change",
             control=64,
             value=127,
         )
-        messages.append(sustain_on_msg)
-    for datapoint in henon_midi_generator:
-        messages.extend(
-            create_midi_messages_from_data_point(
-                datapoint,
-                duration_ticks=int(ticks_per_beat / notes_per_beat),
-                clip=clip,
-                x_midi_parameter_mappings=x_midi_parameter_mappings_set,
-                y_midi_parameter_mappings=y_midi_parameter_mappings_set,
-                source_range_x=source_range_x,
-                source_range_y=source_range_y,
-                midi_range_x=midi_range_x,
-                midi_range_y=midi_range_y,
-                default_note=default_note,
-                default_velocity=default_velocity,
-            )
+        if active_voice_table is not None:
+            yield active_voice_table.process([sustain_on_msg]), False
+        else:
+            yield [sustain_on_msg], False
+    while True:
+        batch = henon_midi_generator.next_batch()
+        if len(batch) == 0:
+            break
+        if point_stream_writer is not None:
+            point_stream_writer.write_batch(batch)
+        data_points_messages = data_points_to_midi_converter.convert(batch.x, batch.y)
+        if render_plan.orbit_markers:
+            add_orbit_markers(data_points_messages, batch)
+        for data_point_messages, is_new_orbit in zip(
+            data_points_messages, batch.new_orbit.tolist()
+        ):
+            if active_voice_table is not None:
+                data_point_messages = active_voice_table.process(data_point_messages)
+            yield data_point_messages, is_new_orbit
+    if active_voice_table is not None:
+        yield active_voice_table.release_all(), False
+    yield [
+        MetaMessage("end_of_track", time=data_points_to_midi_converter.flush())
+    ], False
+
+
+def create_midi_file_from_data_generator(
+    henon_midi_generator: RadiallyExpandingHenonMappingsGenerator,
+    ticks_per_beat: int = 960,
+    bpm: int = 120,
+    notes_per_beat: int = 4,
+    sustain: bool = False,
+    clip: bool = False,
+    x_midi_parameter_mappings_set: set[str] = {"note"},
+    y_midi_parameter_mappings_set: set[str] = {"velocity"},
+    source_range_x: tuple[float, float] = (-1.0, 1.0),
+    source_range_y: tuple[float, float] = (-1.0, 1.0),
+    midi_range_x: tuple[int, int] = (0, 127),
+    midi_range_y: tuple[int, int] = (0, 127),
+    default_note: int = 64,
+    default_velocity: int = 64,
+    *,
+    max_polyphony: Optional[int] = None,
+    suppress_duplicate_notes: bool = False,
+    scale: str = "chromatic",
+    key: str = "C",
+    duration_grid_ticks: Optional[int] = None,
+    duration_mode: str = "fixed",
+    min_duration_ticks: int = 60,
+    max_duration_ticks: int = 960,
+    articulation: float = 1.0,
+    merge_rests: bool = False,
+    orbit_markers: bool = False,
+    point_stream_writer: Optional[PointStreamWriter] = None,
+) -> MidiFile:
+    render_plan = compile_render_plan(
+        {
+            "ticks_per_beat": ticks_per_beat,
+            "bpm": bpm,
+            "notes_per_beat": notes_per_beat,
+            "sustain": sustain,
+            "clip": clip,
+            "x_midi_parameter_mappings": x_midi_parameter_mappings_set,
+            "y_midi_parameter_mappings": y_midi_parameter_mappings_set,
+            "source_range_x": source_range_x,
+            "source_range_y": source_range_y,
+            "midi_range_x": midi_range_x,
+            "midi_range_y": midi_range_y,
+            "default_note": default_note,
+            "default_velocity": default_velocity,
+            "max_polyphony": max_polyphony,
+            "suppress_duplicate_notes": suppress_duplicate_notes,
+            "scale": scale,
+            "key": key,
+            "duration_grid_ticks": duration_grid_ticks,
+            "duration_mode": duration_mode,
+            "min_duration_ticks": min_duration_ticks,
+            "max_duration_ticks": max_duration_ticks,
+            "articulation": articulation,
+            "merge_rests": merge_rests,
+            "orbit_markers": orbit_markers,
+        }
+    )
+    return create_midi_file_from_render_plan(
+        henon_midi_generator, render_plan, point_stream_writer=point_stream_writer
+    )
+
+
+def create_midi_file_from_render_plan(
+    henon_midi_generator: RadiallyExpandingHenonMappingsGenerator,
+    render_plan: RenderPlan,
+    point_stream_writer: Optional[PointStreamWriter] = None,
+) -> MidiFile:
+    messages = []
+    for data_point_messages, _ in generate_midi_messages_from_render_plan(
+        henon_midi_generator, render_plan, point_stream_writer=point_stream_writer
+    ):
+        messages.extend(data_point_messages)
+    return create_midi_file_from_messages(
+        messages, render_plan.ticks_per_beat, render_plan.bpm
+    )
+
+
+def add_orbit_markers(data_points_messages: list[list], batch: HenonDataBatch):
+    """
+    Inserts a marker carrying the orbit index and radius (see format_orbit_marker) at the start of the
+    messages of the first data point of each orbit in batch, at the same tick as its first message.
+    """
+    assert batch.radius is not None
+    for index in np.flatnonzero(batch.new_orbit).tolist():
+        data_point_messages = data_points_messages[index]
+        marker = MetaMessage(
+            "marker",
+            text=format_orbit_marker(
+                int(batch.orbit[index]), float(batch.radius[index])
+            ),
         )
-    return create_midi_file_from_messages(messages, ticks_per_beat, bpm)
+        if data_point_messages:
+            marker.time = data_point_messages[0].time
+            data_point_messages[0] = data_point_messages[0].copy(time=0)
+        data_point_messages.insert(0, marker)
@@ -0,0 +1,297 @@
+from typing import Generator, Iterator, Optional
+
+import numpy as np
+from mido import Message, MidiFile
+
+from henon2midi.henon_equations import HenonDataBatch, orbit_starting_radii
+from henon2midi.midi import create_midi_file_from_messages
+from henon2midi.render_plan import RenderPlan
+
+# The number of orbits iterated together, across consecutive a parameters and starting radii.
+DEFAULT_SCAN_LANES = 1 << 14
+# Notes hit by fewer than this share of the points of the most hit note in a step are not played.
+MIN_NOTE_SHARE = 0.02
+
+
+def parse_scan_range(value: str) -> tuple[float, float, int]:
+    value_split = value.split(",")
+    if len(value_split) != 3:
+        raise ValueError(
+            "scan range must be a comma separated list of start, stop and steps"
+        )
+    return float(value_split[0]), float(value_split[1]), int(value_split[2])
+
+
+class BifurcationScanner:
+    """
+    Sweeps the a parameter of the Henon mapping over steps values from a_start to a_stop. For each
+    a, an orbit is started from each starting radius of RadiallyExpandingHenonMappingsGenerator,
+    its first transient_iterations points are discarded and the next points_per_orbit are collected.
+    The orbits of many a parameters are iterated together as arrays, lanes orbits at a time.
+    Orbit k of the scan is starting radius k % len(radii) of step k // len(radii). Points of orbits
+    that diverge are left out.
+    """
+
+    def __init__(
+        self,
+        a_start: float,
+        a_stop: float,
+        steps: int,
+        transient_iterations: int = 500,
+        points_per_orbit: int = 64,
+        starting_radius: float = 0.1,
+        radial_step: float = 0.1,
+        lanes: int = DEFAULT_SCAN_LANES,
+    ):
+        if steps < 1:
+            raise ValueError(f"steps must be at least 1: {steps}")
+        if transient_iterations < 0 or points_per_orbit < 1:
+            raise ValueError(
+                "transient_iterations must be at least 0 and points_per_orbit at least 1"
+            )
+        self.a_start = a_start
+        self.a_stop = a_stop
+        self.steps = steps
+        self.transient_iterations = transient_iterations
+        self.points_per_orbit = points_per_orbit
+        self.starting_radius = starting_radius
+        self.radial_step = radial_step
+        self.a_values = np.linspace(a_start, a_stop, steps)
+        self.radii = np.array(orbit_starting_radii(starting_radius, radial_step))
+        if len(self.radii) == 0:
+            raise ValueError(f"starting_radius must be at most 1: {starting_radius}")
+        self.steps_per_block = max(1, lanes // len(self.radii))
+
+    def iterate_orbits(
+        self, a_values: np.ndarray, radii: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the x and y values collected from the orbit of each pair of a_values and radii, as
+        arrays of shape (len(a_values), points_per_orbit), with NaN or infinity once an orbit diverges.
+        """
+        cos_a = np.cos(a_values)
+        sin_a = np.sin(a_values)
+        x = np.array(radii, dtype=np.float64)
+        y = x.copy()
+        xs = np.empty((self.points_per_orbit, len(a_values)))
+        ys = np.empty((self.points_per_orbit, len(a_values)))
+        with np.errstate(over="ignore", invalid="ignore"):
+            for iteration in range(self.transient_iterations + self.points_per_orbit):
+                x_squared = x * x
+                x, y = (x * cos_a) - ((y - x_squared) * sin_a), (x * sin_a) + (
+                    (y - x_squared) * cos_a
+                )
+                collected = iteration - self.transient_iterations
+                if collected >= 0:
+                    xs[collected] = x
+                    ys[collected] = y
+        return xs.T, ys.T
+
+    def batches(self) -> Iterator[HenonDataBatch]:
+        """
+        Yields a batch for each block of steps_per_block steps, empty if every orbit of the block
+        diverged, with the points in order of a, then starting radius, and orbit, iteration,
+        new orbit, radius and a parameter arrays as for the generator.
+        """
+        number_of_radii = len(self.radii)
+        points_yielded = 0
+        for first_step in range(0, self.steps, self.steps_per_block):
+            block_steps = np.arange(
+                first_step, min(first_step + self.steps_per_block, self.steps)
+            )
+            lane_steps = np.repeat(block_steps, number_of_radii)
+            lane_radii = np.tile(self.radii, len(block_steps))
+            xs, ys = self.iterate_orbits(self.a_values[lane_steps], lane_radii)
+            kept = np.isfinite(xs) & np.isfinite(ys)
+            new_orbit = kept & (np.cumsum(kept, axis=1) == 1)
+            lane_orbits = first_step * number_of_radii + np.arange(len(lane_steps))
+            number_of_points = int(kept.sum())
+            yield HenonDataBatch(
+                x=xs[kept],
+                y=ys[kept],
+                orbit=np.broadcast_to(lane_orbits[:, np.newaxis], kept.shape)[kept],
+                iteration=np.arange(
+                    points_yielded + 1, points_yielded + number_of_points + 1
+                ),
+                new_orbit=new_orbit[kept],
+                radius=np.broadcast_to(lane_radii[:, np.newaxis], kept.shape)[kept],
+                a_parameter=np.broadcast_to(
+                    self.a_values[lane_steps][:, np.newaxis], kept.shape
+                )[kept],
+            )
+            points_yielded += number_of_points
+
+    def step_of_orbit(self, orbit: np.ndarray) -> np.ndarray:
+        return orbit // len(self.radii)
+
+
+def bifurcation_diagram_batch(
+    batch: HenonDataBatch, a_start: float, a_stop: float
+) -> HenonDataBatch:
+    """
+    Returns the points of a scan batch as a bifurcation diagram in the range of a data point, with
+    a from a_start to a_stop as x from -1 to 1 and the x value as y, e.g. for a DensityImage.
+    """
+    assert batch.a_parameter is not None
+    span = (a_stop - a_start) or 1.0
+    return HenonDataBatch(
+        x=(batch.a_parameter - a_start) * (2 / span) - 1,
+        y=batch.x,
+        orbit=batch.orbit,
+        iteration=batch.iteration,
+        new_orbit=batch.new_orbit,
+        radius=batch.radius,
+        a_parameter=batch.a_parameter,
+    )
+
+
+def generate_bifurcation_midi_messages(
+    bifurcation_scanner: BifurcationScanner,
+    render_plan: RenderPlan,
+    max_notes_per_step: int = 8,
+) -> Generator[tuple[list[Message], bool], None, None]:
+    """
+    Yields the MIDI messages of each step of the scan, alongside True as each step starts a new
+    section, with a as time: each step lasts the note duration of render_plan.
+    The values of the axis mapped to note (see RenderPlan) are mapped to notes and the notes hit by
+    the most points, up to max_notes_per_step, are played together for the step. Points out of the
+    source ranges are left out unless render_plan clips them. If velocity is mapped, the velocity of
+    each note rises over the velocity range with the share of points hitting it. Each mapped
+    control is sent once per step, with the mean mapped value of the step.
+    """
+    midi_mapping = render_plan.midi_mapping
+    range_mappers = {
+        "x": midi_mapping.x_range_mapper,
+        "y": midi_mapping.y_range_mapper,
+    }
+    duration_ticks = int(midi_mapping.duration_ticks)
+    active_voice_table = render_plan.create_active_voice_table()
+    if render_plan.sustain:
+        sustain_on_msg = Message("control_change", control=64, value=127)
+        if active_voice_table is not None:
+            yield active_voice_table.process([sustain_on_msg]), False
+        else:
+            yield [sustain_on_msg], False
+
+    steps_per_block = bifurcation_scanner.steps_per_block
+    pending_ticks = 0
+    for block_index, batch in enumerate(bifurcation_scanner.batches()):
+        first_step = block_index * steps_per_block
+        block_steps = range(
+            first_step, min(first_step + steps_per_block, bifurcation_scanner.steps)
+        )
+        step_indices = bifurcation_scanner.step_of_orbit(batch.orbit) - first_step
+        rescaled_x, valid_x = range_mappers["x"].rescale_array(batch.x)
+        rescaled_y, valid_y = range_mappers["y"].rescale_array(batch.y)
+        midi_values = {
+            "x": np.round(rescaled_x).astype(np.int64),
+            "y": np.round(rescaled_y).astype(np.int64),
+        }
+        if not render_plan.clip:
+            # As when rendering a file, points out of range are not played rather than clipped.
+            valid = valid_x & valid_y
+            step_indices = step_indices[valid]
+            midi_values = {axis: values[valid] for axis, values in midi_values.items()}
+        points_per_step = np.bincount(step_indices, minlength=len(block_steps))
+
+        note_counts: Optional[np.ndarray] = None
+        if midi_mapping.note_axis is not None:
+            notes = midi_values[midi_mapping.note_axis]
+            if midi_mapping.note_table is not None:
+                notes = midi_mapping.note_table[notes]
+            note_counts = np.bincount(
+                step_indices * 128 + notes, minlength=len(block_steps) * 128
+            ).reshape(len(block_steps), 128)
+        control_means = [
+            (
+                control_number,
+                np.bincount(
+                    step_indices,
+                    weights=midi_values[axis],
+                    minlength=len(block_steps),
+                )
+                / np.maximum(points_per_step, 1),
+            )
+            for control_number, axis in midi_mapping.controls
+        ]
+
+        for step_index in range(len(block_steps)):
+            messages: list[Message] = []
+            if points_per_step[step_index]:
+                messages = [
+                    Message(
+                        "control_change",
+                        control=control_number,
+                        value=int(round(means[step_index])),
+                    )
+                    for control_number, means in control_means
+                ]
+            if note_counts is not None:
+                messages += _step_note_messages(
+                    note_counts[step_index],
+                    midi_mapping.velocity_axis,
+                    render_plan,
+                    max_notes_per_step,
+                    duration_ticks,
+                )
+            if messages:
+                messages[0] = messages[0].copy(time=messages[0].time + pending_ticks)
+                pending_ticks = 0
+            if not any(msg.type == "note_off" for msg in messages):
+                pending_ticks += duration_ticks
+            if active_voice_table is not None:
+                messages = active_voice_table.process(messages)
+            yield messages, True
+    if active_voice_table is not None:
+        yield active_voice_table.release_all(), False
+
+
+def _step_note_messages(
+    note_counts: np.ndarray,
+    velocity_axis: Optional[str],
+    render_plan: RenderPlan,
+    max_notes_per_step: int,
+    duration_ticks: int,
+) -> list[Message]:
+    max_count = note_counts.max()
+    if max_count == 0:
+        return []
+    ranked_notes = np.argsort(-note_counts, kind="stable")[:max_notes_per_step]
+    notes = ranked_notes[note_counts[ranked_notes] >= max_count * MIN_NOTE_SHARE]
+    if velocity_axis is None:
+        velocities = np.full(len(notes), render_plan.default_velocity)
+    else:
+        low, high = (
+            render_plan.midi_range_x
+            if velocity_axis == "x"
+            else render_plan.midi_range_y
+        )
+        velocities = np.maximum(
+            np.round(low + (high - low) * note_counts[notes] / max_count), 1
+        )
+    notes_and_velocities = list(zip(notes.tolist(), velocities.astype(int).tolist()))
+    note_ons = [
+        Message("note_on", note=note, velocity=velocity)
+        for note, velocity in notes_and_velocities
+    ]
+    note_offs = [
+        Message("note_off", note=note, velocity=velocity)
+        for note, velocity in notes_and_velocities
+    ]
+    note_offs[0] = note_offs[0].copy(time=duration_ticks)
+    return note_ons + note_offs
+
+
+def create_bifurcation_midi_file(
+    bifurcation_scanner: BifurcationScanner,
+    render_plan: RenderPlan,
+    max_notes_per_step: int = 8,
+) -> MidiFile:
+    messages = []
+    for step_messages, _ in generate_bifurcation_midi_messages(
+        bifurcation_scanner, render_plan, max_notes_per_step
+    ):
+        messages.extend(step_messages)
+    return create_midi_file_from_messages(
+        messages, render_plan.ticks_per_beat, render_plan.bpm
+    )
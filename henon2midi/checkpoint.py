@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+from dataclasses import asdict
+from time import time
+from typing import Optional
+
+from henon2midi.active_voices import ActiveVoiceTable
+from henon2midi.control import LiveRenderState
+from henon2midi.midi import MidiMessagePlayer
+from henon2midi.render_plan import LiveParameters
+
+CHECKPOINT_VERSION = 1
+
+
+def write_checkpoint(path: str, checkpoint: dict):
+    """
+    Replaces the checkpoint at path atomically, so a crash while writing leaves the previous
+    checkpoint intact.
+    """
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w") as checkpoint_file:
+        json.dump({"version": CHECKPOINT_VERSION, **checkpoint}, checkpoint_file)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(temporary_path, path)
+
+
+def read_checkpoint(path: str) -> dict:
+    with open(path) as checkpoint_file:
+        checkpoint = json.load(checkpoint_file)
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(
+            f"Unsupported checkpoint version {checkpoint.get('version')} in {path}"
+        )
+    return checkpoint
+
+
+def live_parameters_state(live_parameters: LiveParameters) -> dict:
+    return {
+        **asdict(live_parameters),
+        "x_midi_parameter_mappings": sorted(live_parameters.x_midi_parameter_mappings),
+        "y_midi_parameter_mappings": sorted(live_parameters.y_midi_parameter_mappings),
+    }
+
+
+def live_parameters_from_state(state: dict) -> LiveParameters:
+    return LiveParameters(
+        **{
+            **state,
+            "x_midi_parameter_mappings": frozenset(state["x_midi_parameter_mappings"]),
+            "y_midi_parameter_mappings": frozenset(state["y_midi_parameter_mappings"]),
+            "midi_range_x": tuple(state["midi_range_x"]),
+            "midi_range_y": tuple(state["midi_range_y"]),
+        }
+    )
+
+
+class CheckpointWriter:
+    """
+    Writes checkpoints to path on a background thread, at most once every interval_s. The caller
+    checks due, which only compares the time, and submits a checkpoint when it is. Only the latest
+    submitted checkpoint is kept, so a slow disk delays checkpoints rather than the caller.
+    """
+
+    def __init__(self, path: str, interval_s: float = 30.0):
+        self.path = path
+        self.interval_s = interval_s
+        self.checkpoints_written = 0
+        self.error: Optional[BaseException] = None
+        self._next_time = time() + interval_s
+        self._pending: Optional[dict] = None
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def due(self) -> bool:
+        return time() >= self._next_time
+
+    def submit(self, checkpoint: dict):
+        self._next_time = time() + self.interval_s
+        with self._pending_lock:
+            self._pending = checkpoint
+        self._wake.set()
+
+    def close(self):
+        """
+        Writes any checkpoint still pending and stops the thread.
+        """
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            closed = self._closed
+            with self._pending_lock:
+                checkpoint, self._pending = self._pending, None
+            if checkpoint is not None:
+                try:
+                    write_checkpoint(self.path, checkpoint)
+                    self.checkpoints_written += 1
+                except OSError as e:
+                    self.error = e
+            if closed:
+                return
+
+
+def capture_batch_state(
+    live_render_state: LiveRenderState,
+    active_voice_table: Optional[ActiveVoiceTable] = None,
+) -> dict:
+    """
+    Captures the state of the live loop before it takes the next batch of live_render_state, which
+    must come from its generator rather than a pending batch. A checkpoint is this state with the
+    position in the batch and the player tick added, see restore_live_checkpoint.
+    """
+    assert live_render_state.henon_mappings_generator is not None
+    return {
+        "live_parameters": live_parameters_state(live_render_state.parameters),
+        "generator": live_render_state.henon_mappings_generator.get_state(),
+        "converter": live_render_state.data_points_to_midi_converter.get_state(),
+        "active_voice_table": (
+            None if active_voice_table is None else active_voice_table.get_state()
+        ),
+    }
+
+
+def restore_live_checkpoint(
+    checkpoint: dict,
+    live_render_state: LiveRenderState,
+    active_voice_table: Optional[ActiveVoiceTable],
+    midi_message_player: MidiMessagePlayer,
+) -> int:
+    """
+    Restores the converter, voice table and player of a live loop whose render state was created
+    from the live parameters and generator of checkpoint. Returns the position in the first batch
+    to resume from; the messages of the data points before it must still be replayed through the
+    voice table, without being sent.
+    """
+    live_render_state.data_points_to_midi_converter.set_state(checkpoint["converter"])
+    if active_voice_table is not None and checkpoint["active_voice_table"] is not None:
+        active_voice_table.set_state(checkpoint["active_voice_table"])
+    midi_message_player.tick = checkpoint["player_tick"]
+    midi_message_player.set_bpm(live_render_state.parameters.bpm)
+    return checkpoint["position"]
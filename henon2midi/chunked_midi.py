@@ -0,0 +1,281 @@
+import json
+import os
+import queue
+import struct
+import threading
+from typing import Iterable, Optional, Union
+
+from mido import Message, MetaMessage, bpm2tempo
+
+from henon2midi.active_voices import SUSTAIN_CONTROL
+from henon2midi.midi_file import CHUNK_HEADER, MIDI_FILE_HEADER
+
+ROTATION_MODES = ("bars", "orbits", "megabytes")
+BEATS_PER_BAR = 4
+# Encoded bytes are handed to the I/O thread in blocks of about this size.
+WRITE_BLOCK_SIZE = 1 << 16
+
+
+def encode_variable_length_quantity(value: int) -> bytes:
+    encoded = [value & 0x7F]
+    value >>= 7
+    while value:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(reversed(encoded))
+
+
+class _ChunkedMidiFileIOThread(threading.Thread):
+    """
+    Writes the chunk files and the manifest from a bounded queue, so file I/O never stalls rendering
+    for longer than it takes to queue a block. Each chunk is written to a .partial file and renamed
+    once its track length has been filled in, after which it is added to the manifest.
+    """
+
+    def __init__(self, manifest_path: str, manifest: dict):
+        super().__init__(daemon=True)
+        self.manifest_path = manifest_path
+        self.manifest = manifest
+        self.queue: queue.Queue = queue.Queue(maxsize=64)
+        self.error: Optional[BaseException] = None
+
+    def run(self):
+        chunk_file = None
+        command = ""
+        try:
+            while True:
+                command, argument = self.queue.get()
+                if command == "open":
+                    chunk_file = open(argument + ".partial", "wb")
+                elif command == "write":
+                    chunk_file.write(argument)
+                elif command == "close":
+                    chunk_file = self._close_chunk(chunk_file, argument)
+                elif command == "stop":
+                    self.manifest["complete"] = True
+                    self._write_manifest()
+                    return
+        except BaseException as e:
+            self.error = e
+            if chunk_file is not None:
+                chunk_file.close()
+            # Keep draining so the rendering thread never blocks on a full queue.
+            while command != "stop":
+                command, _ = self.queue.get()
+
+    def _close_chunk(self, chunk_file, chunk: dict):
+        chunk_size = chunk_file.tell()
+        track_length_offset = CHUNK_HEADER.size + MIDI_FILE_HEADER.size + 4
+        chunk_file.seek(track_length_offset)
+        chunk_file.write(struct.pack(">I", chunk_size - track_length_offset - 4))
+        chunk_file.close()
+        os.replace(chunk["path"] + ".partial", chunk["path"])
+        chunk["bytes"] = chunk_size
+        chunk["path"] = os.path.basename(chunk["path"])
+        self.manifest["chunks"].append(chunk)
+        self._write_manifest()
+        return None
+
+    def _write_manifest(self):
+        temporary_path = self.manifest_path + ".tmp"
+        with open(temporary_path, "w") as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=2)
+        os.replace(temporary_path, self.manifest_path)
+
+
+class ChunkedMidiFileWriter:
+    """
+    Streams MIDI messages into a sequence of single track MIDI files, rotating to a new file every
+    rotate_every bars, orbits or megabytes, and keeps a JSON manifest of the completed files.
+    Messages are encoded as they are written and the files are written on a background thread, so
+    memory use stays flat however long the render. Notes held across a rotation are ended in one
+    file and struck again at the start of the next, along with the sustain pedal, so every file
+    plays on its own.
+    """
+
+    def __init__(
+        self,
+        path_prefix: str,
+        ticks_per_beat: int = 960,
+        bpm: int = 120,
+        rotate_every: int = 16,
+        rotation_mode: str = "bars",
+    ):
+        if rotation_mode not in ROTATION_MODES:
+            raise ValueError(f"Unknown rotation mode: {rotation_mode}")
+        if rotate_every < 1:
+            raise ValueError(f"rotate_every must be at least 1: {rotate_every}")
+        self.path_prefix = path_prefix
+        self.ticks_per_beat = ticks_per_beat
+        self.tempo = bpm2tempo(bpm)
+        self.rotate_every = rotate_every
+        self.rotation_mode = rotation_mode
+        self.ticks_per_chunk = rotate_every * BEATS_PER_BAR * ticks_per_beat
+        self.bytes_per_chunk = rotate_every * 1024 * 1024
+        self.manifest_path = f"{path_prefix}.manifest.json"
+
+        self.tick = 0
+        self.chunks_started = 0
+        self.held_notes: dict[tuple[int, int], int] = {}
+        self.pedal_down: set[int] = set()
+        self._chunk: dict = {}
+        self._chunk_bytes = 0
+        self._chunk_orbits = 0
+        self._previous_event_tick = 0
+        self._running_status = 0
+        self._buffer = bytearray()
+
+        self._io_thread = _ChunkedMidiFileIOThread(
+            self.manifest_path,
+            {
+                "ticks_per_beat": ticks_per_beat,
+                "bpm": bpm,
+                "rotation_mode": rotation_mode,
+                "rotate_every": rotate_every,
+                "complete": False,
+                "chunks": [],
+            },
+        )
+        self._io_thread.start()
+        self._start_chunk()
+
+    def write(self, messages: list[Message], new_orbit: bool = False):
+        """
+        Writes the messages of one data point, which are kept in the same file unless a bar
+        boundary falls between them.
+        """
+        if new_orbit:
+            if (
+                self.rotation_mode == "orbits"
+                and self._chunk_orbits >= self.rotate_every
+            ):
+                self._rotate(self.tick + (messages[0].time if messages else 0))
+            self._chunk_orbits += 1
+        if (
+            self.rotation_mode == "megabytes"
+            and self._chunk_bytes + len(self._buffer) >= self.bytes_per_chunk
+        ):
+            self._rotate(self.tick + (messages[0].time if messages else 0))
+
+        for msg in messages:
+            self.tick += msg.time
+            if self.rotation_mode == "bars":
+                # Notes and tracks ending exactly on the boundary end in the file they started in.
+                is_end = (
+                    msg.type == "note_off"
+                    or (msg.type == "note_on" and msg.velocity == 0)
+                    or msg.type == "end_of_track"
+                )
+                while self.tick - is_end >= (
+                    self._chunk["start_tick"] + self.ticks_per_chunk
+                ):
+                    self._rotate(self._chunk["start_tick"] + self.ticks_per_chunk)
+            if msg.type == "end_of_track":
+                # Each file is ended when it is closed, at the tick reached by then.
+                continue
+            self._write_message(msg)
+            if msg.type == "note_on" and msg.velocity > 0:
+                self.held_notes[(msg.channel, msg.note)] = msg.velocity
+            elif msg.type == "note_off" or msg.type == "note_on":
+                self.held_notes.pop((msg.channel, msg.note), None)
+            elif msg.type == "control_change" and msg.control == SUSTAIN_CONTROL:
+                if msg.value >= 64:
+                    self.pedal_down.add(msg.channel)
+                else:
+                    self.pedal_down.discard(msg.channel)
+
+    def write_all(self, data_points_messages: Iterable[tuple[list[Message], bool]]):
+        for messages, new_orbit in data_points_messages:
+            self.write(messages, new_orbit)
+
+    def close(self):
+        self._end_chunk()
+        self._put("stop", None)
+        self._io_thread.join()
+        if self._io_thread.error is not None:
+            raise self._io_thread.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _put(self, command: str, argument):
+        if self._io_thread.error is not None:
+            raise self._io_thread.error
+        self._io_thread.queue.put((command, argument))
+
+    def _write_message(self, msg: Union[Message, MetaMessage]):
+        msg_bytes = msg.bytes()
+        encoded = encode_variable_length_quantity(self.tick - self._previous_event_tick)
+        if msg.is_meta:
+            self._running_status = 0
+        elif msg_bytes[0] == self._running_status:
+            msg_bytes = msg_bytes[1:]
+        else:
+            self._running_status = msg_bytes[0]
+        self._buffer += encoded
+        self._buffer += bytes(msg_bytes)
+        self._previous_event_tick = self.tick
+        if len(self._buffer) >= WRITE_BLOCK_SIZE:
+            self._flush()
+
+    def _flush(self):
+        self._chunk_bytes += len(self._buffer)
+        self._put("write", bytes(self._buffer))
+        self._buffer.clear()
+
+    def _start_chunk(self):
+        path = f"{self.path_prefix}-{self.chunks_started:05d}.mid"
+        self.chunks_started += 1
+        self._chunk = {"path": path, "start_tick": self.tick, "orbits": 0}
+        self._chunk_bytes = 0
+        self._chunk_orbits = 0
+        self._previous_event_tick = self.tick
+        self._running_status = 0
+        self._put("open", path)
+        self._buffer += CHUNK_HEADER.pack(b"MThd", MIDI_FILE_HEADER.size)
+        self._buffer += MIDI_FILE_HEADER.pack(0, 1, self.ticks_per_beat)
+        self._buffer += CHUNK_HEADER.pack(b"MTrk", 0)
+        self._write_message(MetaMessage("set_tempo", tempo=self.tempo))
+        for channel in sorted(self.pedal_down):
+            self._write_message(
+                Message(
+                    "control_change",
+                    channel=channel,
+                    control=SUSTAIN_CONTROL,
+                    value=127,
+                )
+            )
+        for (channel, note), velocity in self.held_notes.items():
+            self._write_message(
+                Message("note_on", channel=channel, note=note, velocity=velocity)
+            )
+
+    def _end_chunk(self):
+        for channel, note in self.held_notes:
+            self._write_message(
+                Message("note_off", channel=channel, note=note, velocity=0)
+            )
+        for channel in sorted(self.pedal_down):
+            self._write_message(
+                Message(
+                    "control_change", channel=channel, control=SUSTAIN_CONTROL, value=0
+                )
+            )
+        self._write_message(MetaMessage("end_of_track"))
+        self._chunk["end_tick"] = self.tick
+        self._chunk["orbits"] = self._chunk_orbits
+        self._flush()
+        self._put("close", self._chunk)
+
+    def _rotate(self, tick: int):
+        """
+        Ends the current file at tick and starts the next one there.
+        """
+        message_tick = self.tick
+        self.tick = tick
+        self._end_chunk()
+        self._start_chunk()
+        self.tick = message_tick
@@ -1,18 +1,77 @@
+import os
+from typing import Optional
+
 import click
 import pkg_resources
+from click.core import ParameterSource
 from mido import Message
 
-from henon2midi.ascii_art import AsciiArtCanvas, draw_data_point_on_canvas
-from henon2midi.base import create_midi_file_from_data_generator
+from henon2midi.ascii_art import AsciiArtVisualizer
+from henon2midi.audio import WAVEFORMS, render_midi_file_to_wav
+from henon2midi.base import (
+    create_midi_file_from_render_plan,
+    generate_midi_messages_from_render_plan,
+)
+from henon2midi.bifurcation import (
+    BifurcationScanner,
+    create_bifurcation_midi_file,
+    generate_bifurcation_midi_messages,
+    parse_scan_range,
+)
+from henon2midi.checkpoint import (
+    CheckpointWriter,
+    capture_batch_state,
+    live_parameters_from_state,
+    read_checkpoint,
+    restore_live_checkpoint,
+)
+from henon2midi.chunked_midi import ROTATION_MODES, ChunkedMidiFileWriter
+from henon2midi.control import (
+    LiveParameterController,
+    start_control_server,
+    stop_socket_server,
+)
 from henon2midi.data_point_to_midi_conversion import (
-    create_midi_messages_from_data_point,
+    DURATION_MODES,
+    KEYS,
+    SCALES,
+    DataPointsToMidiConverter,
+)
+from henon2midi.henon_equations import (
+    DEFAULT_BATCH_SIZE,
+    RadiallyExpandingHenonMappingsGenerator,
 )
-from henon2midi.henon_equations import RadiallyExpandingHenonMappingsGenerator
+from henon2midi.image import render_bifurcation_image, render_henon_image
+from henon2midi.lookahead import DEFAULT_RING_CAPACITY, LookaheadRenderer
 from henon2midi.midi import (
     MidiMessagePlayer,
     get_available_midi_output_names,
     get_default_midi_output_name,
 )
+from henon2midi.midi_file import (
+    MidiFilePlaybackSource,
+    play_midi_file,
+    save_midi_file,
+)
+from henon2midi.point_stream import (
+    PointStreamHeader,
+    PointStreamWriter,
+)
+from henon2midi.render_plan import (
+    RENDER_SETTING_PARSERS,
+    LiveParameters,
+    RenderPlan,
+    compile_render_jobs,
+    load_render_config,
+)
+from henon2midi.status import LiveStatus, start_status_server
+
+# Options that set a render setting of a different name, all other render settings are set by the
+# option of the same name.
+RENDER_SETTING_OPTIONS = {
+    "x_midi_value_range": "midi_range_x",
+    "y_midi_value_range": "midi_range_y",
+}
 
 
 @click.version_option()
@@ -93,6 +152,64 @@ from henon2midi.midi import (
     show_default=True,
     type=str,
 )
+@click.option(
+    "--scale",
+    default="chromatic",
+    help="The scale that mapped notes are snapped to.",
+    show_default=True,
+    type=click.Choice(list(SCALES.keys())),
+)
+@click.option(
+    "--key",
+    default="C",
+    help="The key of the scale that mapped notes are snapped to.",
+    show_default=True,
+    type=click.Choice(list(KEYS.keys())),
+)
+@click.option(
+    "--duration-grid-ticks",
+    default=0,
+    help="Snap note durations to a multiple of this many ticks. 0 for no snapping.",
+    show_default=True,
+    type=int,
+)
+@click.option(
+    "--duration-mode",
+    default="fixed",
+    help=(
+        "How note durations are derived: fixed from --notes-per-beat, or from the distance to the "
+        "previous data point, the x or the y value."
+    ),
+    show_default=True,
+    type=click.Choice(list(DURATION_MODES)),
+)
+@click.option(
+    "--min-duration-ticks",
+    default=60,
+    help="The shortest note duration when the duration is derived from the data.",
+    show_default=True,
+    type=int,
+)
+@click.option(
+    "--max-duration-ticks",
+    default=960,
+    help="The longest note duration when the duration is derived from the data.",
+    show_default=True,
+    type=int,
+)
+@click.option(
+    "--articulation",
+    default=1.0,
+    help="The fraction of each note duration that the note sounds for, the rest is silent.",
+    show_default=True,
+    type=float,
+)
+@click.option(
+    "--merge-rests",
+    is_flag=True,
+    help="Emit no messages for out of range data points, merging them into a single rest.",
+    type=bool,
+)
 @click.option(
     "-r",
     "--starting-radius",
@@ -117,12 +234,134 @@ from henon2midi.midi import (
     show_default=True,
     type=str,
 )
+@click.option(
+    "--point-stream-out",
+    default="",
+    help="The path to write the raw Henon data points to as a binary point stream.",
+    show_default=True,
+    type=str,
+)
+@click.option(
+    "--point-stream-dtype",
+    default="float64",
+    help="The float precision of the x and y values in the point stream.",
+    show_default=True,
+    type=click.Choice(["float32", "float64"]),
+)
+@click.option(
+    "--wav-out",
+    default="",
+    help="The path to render the MIDI output to as a WAV file with the built-in synthesizer.",
+    show_default=True,
+    type=str,
+)
+@click.option(
+    "--wav-waveform",
+    default="sine",
+    help="The oscillator waveform of the built-in synthesizer.",
+    show_default=True,
+    type=click.Choice(list(WAVEFORMS)),
+)
+@click.option(
+    "--image-out",
+    default="",
+    help="The path to export a density image of the Henon mapping to, as PNG or PPM by extension.",
+    show_default=True,
+    type=str,
+)
+@click.option(
+    "--image-size",
+    default="1024,1024",
+    help="The width and height of the exported image.",
+    show_default=True,
+    type=str,
+)
+@click.option(
+    "--control-address",
+    default="",
+    help="The host:port or Unix socket path to accept live parameter changes on, e.g. 127.0.0.1:9000.",
+    show_default=True,
+    type=str,
+)
+@click.option(
+    "--status-address",
+    default="",
+    help="The host:port or Unix socket path to serve the live state and performance counters on as JSON over HTTP.",
+    show_default=True,
+    type=str,
+)
+@click.option(
+    "--daemon",
+    is_flag=True,
+    help="Run headless while sending midi output, without rendering to the terminal.",
+    type=bool,
+    default=False,
+    show_default=True,
+)
+@click.option(
+    "--play-midi-file",
+    "play_midi_file_path",
+    default="",
+    help="The path of a previously rendered midi file to play to the midi output instead of generating midi.",
+    show_default=True,
+    type=str,
+)
+@click.option(
+    "--start-tick",
+    default=0,
+    help="The tick to start playing the midi file from.",
+    show_default=True,
+    type=int,
+)
+@click.option(
+    "--start-orbit",
+    default=-1,
+    help="The orbit marker to start playing the midi file from, -1 to use --start-tick.",
+    show_default=True,
+    type=int,
+)
+@click.option(
+    "--orbit-markers",
+    is_flag=True,
+    help="Mark the start of each orbit with its index and radius in the midi file, and index the markers.",
+    type=bool,
+    default=False,
+    show_default=True,
+)
+@click.option(
+    "--rotate-every",
+    default=0,
+    help="Split the midi file into files of this many bars, orbits or megabytes, see --rotate-by. 0 writes one file.",
+    show_default=True,
+    type=int,
+)
+@click.option(
+    "--rotate-by",
+    default="bars",
+    help="What --rotate-every counts.",
+    show_default=True,
+    type=click.Choice(list(ROTATION_MODES)),
+)
 @click.option(
     "--draw-ascii-art",
     is_flag=True,
     help="Draw the Henon mapping in ASCII art.",
     type=bool,
 )
+@click.option(
+    "--ascii-art-fps",
+    default=0.0,
+    help="The frame rate of the terminal display. 0 adapts it to the time frames take to draw.",
+    show_default=True,
+    type=float,
+)
+@click.option(
+    "--ascii-art-size",
+    default="",
+    help="The width and height of the ASCII art, e.g. 160,80. Fits the terminal if not given.",
+    show_default=True,
+    type=str,
+)
 @click.option("--sustain", is_flag=True, help="Turn the sustain on.", type=bool)
 @click.option(
     "--clip",
@@ -130,6 +369,19 @@ from henon2midi.midi import (
     help="Clip the MIDI messages to the range of the MIDI parameter.",
     type=bool,
 )
+@click.option(
+    "--max-polyphony",
+    default=0,
+    help="The maximum number of sounding notes, the oldest note is stolen beyond this. 0 for unlimited.",
+    show_default=True,
+    type=int,
+)
+@click.option(
+    "--suppress-duplicate-notes",
+    is_flag=True,
+    help="Don't retrigger notes that are already sounding, e.g. held by the sustain pedal.",
+    type=bool,
+)
 @click.option(
     "--default-note",
     default=64,
@@ -158,6 +410,85 @@ from henon2midi.midi import (
     help="Loop back to start when Henon data is exhausted.",
     type=bool,
 )
+@click.option(
+    "--checkpoint",
+    "checkpoint_path",
+    default="",
+    help="The path to periodically save the position of the render to while sending midi output, see --resume.",
+    show_default=True,
+    type=str,
+)
+@click.option(
+    "--checkpoint-interval",
+    default=30.0,
+    help="The number of seconds between checkpoints.",
+    show_default=True,
+    type=float,
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    help="Resume sending midi output from the checkpoint, if it exists, rather than from the start.",
+    type=bool,
+)
+@click.option(
+    "--lookahead-beats",
+    default=0.0,
+    help=(
+        "Render midi output in a separate process up to this many beats ahead of playback, which then "
+        "does nothing but send the rendered events, headless. 0 renders and plays in one process."
+    ),
+    show_default=True,
+    type=float,
+)
+@click.option(
+    "--lookahead-capacity",
+    default=DEFAULT_RING_CAPACITY,
+    help="The number of events the shared buffer between the render and playback processes holds.",
+    show_default=True,
+    type=int,
+)
+@click.option(
+    "--scan-a",
+    default="",
+    help=(
+        "Render a bifurcation scan instead, sweeping the a parameter over start,stop,steps, e.g. 0,3.14,2000, "
+        "to the midi file, point stream, wav and image outputs."
+    ),
+    show_default=True,
+    type=str,
+)
+@click.option(
+    "--scan-transient",
+    default=500,
+    help="The number of iterations of each orbit of a scan to discard before collecting points.",
+    show_default=True,
+    type=int,
+)
+@click.option(
+    "--scan-points",
+    default=64,
+    help="The number of points to collect from each orbit of a scan.",
+    show_default=True,
+    type=int,
+)
+@click.option(
+    "--scan-max-notes",
+    default=8,
+    help="The most notes played together for each step of a scan.",
+    show_default=True,
+    type=int,
+)
+@click.option(
+    "--config",
+    default="",
+    help=(
+        "The path of a TOML or JSON render config. Its settings replace the defaults of the matching "
+        "options, and a jobs list in it renders each job to its own midi file."
+    ),
+    show_default=True,
+    type=str,
+)
 def cli(
     a_parameter: float,
     iterations_per_orbit: int,
@@ -169,16 +500,53 @@ def cli(
     y_midi_parameter_mappings: str,
     x_midi_value_range: str,
     y_midi_value_range: str,
+    scale: str,
+    key: str,
+    duration_grid_ticks: int,
+    duration_mode: str,
+    min_duration_ticks: int,
+    max_duration_ticks: int,
+    articulation: float,
+    merge_rests: bool,
     starting_radius: float,
     radial_step: float,
     out: str,
+    point_stream_out: str,
+    point_stream_dtype: str,
+    wav_out: str,
+    wav_waveform: str,
+    image_out: str,
+    image_size: str,
+    control_address: str,
+    status_address: str,
+    daemon: bool,
+    play_midi_file_path: str,
+    start_tick: int,
+    start_orbit: int,
+    orbit_markers: bool,
+    rotate_every: int,
+    rotate_by: str,
     draw_ascii_art: bool,
+    ascii_art_fps: float,
+    ascii_art_size: str,
     sustain: bool,
     clip: bool,
     continual_loop: bool,
     default_note: int,
     default_velocity: int,
     no_output: bool,
+    max_polyphony: int,
+    suppress_duplicate_notes: bool,
+    checkpoint_path: str,
+    checkpoint_interval: float,
+    resume: bool,
+    lookahead_beats: float,
+    lookahead_capacity: int,
+    scan_a: str,
+    scan_transient: int,
+    scan_points: int,
+    scan_max_notes: int,
+    config: str,
 ):
     """An application that generates midi from procedurally generated Henon mappings."""
 
@@ -186,176 +554,522 @@ def cli(
     version = pkg_resources.require(package)[0].version
     version_string = package + " v" + version + "\n\n"
 
-    midi_output_file_name = out
+    click_context = click.get_current_context()
+    command_line_settings = {}
+    for parameter_name, value in click_context.params.items():
+        setting_name = RENDER_SETTING_OPTIONS.get(parameter_name, parameter_name)
+        if setting_name not in RENDER_SETTING_PARSERS and setting_name != "out":
+            continue
+        if (
+            config
+            and click_context.get_parameter_source(parameter_name)
+            == ParameterSource.DEFAULT
+        ):
+            continue
+        command_line_settings[setting_name] = value
+    render_jobs = compile_render_jobs(
+        load_render_config(config) if config else {}, command_line_settings
+    )
+
+    if len(render_jobs) > 1:
+        click.echo(version_string)
+        for job_out, job_render_plan in render_jobs:
+            click.echo(f"Rendering {job_out}")
+            write_midi_file(job_render_plan, job_out, rotate_every, rotate_by)
+        return
+
+    midi_output_file_name, render_plan = render_jobs[0]
     if midi_output_name == "default":
         midi_output_name = get_default_midi_output_name()
+    image_size_split = image_size.split(",")
+    if len(image_size_split) != 2:
+        raise ValueError("image_size must be a comma separated list of 2 values")
     else:
-        midi_output_name = midi_output_name
-    ticks_per_beat = ticks_per_beat
-    bpm = bpm
-    notes_per_beat = notes_per_beat
-    x_midi_parameter_mappings_set = set(x_midi_parameter_mappings.split(","))
-    y_midi_parameter_mappings_set = set(y_midi_parameter_mappings.split(","))
-    if "" in x_midi_parameter_mappings_set:
-        x_midi_parameter_mappings_set.remove("")
-    if "" in y_midi_parameter_mappings_set:
-        y_midi_parameter_mappings_set.remove("")
-    x_midi_value_range_split = x_midi_value_range.split(",")
-    if len(x_midi_value_range_split) != 2:
-        raise ValueError(
-            "x_midi_value_range must be a comma separated list of 2 values"
-        )
-    else:
-        midi_range_x = (
-            int(x_midi_value_range_split[0]),
-            int(x_midi_value_range_split[1]),
-        )
-    y_midi_value_range_split = y_midi_value_range.split(",")
-    if len(y_midi_value_range_split) != 2:
-        raise ValueError(
-            "y_midi_value_range must be a comma separated list of 2 values"
-        )
-    else:
-        midi_range_y = (
-            int(y_midi_value_range_split[0]),
-            int(y_midi_value_range_split[1]),
-        )
-    starting_radius = starting_radius
-    radial_step = radial_step
-    draw_ascii_art = draw_ascii_art
-    sustain = sustain
-    clip = clip
+        image_width, image_height = int(image_size_split[0]), int(image_size_split[1])
+    ticks_per_beat = render_plan.ticks_per_beat
+    bpm = render_plan.bpm
+    clip = render_plan.clip
 
     options_string = (
         "Running with the following parameters. Use --help to see all available options.\n"
-        f"\ta parameter: {a_parameter}\n"
-        f"\titerations per orbit: {iterations_per_orbit}\n"
+        f"\tconfig: {config or 'off'}\n"
+        f"\ta parameter: {render_plan.a_parameter}\n"
+        f"\titerations per orbit: {render_plan.iterations_per_orbit}\n"
         f"\tmidi output name: {midi_output_name}\n"
         f"\tticks per beat: {ticks_per_beat}\n"
         f"\tbpm: {bpm}\n"
-        f"\tnotes per beat: {notes_per_beat}\n"
-        f"\tx midi parameter mappings: {x_midi_parameter_mappings_set}\n"
-        f"\ty midi parameter mappings: {y_midi_parameter_mappings_set}\n"
-        f"\tx midi value range: {midi_range_x}\n"
-        f"\ty midi value range: {midi_range_y}\n"
-        f"\tstarting radius: {starting_radius}\n"
-        f"\tradial step: {radial_step}\n"
+        f"\tnotes per beat: {render_plan.notes_per_beat}\n"
+        f"\tx midi parameter mappings: {set(render_plan.x_midi_parameter_mappings)}\n"
+        f"\ty midi parameter mappings: {set(render_plan.y_midi_parameter_mappings)}\n"
+        f"\tx midi value range: {render_plan.midi_range_x}\n"
+        f"\ty midi value range: {render_plan.midi_range_y}\n"
+        f"\tscale: {render_plan.key} {render_plan.scale}\n"
+        f"\tduration grid ticks: {render_plan.duration_grid_ticks or 'off'}\n"
+        f"\tduration mode: {render_plan.duration_mode}\n"
+        f"\tarticulation: {render_plan.articulation}\n"
+        f"\tmerge rests: {render_plan.merge_rests}\n"
+        f"\tstarting radius: {render_plan.starting_radius}\n"
+        f"\tradial step: {render_plan.radial_step}\n"
         f"\tout: {midi_output_file_name}\n"
+        f"\tpoint stream out: {point_stream_out}\n"
+        f"\twav out: {wav_out}\n"
+        f"\timage out: {image_out}\n"
+        f"\tcontrol address: {control_address or 'off'}\n"
+        f"\tstatus address: {status_address or 'off'}\n"
+        f"\tdaemon: {daemon}\n"
+        f"\tcheckpoint: {f'{checkpoint_path} every {checkpoint_interval}s' if checkpoint_path else 'off'}\n"
+        f"\tresume: {resume}\n"
+        f"\tlookahead: {f'{lookahead_beats} beats' if lookahead_beats else 'off'}\n"
+        f"\torbit markers: {render_plan.orbit_markers}\n"
+        f"\trotate every: {f'{rotate_every} {rotate_by}' if rotate_every else 'off'}\n"
+        f"\tplay midi file: {play_midi_file_path or 'off'}\n"
+        f"\tscan a: {scan_a or 'off'}\n"
         f"\tdraw ascii art: {draw_ascii_art}\n"
-        f"\tsustain: {sustain}\n"
+        f"\tascii art fps: {ascii_art_fps or 'adaptive'}\n"
+        f"\tascii art size: {ascii_art_size or 'terminal'}\n"
+        f"\tsustain: {render_plan.sustain}\n"
         f"\tclip: {clip}\n"
+        f"\tmax polyphony: {render_plan.max_polyphony or 'unlimited'}\n"
+        f"\tsuppress duplicate notes: {render_plan.suppress_duplicate_notes}\n"
         f"\n"
     )
 
     click.echo(version_string + options_string)
 
-    if midi_output_file_name:
-        mid = create_midi_file_from_data_generator(
-            RadiallyExpandingHenonMappingsGenerator(
-                a_parameter=a_parameter,
-                iterations_per_orbit=iterations_per_orbit,
-                starting_radius=starting_radius,
-                radial_step=radial_step,
+    if play_midi_file_path:
+        if midi_output_name and not no_output:
+            play_midi_file_to_output(
+                play_midi_file_path,
+                midi_output_name,
+                start_tick=start_tick,
+                start_orbit=start_orbit if start_orbit >= 0 else None,
+            )
+        return
+
+    if scan_a:
+        a_start, a_stop, scan_steps = parse_scan_range(scan_a)
+        render_bifurcation_scan(
+            BifurcationScanner(
+                a_start,
+                a_stop,
+                scan_steps,
+                transient_iterations=scan_transient,
+                points_per_orbit=scan_points,
+                starting_radius=render_plan.starting_radius,
+                radial_step=render_plan.radial_step,
             ),
-            ticks_per_beat=ticks_per_beat,
-            bpm=bpm,
-            notes_per_beat=notes_per_beat,
-            sustain=sustain,
-            clip=clip,
-            x_midi_parameter_mappings_set=x_midi_parameter_mappings_set,
-            y_midi_parameter_mappings_set=y_midi_parameter_mappings_set,
-            source_range_x=(-1.0, 1.0),
-            source_range_y=(-1.0, 1.0),
-            midi_range_x=midi_range_x,
-            midi_range_y=midi_range_y,
-            default_note=default_note,
-            default_velocity=default_velocity,
+            render_plan,
+            midi_output_file_name,
+            max_notes_per_step=scan_max_notes,
+            rotate_every=rotate_every,
+            rotate_by=rotate_by,
+            point_stream_out=point_stream_out,
+            point_stream_dtype=point_stream_dtype,
+            wav_out=wav_out,
+            wav_waveform=wav_waveform,
+            image_out=image_out,
+            image_size=(image_width, image_height),
         )
-        mid.save(midi_output_file_name)
+        return
+
+    point_stream_writer = None
+    if midi_output_file_name or point_stream_out or wav_out:
+        henon_mappings_generator = render_plan.create_generator()
+        if point_stream_out:
+            point_stream_writer = PointStreamWriter(
+                point_stream_out,
+                PointStreamHeader.from_generator(
+                    henon_mappings_generator, float_dtype=point_stream_dtype
+                ),
+            )
 
-    if draw_ascii_art:
-        ascii_art_canvas_width = 160
-        ascii_art_canvas_height = 80
-        ascii_art_canvas = AsciiArtCanvas(
-            ascii_art_canvas_width, ascii_art_canvas_height
+    if midi_output_file_name and rotate_every:
+        write_midi_file(
+            render_plan,
+            midi_output_file_name,
+            rotate_every,
+            rotate_by,
+            henon_mappings_generator=henon_mappings_generator,
+            point_stream_writer=point_stream_writer,
+        )
+        if wav_out:
+            mid = create_midi_file_from_render_plan(
+                render_plan.create_generator(), render_plan
+            )
+            render_midi_file_to_wav(mid, wav_out, waveform=wav_waveform)
+    elif midi_output_file_name or wav_out:
+        mid = create_midi_file_from_render_plan(
+            henon_mappings_generator,
+            render_plan,
+            point_stream_writer=point_stream_writer,
         )
+        if midi_output_file_name:
+            save_midi_file(
+                mid, midi_output_file_name, orbit_index=render_plan.orbit_markers
+            )
+        if wav_out:
+            render_midi_file_to_wav(mid, wav_out, waveform=wav_waveform)
+    elif point_stream_writer is not None:
+        point_stream_writer.write_generator(henon_mappings_generator)
 
-    if midi_output_name and not no_output:
-        hennon_mappings_generator = RadiallyExpandingHenonMappingsGenerator(
-            a_parameter=a_parameter,
-            iterations_per_orbit=iterations_per_orbit,
-            starting_radius=starting_radius,
-            radial_step=radial_step,
+    if point_stream_writer is not None:
+        point_stream_writer.close()
+
+    if image_out:
+        render_henon_image(
+            render_plan.create_generator(),
+            image_out,
+            width=image_width,
+            height=image_height,
+            clip=clip,
         )
 
+    ascii_art_canvas_size: Optional[tuple[int, int]] = None
+    if ascii_art_size:
+        ascii_art_size_split = ascii_art_size.split(",")
+        if len(ascii_art_size_split) != 2:
+            raise ValueError(
+                "ascii_art_size must be a comma separated list of 2 values"
+            )
+        ascii_art_canvas_size = (
+            int(ascii_art_size_split[0]),
+            int(ascii_art_size_split[1]),
+        )
+
+    if midi_output_name and not no_output and lookahead_beats:
+        if control_address or checkpoint_path:
+            raise ValueError(
+                "--lookahead-beats can't be combined with --control-address or --checkpoint"
+            )
+        play_with_lookahead(
+            render_plan,
+            midi_output_name,
+            lookahead_beats,
+            ring_capacity=lookahead_capacity,
+            continual_loop=continual_loop,
+            status_address=status_address,
+        )
+    elif midi_output_name and not no_output:
         midi_message_player = MidiMessagePlayer(
             midi_output_name=midi_output_name, ticks_per_beat=ticks_per_beat, bpm=bpm
         )
         midi_message_player.reset()
 
-        if sustain:
+        def create_converter(
+            live_parameters: LiveParameters,
+        ) -> DataPointsToMidiConverter:
+            return render_plan.with_live_parameters(live_parameters).create_converter()
+
+        checkpoint: Optional[dict] = None
+        if checkpoint_path and resume and os.path.exists(checkpoint_path):
+            checkpoint = read_checkpoint(checkpoint_path)
+            live_parameter_controller = LiveParameterController(
+                live_parameters_from_state(checkpoint["live_parameters"]),
+                RadiallyExpandingHenonMappingsGenerator.from_state(
+                    checkpoint["generator"]
+                ),
+                create_converter,
+            )
+        else:
+            live_parameter_controller = LiveParameterController(
+                render_plan.live_parameters(),
+                render_plan.create_generator(),
+                create_converter,
+            )
+        live_render_state = live_parameter_controller.active
+        if control_address:
+            control_server = start_control_server(
+                control_address, live_parameter_controller
+            )
+        live_status: Optional[LiveStatus] = None
+        if status_address:
+            live_status = LiveStatus(midi_message_player, live_parameter_controller)
+            status_server = start_status_server(status_address, live_status)
+
+        active_voice_table = render_plan.create_active_voice_table()
+
+        if render_plan.sustain:
             sustain_on_msg = Message(
                 "control_change",
                 control=64,
                 value=127,
             )
+            if active_voice_table is not None:
+                active_voice_table.process([sustain_on_msg])
             midi_message_player.send(sustain_on_msg)
 
-        while True:
-            messages = create_midi_messages_from_data_point(
-                hennon_mappings_generator.generate_next_data_point(),
-                duration_ticks=int(ticks_per_beat / notes_per_beat),
+        resume_position = 0
+        if checkpoint is not None:
+            resume_position = restore_live_checkpoint(
+                checkpoint,
+                live_render_state,
+                active_voice_table,
+                midi_message_player,
+            )
+        checkpoint_writer: Optional[CheckpointWriter] = None
+        if checkpoint_path:
+            checkpoint_writer = CheckpointWriter(checkpoint_path, checkpoint_interval)
+        ascii_art_visualizer: Optional[AsciiArtVisualizer] = None
+        if not daemon:
+            ascii_art_visualizer = AsciiArtVisualizer(
+                lambda current_state_string, art_string: refresh_terminal_screen(
+                    version_string, options_string, current_state_string, art_string
+                ),
+                draw_art=draw_ascii_art,
+                fps=ascii_art_fps or None,
+                size=ascii_art_canvas_size,
+                reserved_lines=(version_string + options_string).count("\n"),
                 clip=clip,
-                x_midi_parameter_mappings=x_midi_parameter_mappings_set,
-                y_midi_parameter_mappings=y_midi_parameter_mappings_set,
-                source_range_x=(-1.0, 1.0),
-                source_range_y=(-1.0, 1.0),
-                midi_range_x=midi_range_x,
-                midi_range_y=midi_range_y,
-                default_note=default_note,
-                default_velocity=default_velocity,
             )
 
-            current_iteration = hennon_mappings_generator.get_current_iteration()
-            current_orbit = hennon_mappings_generator.get_current_orbital_iteration()
-            current_data_point = hennon_mappings_generator.get_current_data_point()
-            is_new_orbit = hennon_mappings_generator.is_new_orbit()
+        while True:
+            batch_state: Optional[dict] = None
+            if (
+                checkpoint_writer is not None
+                and live_render_state.pending_batch is None
+            ):
+                batch_state = capture_batch_state(live_render_state, active_voice_table)
+            batch = live_render_state.next_batch(DEFAULT_BATCH_SIZE)
+            if len(batch) == 0:
+                if not continual_loop:
+                    break
+                assert live_render_state.henon_mappings_generator is not None
+                live_render_state.henon_mappings_generator.restart_data_point_generator()
+                continue
 
-            if not continual_loop:
-                if hennon_mappings_generator.get_times_reset() > 0:
+            data_points_messages = (
+                live_render_state.data_points_to_midi_converter.convert(
+                    batch.x, batch.y
+                )
+            )
+            first_position = 0
+            if resume_position:
+                if active_voice_table is not None:
+                    for messages in data_points_messages[:resume_position]:
+                        active_voice_table.process(messages)
+                batch = batch[resume_position:]
+                data_points_messages = data_points_messages[resume_position:]
+                first_position, resume_position = resume_position, 0
+            if ascii_art_visualizer is not None:
+                ascii_art_visualizer.show(batch)
+
+            for position, (
+                current_data_point,
+                current_iteration,
+                current_orbit,
+                messages,
+            ) in enumerate(
+                zip(
+                    batch.data_points(),
+                    batch.iteration.tolist(),
+                    batch.orbit.tolist(),
+                    data_points_messages,
+                )
+            ):
+                next_live_render_state = live_parameter_controller.take_next(
+                    batch, position
+                )
+                if next_live_render_state is not None:
+                    live_render_state = next_live_render_state
+                    midi_message_player.set_bpm(live_render_state.parameters.bpm)
                     break
 
-            if draw_ascii_art:
-                draw_data_point_on_canvas(
-                    current_data_point,
-                    ascii_art_canvas,
-                    is_new_orbit,
-                    current_iteration,
-                    clip=clip,
+                if (
+                    batch_state is not None
+                    and checkpoint_writer is not None
+                    and checkpoint_writer.due()
+                ):
+                    checkpoint_writer.submit(
+                        {
+                            **batch_state,
+                            "position": first_position + position,
+                            "player_tick": midi_message_player.tick,
+                        }
+                    )
+
+                if live_status is not None:
+                    live_status.record_point(
+                        current_iteration,
+                        current_orbit,
+                        current_data_point,
+                        len(batch) - position - 1,
+                    )
+
+                if ascii_art_visualizer is not None:
+                    ascii_art_visualizer.play(position)
+
+                if active_voice_table is not None:
+                    messages = active_voice_table.process(messages)
+
+                try:
+                    midi_message_player.send(messages)
+                except KeyboardInterrupt:
+                    midi_message_player.reset()
+                    if checkpoint_writer is not None:
+                        checkpoint_writer.close()
+                    if ascii_art_visualizer is not None:
+                        ascii_art_visualizer.close()
+                    exit()
+
+        if checkpoint_writer is not None:
+            checkpoint_writer.close()
+        if ascii_art_visualizer is not None:
+            ascii_art_visualizer.close()
+        if control_address:
+            stop_socket_server(control_server)
+        if status_address:
+            stop_socket_server(status_server)
+
+
+def write_midi_file(
+    render_plan: RenderPlan,
+    path: str,
+    rotate_every: int = 0,
+    rotate_by: str = "bars",
+    henon_mappings_generator: Optional[RadiallyExpandingHenonMappingsGenerator] = None,
+    point_stream_writer: Optional[PointStreamWriter] = None,
+):
+    if henon_mappings_generator is None:
+        henon_mappings_generator = render_plan.create_generator()
+    if rotate_every:
+        with ChunkedMidiFileWriter(
+            os.path.splitext(path)[0],
+            ticks_per_beat=render_plan.ticks_per_beat,
+            bpm=render_plan.bpm,
+            rotate_every=rotate_every,
+            rotation_mode=rotate_by,
+        ) as chunked_midi_file_writer:
+            chunked_midi_file_writer.write_all(
+                generate_midi_messages_from_render_plan(
+                    henon_mappings_generator,
+                    render_plan,
+                    point_stream_writer=point_stream_writer,
                 )
-                art_string = ascii_art_canvas.generate_string()
-            else:
-                art_string = ""
-
-            current_state_string = (
-                f"Current iteration: {current_iteration}\n"
-                f"Current orbit: {current_orbit}\n"
-                f"Current data point: {current_data_point}\n"
-                "\n"
             )
+    else:
+        mid = create_midi_file_from_render_plan(
+            henon_mappings_generator,
+            render_plan,
+            point_stream_writer=point_stream_writer,
+        )
+        save_midi_file(mid, path, orbit_index=render_plan.orbit_markers)
 
-            refresh_terminal_screen(
-                version_string,
-                options_string,
-                current_state_string,
-                art_string,
+
+def render_bifurcation_scan(
+    bifurcation_scanner: BifurcationScanner,
+    render_plan: RenderPlan,
+    path: str,
+    max_notes_per_step: int = 8,
+    rotate_every: int = 0,
+    rotate_by: str = "bars",
+    point_stream_out: str = "",
+    point_stream_dtype: str = "float64",
+    wav_out: str = "",
+    wav_waveform: str = "sine",
+    image_out: str = "",
+    image_size: tuple[int, int] = (1024, 1024),
+):
+    """
+    Renders a scan to each output that is given a path, scanning again for each one, which is
+    cheaper than holding on to the points.
+    """
+    if path and rotate_every:
+        with ChunkedMidiFileWriter(
+            os.path.splitext(path)[0],
+            ticks_per_beat=render_plan.ticks_per_beat,
+            bpm=render_plan.bpm,
+            rotate_every=rotate_every,
+            rotation_mode=rotate_by,
+        ) as chunked_midi_file_writer:
+            chunked_midi_file_writer.write_all(
+                generate_bifurcation_midi_messages(
+                    bifurcation_scanner, render_plan, max_notes_per_step
+                )
             )
+    if (path and not rotate_every) or wav_out:
+        mid = create_bifurcation_midi_file(
+            bifurcation_scanner, render_plan, max_notes_per_step
+        )
+        if path and not rotate_every:
+            save_midi_file(mid, path, orbit_index=False)
+        if wav_out:
+            render_midi_file_to_wav(mid, wav_out, waveform=wav_waveform)
+    if point_stream_out:
+        with PointStreamWriter(
+            point_stream_out,
+            PointStreamHeader.from_scanner(bifurcation_scanner, point_stream_dtype),
+        ) as point_stream_writer:
+            for batch in bifurcation_scanner.batches():
+                point_stream_writer.write_batch(batch)
+    if image_out:
+        render_bifurcation_image(
+            bifurcation_scanner, image_out, width=image_size[0], height=image_size[1]
+        )
+
 
-            try:
-                midi_message_player.send(messages)
-            except KeyboardInterrupt:
-                midi_message_player.reset()
-                exit()
+def play_with_lookahead(
+    render_plan: RenderPlan,
+    midi_output_name: str,
+    lookahead_beats: float,
+    ring_capacity: int = DEFAULT_RING_CAPACITY,
+    continual_loop: bool = False,
+    status_address: str = "",
+):
+    with LookaheadRenderer(
+        render_plan,
+        lookahead_beats,
+        ring_capacity=ring_capacity,
+        continual_loop=continual_loop,
+    ) as lookahead_renderer:
+        midi_message_player = MidiMessagePlayer(
+            midi_output_name=midi_output_name,
+            ticks_per_beat=render_plan.ticks_per_beat,
+            bpm=render_plan.bpm,
+        )
+        if status_address:
+            status_server = start_status_server(
+                status_address,
+                LiveStatus(
+                    midi_message_player,
+                    midi_event_ring=lookahead_renderer.midi_event_ring,
+                ),
+            )
+        try:
+            lookahead_renderer.wait_until_primed()
+            midi_message_player.reset()
+            lookahead_renderer.play(midi_message_player)
+        except KeyboardInterrupt:
+            midi_message_player.reset()
+        if status_address:
+            stop_socket_server(status_server)
+        click.echo(
+            f"Lookahead underruns: {lookahead_renderer.midi_event_ring.underruns}, "
+            f"overruns: {lookahead_renderer.midi_event_ring.overruns}"
+        )
+
+
+def play_midi_file_to_output(
+    path: str,
+    midi_output_name: str,
+    start_tick: int = 0,
+    start_orbit: Optional[int] = None,
+):
+    with MidiFilePlaybackSource(path) as midi_file_playback_source:
+        midi_message_player = MidiMessagePlayer(
+            midi_output_name=midi_output_name,
+            ticks_per_beat=midi_file_playback_source.ticks_per_beat,
+        )
+        midi_message_player.reset()
+        try:
+            play_midi_file(
+                midi_file_playback_source,
+                midi_message_player,
+                start_tick=start_tick,
+                start_orbit=start_orbit,
+            )
+        except KeyboardInterrupt:
+            pass
+        midi_message_player.reset()
 
 
 def refresh_terminal_screen(
@@ -0,0 +1,258 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+from dataclasses import asdict, replace
+from typing import Any, Callable, Optional, Union, cast
+
+from henon2midi.data_point_to_midi_conversion import DataPointsToMidiConverter
+from henon2midi.henon_equations import (
+    DEFAULT_BATCH_SIZE,
+    HenonDataBatch,
+    RadiallyExpandingHenonMappingsGenerator,
+)
+from henon2midi.render_plan import (
+    LiveParameters,
+    parse_finite_float,
+    parse_key,
+    parse_midi_parameter_mappings,
+    parse_midi_value_range,
+    parse_scale,
+)
+
+# Changing any of these needs a new generator, other changes only need a new converter.
+GENERATOR_PARAMETERS = ("a_parameter", "iterations_per_orbit", "radial_step")
+
+LIVE_PARAMETER_PARSERS: dict[str, Callable[[str], Any]] = {
+    "a_parameter": parse_finite_float,
+    "iterations_per_orbit": int,
+    "radial_step": parse_finite_float,
+    "bpm": int,
+    "notes_per_beat": int,
+    "x_midi_parameter_mappings": parse_midi_parameter_mappings,
+    "y_midi_parameter_mappings": parse_midi_parameter_mappings,
+    "midi_range_x": parse_midi_value_range,
+    "midi_range_y": parse_midi_value_range,
+    "scale": parse_scale,
+    "key": parse_key,
+}
+
+
+class LiveRenderState:
+    """
+    Everything the live loop needs to render with one set of LiveParameters. A state without a
+    generator continues with the generator of the state it replaces. A new generator built on the
+    control thread has the radius it was started at in start_radius until the live loop takes it.
+    """
+
+    def __init__(
+        self,
+        parameters: LiveParameters,
+        data_points_to_midi_converter: DataPointsToMidiConverter,
+        henon_mappings_generator: Optional[RadiallyExpandingHenonMappingsGenerator],
+        pending_batch: Optional[HenonDataBatch] = None,
+        start_radius: Optional[float] = None,
+    ):
+        self.parameters = parameters
+        self.data_points_to_midi_converter = data_points_to_midi_converter
+        self.henon_mappings_generator = henon_mappings_generator
+        self.pending_batch = pending_batch
+        self.start_radius = start_radius
+
+    def next_batch(self, n: int = DEFAULT_BATCH_SIZE) -> HenonDataBatch:
+        if self.pending_batch is not None:
+            batch, self.pending_batch = self.pending_batch, None
+            return batch
+        assert self.henon_mappings_generator is not None
+        return self.henon_mappings_generator.next_batch(n)
+
+
+class LiveParameterController:
+    """
+    Double buffers changes to LiveParameters between a control thread and the live loop.
+    Each change is built into a complete LiveRenderState on the calling thread, including the first
+    batch of a new generator, and published as the next state. The live loop only swaps a reference
+    when it takes the next state, so building never stalls its timing.
+    """
+
+    def __init__(
+        self,
+        parameters: LiveParameters,
+        henon_mappings_generator: RadiallyExpandingHenonMappingsGenerator,
+        create_converter: Callable[[LiveParameters], DataPointsToMidiConverter],
+    ):
+        self.parameters = parameters
+        self.create_converter = create_converter
+        self.active = LiveRenderState(
+            parameters, create_converter(parameters), henon_mappings_generator
+        )
+        self.changes_applied = 0
+        self._next: Optional[LiveRenderState] = None
+        self._next_lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def update(self, **changes: Any) -> LiveParameters:
+        """
+        Builds and publishes the next state with changes applied to the latest parameters.
+        Raises ValueError, leaving the parameters unchanged, if the changes are invalid.
+        """
+        for name in changes:
+            if name not in LIVE_PARAMETER_PARSERS:
+                raise ValueError(f"Unknown live parameter: {name}")
+        with self._build_lock:
+            parameters = replace(self.parameters, **changes)
+            render_state = self._build(parameters)
+            with self._next_lock:
+                if (
+                    render_state.henon_mappings_generator is None
+                    and self._next is not None
+                ):
+                    render_state.henon_mappings_generator = (
+                        self._next.henon_mappings_generator
+                    )
+                    render_state.pending_batch = self._next.pending_batch
+                    render_state.start_radius = self._next.start_radius
+                self._next = render_state
+            self.parameters = parameters
+        return parameters
+
+    def take_next(
+        self, batch: HenonDataBatch, position: int
+    ) -> Optional[LiveRenderState]:
+        """
+        Called by the live loop before the data point at position in batch. Returns the state to
+        continue with if a change has been published since the last call, otherwise None.
+        """
+        if self._next is None:
+            return None
+        with self._next_lock:
+            render_state, self._next = self._next, None
+        if render_state is None:
+            return None
+        if render_state.henon_mappings_generator is None:
+            render_state.henon_mappings_generator = self.active.henon_mappings_generator
+            if position < len(batch):
+                render_state.pending_batch = batch[position:]
+        elif render_state.start_radius is not None:
+            # The live loop has carried on since the generator was built, so it is moved on to the
+            # radius the loop has reached, and the batch computed ahead is dropped if that moved.
+            assert self.active.henon_mappings_generator is not None
+            current_radius = self.active.henon_mappings_generator.current_radius
+            if current_radius != render_state.start_radius:
+                render_state.henon_mappings_generator.skip_to_radius(current_radius)
+                render_state.pending_batch = None
+            render_state.start_radius = None
+        self.active = render_state
+        self.changes_applied += 1
+        return render_state
+
+    def handle_command(self, command: str) -> str:
+        """
+        Handles one line of the control protocol, OSC style addresses followed by a value:
+            /a_parameter 1.2
+            /x_midi_parameter_mappings note,velocity
+            /parameters
+        Returns the reply line.
+        """
+        address, _, value = command.strip().partition(" ")
+        name = address.lstrip("/")
+        if name == "parameters":
+            return json.dumps(asdict(self.parameters), default=sorted)
+        if name not in LIVE_PARAMETER_PARSERS:
+            return f"error unknown address: {address}"
+        try:
+            self.update(**{name: LIVE_PARAMETER_PARSERS[name](value.strip())})
+        except ValueError as e:
+            return f"error {e}"
+        return "ok"
+
+    def _build(self, parameters: LiveParameters) -> LiveRenderState:
+        converter = self.create_converter(parameters)
+        if all(
+            getattr(parameters, name) == getattr(self.parameters, name)
+            for name in GENERATOR_PARAMETERS
+        ):
+            return LiveRenderState(parameters, converter, None)
+
+        current_generator = self.active.henon_mappings_generator
+        assert current_generator is not None
+        henon_mappings_generator = RadiallyExpandingHenonMappingsGenerator(
+            a_parameter=parameters.a_parameter,
+            iterations_per_orbit=parameters.iterations_per_orbit,
+            starting_radius=current_generator.starting_radius,
+            radial_step=parameters.radial_step,
+        )
+        # The live loop is advancing current_generator meanwhile, so this radius is only where the
+        # first batch is computed ahead; take_next corrects it on the loop thread.
+        start_radius = current_generator.current_radius
+        henon_mappings_generator.skip_to_radius(start_radius)
+        return LiveRenderState(
+            parameters,
+            converter,
+            henon_mappings_generator,
+            henon_mappings_generator.next_batch(),
+            start_radius,
+        )
+
+
+class _ControlServerMixin:
+    live_parameter_controller: LiveParameterController
+
+
+class _ControlRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = cast(_ControlServerMixin, self.server)
+        for line in self.rfile:
+            command = line.decode(errors="replace").strip()
+            if not command:
+                continue
+            reply = server.live_parameter_controller.handle_command(command)
+            self.wfile.write((reply + "\n").encode())
+
+
+class _ControlTCPServer(_ControlServerMixin, socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _ControlUnixServer(_ControlServerMixin, socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def parse_tcp_address(address: str) -> Optional[tuple[str, int]]:
+    """
+    Returns the host and port of a host:port address, or None if address is a Unix socket path.
+    """
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit():
+        return host or "127.0.0.1", int(port)
+    return None
+
+
+def start_control_server(
+    address: str, live_parameter_controller: LiveParameterController
+) -> socketserver.TCPServer:
+    """
+    Serves the control protocol on a background thread, on a TCP socket for a host:port address or
+    on a Unix socket for any other address, which is taken as a path.
+    """
+    tcp_address = parse_tcp_address(address)
+    server: Union[_ControlTCPServer, _ControlUnixServer]
+    if tcp_address is not None:
+        server = _ControlTCPServer(tcp_address, _ControlRequestHandler)
+    else:
+        server = _ControlUnixServer(address, _ControlRequestHandler)
+    server.live_parameter_controller = live_parameter_controller
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stop_socket_server(server: socketserver.TCPServer):
+    """
+    Stops a server started on a background thread, removing its Unix socket file if it has one.
+    """
+    server.shutdown()
+    server.server_close()
+    if server.socket.family == socket.AF_UNIX:
+        os.unlink(str(server.server_address))
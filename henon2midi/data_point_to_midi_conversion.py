@@ -1,7 +1,97 @@
-from typing import List, Tuple, Set
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import AbstractSet, Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
 from mido import Message
 
-from henon2midi.math import rescale_number_to_range
+from henon2midi.math import RANGE_MAPPER_CACHE_SIZE, RangeMapper, get_range_mapper
+from henon2midi.midi import CONTROL_CHANGE, MIDI_EVENT_DTYPE, NOTE_OFF, NOTE_ON
+
+CONTROL_NUMBERS = {
+    "modulation": 1,
+    "breath": 2,
+    "foot_controller": 4,
+    "portamento_time": 5,
+    "volume": 7,
+    "balance": 8,
+    "pan": 10,
+    "expression": 11,
+    "effect_control_1": 12,
+    "effect_control_2": 13,
+    "general_purpose_controller_1": 16,
+    "general_purpose_controller_2": 17,
+    "general_purpose_controller_3": 18,
+    "general_purpose_controller_4": 19,
+    "bank_select": 32,
+    "modulation_wheel": 33,
+    "breath_controller": 34,
+    "foot_pedal": 36,
+    "portamento": 37,
+    "data_entry": 38,
+    "sustain": 64,
+    "portamento_65": 65,
+    "sostenuto": 66,
+    "soft_pedal": 67,
+    "legato_footswitch": 68,
+    "hold_2": 69,
+    "sound_controller_1": 70,
+    "sound_controller_2": 71,
+    "sound_controller_3": 72,
+    "sound_controller_4": 73,
+    "sound_controller_5": 74,
+    "sound_controller_6": 75,
+    "sound_controller_7": 76,
+    "sound_controller_8": 77,
+    "sound_controller_9": 78,
+    "sound_controller_10": 79,
+    "general_purpose_controller_5": 80,
+    "general_purpose_controller_6": 81,
+    "general_purpose_controller_7": 82,
+    "general_purpose_controller_8": 83,
+    "portamento_control": 84,
+    "high_resolution_velocity_prefix": 88,
+    "effects_1_depth": 91,
+    "effects_2_depth": 92,
+    "effects_3_depth": 93,
+    "effects_4_depth": 94,
+    "effects_5_depth": 95,
+}
+
+SCALES = {
+    "chromatic": (0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11),
+    "major": (0, 2, 4, 5, 7, 9, 11),
+    "minor": (0, 2, 3, 5, 7, 8, 10),
+    "harmonic_minor": (0, 2, 3, 5, 7, 8, 11),
+    "dorian": (0, 2, 3, 5, 7, 9, 10),
+    "phrygian": (0, 1, 3, 5, 7, 8, 10),
+    "lydian": (0, 2, 4, 6, 7, 9, 11),
+    "mixolydian": (0, 2, 4, 5, 7, 9, 10),
+    "major_pentatonic": (0, 2, 4, 7, 9),
+    "minor_pentatonic": (0, 3, 5, 7, 10),
+    "blues": (0, 3, 5, 6, 7, 10),
+    "whole_tone": (0, 2, 4, 6, 8, 10),
+}
+
+KEYS = {
+    "C": 0,
+    "C#": 1,
+    "Db": 1,
+    "D": 2,
+    "D#": 3,
+    "Eb": 3,
+    "E": 4,
+    "F": 5,
+    "F#": 6,
+    "Gb": 6,
+    "G": 7,
+    "G#": 8,
+    "Ab": 8,
+    "A": 9,
+    "A#": 10,
+    "Bb": 10,
+    "B": 11,
+}
 
 
 def create_midi_messages_from_data_point(
@@ -25,56 +115,6 @@ def create_midi_messages_from_data_point(
         "velocity": default_velocity,
     }
 
-    control_numbers = {
-        "modulation": 1,
-        "breath": 2,
-        "foot_controller": 4,
-        "portamento_time": 5,
-        "volume": 7,
-        "balance": 8,
-        "pan": 10,
-        "expression": 11,
-        "effect_control_1": 12,
-        "effect_control_2": 13,
-        "general_purpose_controller_1": 16,
-        "general_purpose_controller_2": 17,
-        "general_purpose_controller_3": 18,
-        "general_purpose_controller_4": 19,
-        "bank_select": 32,
-        "modulation_wheel": 33,
-        "breath_controller": 34,
-        "foot_pedal": 36,
-        "portamento": 37,
-        "data_entry": 38,
-        "sustain": 64,
-        "portamento_65": 65,
-        "sostenuto": 66,
-        "soft_pedal": 67,
-        "legato_footswitch": 68,
-        "hold_2": 69,
-        "sound_controller_1": 70,
-        "sound_controller_2": 71,
-        "sound_controller_3": 72,
-        "sound_controller_4": 73,
-        "sound_controller_5": 74,
-        "sound_controller_6": 75,
-        "sound_controller_7": 76,
-        "sound_controller_8": 77,
-        "sound_controller_9": 78,
-        "sound_controller_10": 79,
-        "general_purpose_controller_5": 80,
-        "general_purpose_controller_6": 81,
-        "general_purpose_controller_7": 82,
-        "general_purpose_controller_8": 83,
-        "portamento_control": 84,
-        "high_resolution_velocity_prefix": 88,
-        "effects_1_depth": 91,
-        "effects_2_depth": 92,
-        "effects_3_depth": 93,
-        "effects_4_depth": 94,
-        "effects_5_depth": 95,
-    }
-
     for x_midi_parameter_mapping in x_midi_parameter_mappings:
         midi_values[x_midi_parameter_mapping] = midi_value_from_data_value(
             x,
@@ -117,7 +157,7 @@ def create_midi_messages_from_data_point(
         if midi_value_name == "note" or midi_value_name == "velocity":
             continue
         try:
-            control_number = control_numbers[midi_value_name]
+            control_number = CONTROL_NUMBERS[midi_value_name]
             pre_note_messages.append(
                 Message(
                     "control_change",
@@ -138,17 +178,444 @@ def midi_value_from_data_value(
     source_range: tuple[float, float] = (-1.0, 1.0),
     midi_range: tuple[int, int] = (0, 127),
 ) -> int:
-    min_midi_value = midi_range[0]
-    max_midi_value = midi_range[1]
-
-    min_data_point_value = source_range[0]
-    max_data_point_value = source_range[1]
-
-    return round(
-        rescale_number_to_range(
-            value,
-            (min_data_point_value, max_data_point_value),
-            (min_midi_value, max_midi_value),
-            clip_value=True,
+    midi_value, _ = get_range_mapper(
+        tuple(source_range), tuple(midi_range), "clip"
+    ).rescale(value)
+    return round(midi_value)
+
+
+DURATION_MODES = ("fixed", "distance", "x", "y")
+
+
+def distance_duration_source(
+    x: np.ndarray, y: np.ndarray, previous_data_point: Optional[Tuple[float, float]]
+) -> np.ndarray:
+    previous_x = np.empty(len(x))
+    previous_y = np.empty(len(y))
+    if previous_data_point is None:
+        previous_x[0], previous_y[0] = x[0], y[0]
+    else:
+        previous_x[0], previous_y[0] = previous_data_point
+    previous_x[1:] = x[:-1]
+    previous_y[1:] = y[:-1]
+    return np.hypot(x - previous_x, y - previous_y)
+
+
+def x_duration_source(
+    x: np.ndarray, y: np.ndarray, previous_data_point: Optional[Tuple[float, float]]
+) -> np.ndarray:
+    return x
+
+
+def y_duration_source(
+    x: np.ndarray, y: np.ndarray, previous_data_point: Optional[Tuple[float, float]]
+) -> np.ndarray:
+    return y
+
+
+DurationSourceKernel = Callable[
+    [np.ndarray, np.ndarray, Optional[Tuple[float, float]]], np.ndarray
+]
+
+# The values that variable note durations are mapped from, for each duration mode but fixed.
+DURATION_SOURCE_KERNELS: Dict[str, DurationSourceKernel] = {
+    "distance": distance_duration_source,
+    "x": x_duration_source,
+    "y": y_duration_source,
+}
+
+
+@dataclass(frozen=True, eq=False)
+class MidiMapping:
+    """
+    The validated and precompiled settings of a DataPointsToMidiConverter, see compile_midi_mapping.
+    note_axis and velocity_axis are "x", "y" or None for the default value, and controls holds the
+    control number and axis of each mapped control, in the order their messages are sent.
+    """
+
+    duration_ticks: float
+    clip: bool
+    note_axis: Optional[str]
+    velocity_axis: Optional[str]
+    controls: Tuple[Tuple[int, str], ...]
+    default_note: int
+    default_velocity: int
+    x_range_mapper: RangeMapper
+    y_range_mapper: RangeMapper
+    note_table: Optional[np.ndarray]
+    duration_grid_ticks: Optional[int]
+    duration_source_kernel: Optional[DurationSourceKernel]
+    duration_range_mapper: RangeMapper
+    articulation: float
+    merge_rests: bool
+
+
+def compile_midi_mapping(
+    duration_ticks: float = 960,
+    clip: bool = False,
+    x_midi_parameter_mappings: AbstractSet[str] = {"note"},
+    y_midi_parameter_mappings: AbstractSet[str] = {"velocity"},
+    source_range_x: Tuple[float, float] = (-1.0, 1.0),
+    source_range_y: Tuple[float, float] = (-1.0, 1.0),
+    midi_range_x: Tuple[int, int] = (0, 127),
+    midi_range_y: Tuple[int, int] = (0, 127),
+    default_note: int = 64,
+    default_velocity: int = 64,
+    scale: str = "chromatic",
+    key: str = "C",
+    duration_grid_ticks: Optional[int] = None,
+    duration_mode: str = "fixed",
+    min_duration_ticks: int = 60,
+    max_duration_ticks: int = 960,
+    duration_source_range: Tuple[float, float] = (0.0, 2.0),
+    articulation: float = 1.0,
+    merge_rests: bool = False,
+) -> MidiMapping:
+    """
+    Validates the settings of a DataPointsToMidiConverter, raising ValueError if any are invalid,
+    and resolves them into the MidiMapping it is created with.
+
+    duration_mode sets the length in ticks of the step each data point takes up:
+        fixed: duration_ticks.
+        distance: the distance from the previous data point, mapped from duration_source_range.
+        x or y: the x or y value, mapped from source_range_x or source_range_y.
+    Variable durations range from min_duration_ticks to max_duration_ticks. The note sounds for
+    articulation of the step and the rest of the step is silent. With merge_rests, data points that
+    are out of range emit no messages; their steps and any silences are merged into the delta time of
+    the next message instead.
+    """
+    midi_value_names = list(
+        dict.fromkeys(
+            ["note", "velocity"]
+            + list(x_midi_parameter_mappings)
+            + list(y_midi_parameter_mappings)
         )
     )
+    for midi_value_name in midi_value_names:
+        if midi_value_name not in ("note", "velocity", *CONTROL_NUMBERS):
+            raise ValueError(f"Unknown midi control: {midi_value_name}")
+    if duration_mode not in DURATION_MODES:
+        raise ValueError(f"Unknown duration mode: {duration_mode}")
+    if not 0 < articulation <= 1:
+        raise ValueError(f"articulation must be in the range (0, 1]: {articulation}")
+
+    def axis(midi_value_name: str) -> Optional[str]:
+        if midi_value_name in y_midi_parameter_mappings:
+            return "y"
+        if midi_value_name in x_midi_parameter_mappings:
+            return "x"
+        return None
+
+    duration_range = (min_duration_ticks, max_duration_ticks)
+    if duration_mode == "distance":
+        duration_range_mapper = get_range_mapper(
+            tuple(duration_source_range), duration_range, "clip"
+        )
+    elif duration_mode == "x":
+        duration_range_mapper = get_range_mapper(
+            tuple(source_range_x), duration_range, "clip"
+        )
+    else:
+        duration_range_mapper = get_range_mapper(
+            tuple(source_range_y), duration_range, "clip"
+        )
+
+    note_table: Optional[np.ndarray] = None
+    if scale != "chromatic":
+        if "note" in y_midi_parameter_mappings:
+            note_table = create_scale_note_table(scale, key, tuple(midi_range_y))
+        elif "note" in x_midi_parameter_mappings:
+            note_table = create_scale_note_table(scale, key, tuple(midi_range_x))
+    elif key not in KEYS:
+        raise ValueError(f"Unknown key: {key}")
+
+    return MidiMapping(
+        duration_ticks=duration_ticks,
+        clip=clip,
+        note_axis=axis("note"),
+        velocity_axis=axis("velocity"),
+        controls=tuple(
+            (CONTROL_NUMBERS[midi_value_name], axis(midi_value_name) or "x")
+            for midi_value_name in midi_value_names[2:]
+        ),
+        default_note=default_note,
+        default_velocity=default_velocity,
+        x_range_mapper=get_range_mapper(
+            tuple(source_range_x), tuple(midi_range_x), "clip"
+        ),
+        y_range_mapper=get_range_mapper(
+            tuple(source_range_y), tuple(midi_range_y), "clip"
+        ),
+        note_table=note_table,
+        duration_grid_ticks=duration_grid_ticks,
+        duration_source_kernel=DURATION_SOURCE_KERNELS.get(duration_mode),
+        duration_range_mapper=duration_range_mapper,
+        articulation=articulation,
+        merge_rests=merge_rests,
+    )
+
+
+class DataPointsToMidiConverter:
+    """
+    Converts arrays of data points to MIDI messages with a compiled MidiMapping, keeping the state
+    needed to carry rests and the distance between successive points across batches.
+    """
+
+    def __init__(self, midi_mapping: MidiMapping):
+        self.midi_mapping = midi_mapping
+        self.previous_data_point: Optional[Tuple[float, float]] = None
+        self.pending_ticks = 0
+
+    def get_state(self) -> dict:
+        """
+        Returns the state carried between batches as plain values, see set_state.
+        """
+        return {
+            "previous_data_point": (
+                None
+                if self.previous_data_point is None
+                else list(self.previous_data_point)
+            ),
+            "pending_ticks": self.pending_ticks,
+        }
+
+    def set_state(self, state: dict):
+        previous_data_point = state["previous_data_point"]
+        self.previous_data_point = (
+            None if previous_data_point is None else tuple(previous_data_point)
+        )
+        self.pending_ticks = state["pending_ticks"]
+
+    def flush(self) -> int:
+        """
+        Returns the ticks of the rest pending after the last data point converted, which is the
+        delta time of the end of track, and clears them.
+        """
+        pending_ticks = self.pending_ticks
+        self.pending_ticks = 0
+        return pending_ticks
+
+    def convert(self, x: np.ndarray, y: np.ndarray) -> List[List[Message]]:
+        """
+        Returns the messages for each data point, an empty list for merged rests.
+        """
+        number_of_points = len(x)
+        if number_of_points == 0:
+            return []
+        notes, velocities, play_note_array, axis_values = self._map_values(x, y)
+        play_note = play_note_array.tolist()
+        step_ticks, note_ticks = self._durations(x, y)
+
+        control_values = [
+            (control_number, axis_values[axis].tolist())
+            for control_number, axis in self.midi_mapping.controls
+        ]
+
+        merge_rests = self.midi_mapping.merge_rests
+        messages_per_data_point: List[List[Message]] = []
+        for index, (note, velocity, is_note_played, step, note_length) in enumerate(
+            zip(
+                notes.tolist(),
+                velocities.tolist(),
+                play_note,
+                step_ticks,
+                note_ticks,
+            )
+        ):
+            if not is_note_played and merge_rests:
+                self.pending_ticks += step
+                messages_per_data_point.append([])
+                continue
+            messages = [
+                Message("control_change", control=control_number, value=values[index])
+                for control_number, values in control_values
+            ]
+            if is_note_played:
+                messages.append(Message("note_on", note=note, velocity=velocity))
+                messages.append(
+                    Message("note_off", note=note, velocity=velocity, time=note_length)
+                )
+                rest = step - note_length
+            else:
+                messages.append(
+                    Message("note_off", note=note, velocity=velocity, time=step)
+                )
+                rest = 0
+            if self.pending_ticks:
+                messages[0] = messages[0].copy(
+                    time=messages[0].time + self.pending_ticks
+                )
+            self.pending_ticks = rest
+            messages_per_data_point.append(messages)
+        return messages_per_data_point
+
+    def convert_events(
+        self, x: np.ndarray, y: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Packed version of convert, which writes the events of all the data points (see
+        MIDI_EVENT_DTYPE) straight from the arrays without creating any messages. Returns the events
+        and the offsets of the events of each data point, which are events[offsets[i]:offsets[i + 1]].
+        """
+        number_of_points = len(x)
+        offsets = np.zeros(number_of_points + 1, dtype=np.int64)
+        if number_of_points == 0:
+            return np.zeros(0, dtype=MIDI_EVENT_DTYPE), offsets
+        midi_mapping = self.midi_mapping
+        notes, velocities, play_note, axis_values = self._map_values(x, y)
+        step_list, note_list = self._durations(x, y)
+        steps = np.asarray(step_list).astype(np.int64)
+        note_lengths = np.asarray(note_list).astype(np.int64)
+
+        # Each data point that is not a merged rest has its controls, a note on if it is played and
+        # a note off.
+        number_of_controls = len(midi_mapping.controls)
+        if midi_mapping.merge_rests:
+            emitted = play_note
+        else:
+            emitted = np.ones(number_of_points, dtype=bool)
+        np.cumsum(
+            np.where(emitted, number_of_controls + 1 + play_note, 0),
+            out=offsets[1:],
+        )
+        events = np.zeros(offsets[-1], dtype=MIDI_EVENT_DTYPE)
+        firsts = offsets[:-1][emitted]
+        for control_index, (control_number, axis) in enumerate(midi_mapping.controls):
+            control_events = firsts + control_index
+            events["status"][control_events] = CONTROL_CHANGE
+            events["data1"][control_events] = control_number
+            events["data2"][control_events] = axis_values[axis][emitted]
+        note_ons = offsets[:-1][play_note] + number_of_controls
+        events["status"][note_ons] = NOTE_ON
+        events["data1"][note_ons] = notes[play_note]
+        events["data2"][note_ons] = velocities[play_note]
+        note_offs = offsets[1:][emitted] - 1
+        events["status"][note_offs] = NOTE_OFF
+        events["data1"][note_offs] = notes[emitted]
+        events["data2"][note_offs] = velocities[emitted]
+        events["tick"][note_offs] = np.where(play_note, note_lengths, steps)[emitted]
+
+        # The first event of each data point is delayed by the silence after the previous note and
+        # the steps of the merged rests since.
+        rests = np.where(play_note, steps - note_lengths, 0)
+        merged_ticks = np.cumsum(np.where(emitted, 0, steps))
+        emitted_indices = np.flatnonzero(emitted)
+        if len(emitted_indices) == 0:
+            self.pending_ticks += int(merged_ticks[-1])
+            return events, offsets
+        emitted_merged_ticks = merged_ticks[emitted_indices]
+        carried_ticks = emitted_merged_ticks.copy()
+        carried_ticks[0] += self.pending_ticks
+        carried_ticks[1:] += (rests[emitted_indices] - emitted_merged_ticks)[:-1]
+        events["tick"][firsts] = events["tick"][firsts] + carried_ticks
+        last_emitted = emitted_indices[-1]
+        self.pending_ticks = int(
+            rests[last_emitted] + merged_ticks[-1] - merged_ticks[last_emitted]
+        )
+        return events, offsets
+
+    def _map_values(
+        self, x: np.ndarray, y: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Returns the note, velocity and whether the note is played of each data point, and the MIDI
+        values of the x and y axes.
+        """
+        midi_mapping = self.midi_mapping
+        number_of_points = len(x)
+        rescaled_x, valid_x = midi_mapping.x_range_mapper.rescale_array(x)
+        rescaled_y, valid_y = midi_mapping.y_range_mapper.rescale_array(y)
+        axis_values = {
+            "x": np.round(rescaled_x).astype(np.int64),
+            "y": np.round(rescaled_y).astype(np.int64),
+        }
+        if midi_mapping.clip:
+            play_note = np.ones(number_of_points, dtype=bool)
+        else:
+            play_note = valid_x & valid_y
+
+        if midi_mapping.note_axis is None:
+            notes = np.full(number_of_points, midi_mapping.default_note)
+        else:
+            notes = axis_values[midi_mapping.note_axis]
+        if midi_mapping.note_table is not None:
+            notes = midi_mapping.note_table[notes]
+        if midi_mapping.velocity_axis is None:
+            velocities = np.full(number_of_points, midi_mapping.default_velocity)
+        else:
+            velocities = axis_values[midi_mapping.velocity_axis]
+        return notes, velocities, play_note, axis_values
+
+    def _durations(self, x: np.ndarray, y: np.ndarray) -> tuple[list, list]:
+        midi_mapping = self.midi_mapping
+        duration_source_kernel = midi_mapping.duration_source_kernel
+        if duration_source_kernel is None:
+            step_ticks = np.full(len(x), midi_mapping.duration_ticks)
+        else:
+            source_values = duration_source_kernel(x, y, self.previous_data_point)
+            step_ticks, _ = midi_mapping.duration_range_mapper.rescale_array(
+                source_values
+            )
+            step_ticks = np.round(step_ticks)
+        self.previous_data_point = (float(x[-1]), float(y[-1]))
+
+        if midi_mapping.duration_grid_ticks:
+            step_ticks = quantize_ticks(step_ticks, midi_mapping.duration_grid_ticks)
+        steps: list
+        if duration_source_kernel is None and not midi_mapping.duration_grid_ticks:
+            steps = [midi_mapping.duration_ticks] * len(x)
+        else:
+            steps = step_ticks.astype(np.int64).tolist()
+        if midi_mapping.articulation < 1:
+            note_ticks = np.maximum(np.round(step_ticks * midi_mapping.articulation), 1)
+            return steps, note_ticks.astype(np.int64).tolist()
+        return steps, steps
+
+
+def create_midi_messages_from_data_points(
+    x: np.ndarray, y: np.ndarray, **settings: Any
+) -> List[List[Message]]:
+    """
+    Array version of create_midi_messages_from_data_point, returning the messages for each data point
+    with the settings of compile_midi_mapping.
+    """
+    return DataPointsToMidiConverter(compile_midi_mapping(**settings)).convert(x, y)
+
+
+@lru_cache(maxsize=RANGE_MAPPER_CACHE_SIZE)
+def create_scale_note_table(
+    scale: str = "chromatic",
+    key: str = "C",
+    note_range: tuple[int, int] = (0, 127),
+) -> np.ndarray:
+    """
+    Returns a lookup table from every MIDI note to the nearest note of the scale and key within
+    note_range, preferring the lower note when two are equally near.
+    """
+    try:
+        intervals = SCALES[scale]
+    except KeyError:
+        raise ValueError(f"Unknown scale: {scale}")
+    try:
+        key_offset = KEYS[key]
+    except KeyError:
+        raise ValueError(f"Unknown key: {key}")
+
+    notes = np.arange(128)
+    in_scale = np.isin((notes - key_offset) % 12, intervals)
+    in_range = (notes >= min(note_range)) & (notes <= max(note_range))
+    scale_notes = notes[in_scale & in_range]
+    if len(scale_notes) == 0:
+        scale_notes = notes[in_scale]
+    distances = np.abs(notes[:, np.newaxis] - scale_notes[np.newaxis, :])
+    note_table = scale_notes[np.argmin(distances, axis=1)]
+    note_table.flags.writeable = False
+    return note_table
+
+
+def quantize_ticks(ticks, grid_ticks: int) -> np.ndarray:
+    """
+    Snaps tick durations to the nearest multiple of grid_ticks, with a minimum of one grid step.
+    """
+    grid_steps = np.maximum(np.round(np.asarray(ticks) / grid_ticks), 1)
+    return grid_steps.astype(np.int64) * grid_ticks
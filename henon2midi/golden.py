@@ -0,0 +1,384 @@
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import struct
+import sys
+from dataclasses import dataclass
+from itertools import zip_longest
+from operator import itemgetter
+from typing import Any, Iterable, Iterator, Optional
+
+import click
+
+from henon2midi.base import create_midi_file_from_render_plan
+from henon2midi.lookahead import iterate_packed_events
+from henon2midi.midi import MIDI_MESSAGE_LENGTHS
+from henon2midi.midi_file import (
+    META_END_OF_TRACK,
+    META_EVENT,
+    ByteBuffer,
+    encode_midi_file,
+    iterate_chunks,
+    iterate_track_events,
+)
+from henon2midi.render_plan import RenderPlan, compile_render_plan
+
+GOLDEN_VERSION = 2
+# Events per block digest, which locate the first divergent block when a stream digest differs.
+GOLDEN_BLOCK_SIZE = 1024
+DEFAULT_GOLDEN_DIGESTS_PATH = os.path.join("tests", "golden", "digests.json")
+
+# Every golden case renders 21 orbits of 100 iterations, for each a parameter with each variant.
+GOLDEN_BASE_SETTINGS: dict[str, Any] = {
+    "iterations_per_orbit": 100,
+    "starting_radius": 0.0,
+    "radial_step": 0.05,
+}
+GOLDEN_A_PARAMETERS = (1.0, 1.333, 2.1)
+GOLDEN_VARIANTS: dict[str, dict[str, Any]] = {
+    "default": {},
+    "clip": {"clip": True, "midi_range_x": [20, 100]},
+    "controls": {
+        "x_midi_parameter_mappings": ["note", "pan"],
+        "y_midi_parameter_mappings": ["velocity", "modulation", "pan"],
+        "midi_range_y": [30, 90],
+    },
+    "voices": {"sustain": True, "max_polyphony": 6, "suppress_duplicate_notes": True},
+    "durations": {
+        "scale": "minor_pentatonic",
+        "key": "D",
+        "duration_mode": "distance",
+        "duration_grid_ticks": 120,
+        "articulation": 0.5,
+        "merge_rests": True,
+    },
+    "markers": {"bpm": 90, "ticks_per_beat": 480, "orbit_markers": True},
+}
+
+# An event of a MIDI file as compared by the harness: its absolute tick, and its status byte followed
+# by the meta type of a meta event and its data.
+GoldenEvent = tuple[int, bytes]
+
+
+def golden_render_plans() -> dict[str, RenderPlan]:
+    return {
+        f"{variant}-a{a_parameter}": compile_render_plan(
+            {**GOLDEN_BASE_SETTINGS, **settings, "a_parameter": a_parameter}
+        )
+        for variant, settings in GOLDEN_VARIANTS.items()
+        for a_parameter in GOLDEN_A_PARAMETERS
+    }
+
+
+def render_golden_file(render_plan: RenderPlan) -> bytes:
+    """
+    Renders render_plan to the bytes of a MIDI file, as the CLI saves it.
+    """
+    return encode_midi_file(
+        create_midi_file_from_render_plan(render_plan.create_generator(), render_plan),
+        orbit_index=render_plan.orbit_markers,
+    )
+
+
+def iterate_golden_events(data: ByteBuffer) -> Iterator[GoldenEvent]:
+    """
+    Streams the events of the tracks of a MIDI file merged by tick, with running status resolved so
+    files that only differ in encoding have the same events.
+    """
+    track_events = (
+        iterate_track_events(data, start, end)
+        for chunk_type, start, end in iterate_chunks(data)
+        if chunk_type == b"MTrk"
+    )
+    for tick, status, meta_type, payload, _ in heapq.merge(
+        *track_events, key=itemgetter(0)
+    ):
+        if status == META_EVENT:
+            yield tick, bytes([status, meta_type]) + bytes(payload)
+        else:
+            yield tick, bytes([status]) + bytes(payload)
+
+
+def iterate_packed_golden_events(render_plan: RenderPlan) -> Iterator[GoldenEvent]:
+    """
+    Streams the packed events of render_plan that lookahead playback sends, as golden events.
+    """
+    tick = 0
+    for events in iterate_packed_events(render_plan):
+        for delta, status, data1, data2, _ in events.tolist():
+            tick += delta
+            if status == META_EVENT:
+                yield tick, bytes((status, data1))
+            else:
+                yield tick, bytes(
+                    (status, data1, data2)[: MIDI_MESSAGE_LENGTHS[status]]
+                )
+
+
+def iterate_packable_events(events: Iterable[GoldenEvent]) -> Iterator[GoldenEvent]:
+    """
+    Leaves out the meta events other than the end of track, which have no packed counterpart.
+    """
+    return (
+        event
+        for event in events
+        if event[1][0] != META_EVENT or event[1][1] == META_END_OF_TRACK
+    )
+
+
+@dataclass(frozen=True)
+class EventStreamDigest:
+    """
+    The digest of a stream of golden events, with the tick and digest of each block of
+    GOLDEN_BLOCK_SIZE events.
+    """
+
+    events: int
+    ticks: int
+    digest: str
+    blocks: tuple[tuple[int, str], ...]
+
+    def first_divergent_block(self, other: "EventStreamDigest") -> Optional[int]:
+        for block_index, (block, other_block) in enumerate(
+            zip_longest(self.blocks, other.blocks)
+        ):
+            if block != other_block:
+                return block_index
+        return None
+
+
+def digest_events(events: Iterable[GoldenEvent]) -> EventStreamDigest:
+    stream_hash = hashlib.blake2b(digest_size=16)
+    block_hash = hashlib.blake2b(digest_size=8)
+    blocks = []
+    count = 0
+    tick = 0
+    block_tick = 0
+    for tick, event_bytes in events:
+        if count % GOLDEN_BLOCK_SIZE == 0:
+            if count:
+                blocks.append((block_tick, block_hash.hexdigest()))
+            block_hash = hashlib.blake2b(digest_size=8)
+            block_tick = tick
+        encoded = struct.pack("<QH", tick, len(event_bytes)) + event_bytes
+        stream_hash.update(encoded)
+        block_hash.update(encoded)
+        count += 1
+    if count:
+        blocks.append((block_tick, block_hash.hexdigest()))
+    return EventStreamDigest(count, tick, stream_hash.hexdigest(), tuple(blocks))
+
+
+@dataclass(frozen=True)
+class EventDifference:
+    """
+    The first event where two event streams diverge, None for the stream that had already ended.
+    """
+
+    index: int
+    expected: Optional[GoldenEvent]
+    actual: Optional[GoldenEvent]
+
+    @property
+    def tick(self) -> int:
+        return min(event[0] for event in (self.expected, self.actual) if event)
+
+    def __str__(self) -> str:
+        return (
+            f"event {self.index}: expected {_format_event(self.expected)}, "
+            f"got {_format_event(self.actual)}"
+        )
+
+
+def _format_event(event: Optional[GoldenEvent]) -> str:
+    if event is None:
+        return "end of stream"
+    return f"{event[1].hex(' ')} at tick {event[0]}"
+
+
+def diff_events(
+    expected: Iterable[GoldenEvent], actual: Iterable[GoldenEvent]
+) -> Optional[EventDifference]:
+    """
+    Returns the first event where the streams differ, comparing absolute ticks rather than delta
+    times so the difference is found at the tick it happens. Stops reading both at the first
+    difference.
+    """
+    for index, (expected_event, actual_event) in enumerate(
+        zip_longest(expected, actual)
+    ):
+        if expected_event != actual_event:
+            return EventDifference(index, expected_event, actual_event)
+    return None
+
+
+def golden_digests(render_plans: dict[str, RenderPlan]) -> dict:
+    """
+    Renders each golden case to the digests stored in a golden digests file, keyed by case name.
+    """
+    cases = {}
+    for name, render_plan in render_plans.items():
+        data = render_golden_file(render_plan)
+        event_stream_digest = digest_events(iterate_golden_events(data))
+        cases[name] = {
+            "events": event_stream_digest.events,
+            "ticks": event_stream_digest.ticks,
+            "digest": event_stream_digest.digest,
+            "file_digest": hashlib.blake2b(data, digest_size=16).hexdigest(),
+            "packed_digest": digest_events(
+                iterate_packed_golden_events(render_plan)
+            ).digest,
+            "blocks": [list(block) for block in event_stream_digest.blocks],
+        }
+    return {"version": GOLDEN_VERSION, "block_size": GOLDEN_BLOCK_SIZE, "cases": cases}
+
+
+def check_golden_digests(
+    digests: dict,
+    render_plans: dict[str, RenderPlan],
+    midi_dir: str = "",
+) -> list[str]:
+    """
+    Renders each golden case and returns a description of each that differs from digests. The first
+    divergent event is found by diffing with the golden MIDI file of the case in midi_dir, if there
+    is one, and otherwise the first divergent block of events is given.
+    """
+    if digests.get("version") != GOLDEN_VERSION:
+        raise ValueError(f"Unsupported golden digests version {digests.get('version')}")
+    if digests.get("block_size") != GOLDEN_BLOCK_SIZE:
+        raise ValueError(
+            f"Golden digests have a block size of {digests.get('block_size')}"
+        )
+    mismatches = []
+    for name, render_plan in render_plans.items():
+        golden_case = digests["cases"].get(name)
+        if golden_case is None:
+            mismatches.append(f"{name}: no golden digest, update the golden digests")
+            continue
+        data = render_golden_file(render_plan)
+        mismatches.extend(
+            _check_packed_events(name, golden_case["packed_digest"], render_plan, data)
+        )
+        event_stream_digest = digest_events(iterate_golden_events(data))
+        if event_stream_digest.digest == golden_case["digest"]:
+            if (
+                hashlib.blake2b(data, digest_size=16).hexdigest()
+                != golden_case["file_digest"]
+            ):
+                mismatches.append(f"{name}: same events, but encoded differently")
+            continue
+        mismatch = (
+            f"{name}: {event_stream_digest.events} events over {event_stream_digest.ticks} ticks, "
+            f"expected {golden_case['events']} events over {golden_case['ticks']} ticks"
+        )
+        midi_path = os.path.join(midi_dir, f"{name}.mid")
+        if midi_dir and os.path.exists(midi_path):
+            with open(midi_path, "rb") as golden_file:
+                with mmap.mmap(
+                    golden_file.fileno(), 0, access=mmap.ACCESS_READ
+                ) as golden_data:
+                    event_difference = diff_events(
+                        iterate_golden_events(golden_data), iterate_golden_events(data)
+                    )
+            if event_difference is None:
+                mismatch += ", but the same events as the golden MIDI file"
+            else:
+                mismatch += f", first difference at {event_difference}"
+        else:
+            golden_stream_digest = EventStreamDigest(
+                golden_case["events"],
+                golden_case["ticks"],
+                golden_case["digest"],
+                tuple((tick, digest) for tick, digest in golden_case["blocks"]),
+            )
+            block_index = event_stream_digest.first_divergent_block(
+                golden_stream_digest
+            )
+            assert block_index is not None
+            block_start = block_index * GOLDEN_BLOCK_SIZE
+            block_end = block_start + GOLDEN_BLOCK_SIZE - 1
+            mismatch += f", first difference in events {block_start} to {block_end}"
+            if block_index < len(golden_stream_digest.blocks):
+                mismatch += f" from tick {golden_stream_digest.blocks[block_index][0]}"
+        mismatches.append(mismatch)
+    return mismatches
+
+
+def _check_packed_events(
+    name: str, packed_digest: str, render_plan: RenderPlan, data: bytes
+) -> list[str]:
+    """
+    Checks the packed events of a golden case against their digest and against the MIDI file of the
+    case, data.
+    """
+    mismatches = []
+    if digest_events(iterate_packed_golden_events(render_plan)).digest != packed_digest:
+        mismatches.append(f"{name}: packed events differ from the golden packed digest")
+    event_difference = diff_events(
+        iterate_packable_events(iterate_golden_events(data)),
+        iterate_packed_golden_events(render_plan),
+    )
+    if event_difference is not None:
+        mismatches.append(
+            f"{name}: packed events differ from the MIDI file at {event_difference}"
+        )
+    return mismatches
+
+
+@click.command()
+@click.option(
+    "--digests",
+    "digests_path",
+    default=DEFAULT_GOLDEN_DIGESTS_PATH,
+    help="The path of the golden digests file.",
+    show_default=True,
+    type=str,
+)
+@click.option(
+    "--midi-dir",
+    default="",
+    help="A directory of golden MIDI files, written by --update and diffed against on a mismatch.",
+    show_default=True,
+    type=str,
+)
+@click.option(
+    "--update",
+    is_flag=True,
+    help="Write the golden digests, and the golden MIDI files if --midi-dir is given, from the current code.",
+    type=bool,
+)
+def golden(digests_path: str, midi_dir: str, update: bool):
+    """Checks the MIDI rendered for a matrix of settings against golden digests."""
+
+    render_plans = golden_render_plans()
+    if update:
+        with open(digests_path, "w") as digests_file:
+            json.dump(golden_digests(render_plans), digests_file, indent=1)
+            digests_file.write("\n")
+        if midi_dir:
+            os.makedirs(midi_dir, exist_ok=True)
+            for name, render_plan in render_plans.items():
+                with open(os.path.join(midi_dir, f"{name}.mid"), "wb") as midi_file:
+                    midi_file.write(render_golden_file(render_plan))
+        click.echo(f"Updated {len(render_plans)} golden cases in {digests_path}")
+        return
+
+    with open(digests_path) as digests_file:
+        digests = json.load(digests_file)
+    mismatches = check_golden_digests(digests, render_plans, midi_dir)
+    matches = len(
+        render_plans.keys() - {mismatch.split(": ", 1)[0] for mismatch in mismatches}
+    )
+    for name in sorted(digests["cases"].keys() - render_plans.keys()):
+        mismatches.append(f"{name}: golden case no longer rendered")
+    for mismatch in mismatches:
+        click.echo(mismatch)
+    click.echo(f"{matches} of {len(render_plans)} golden cases match")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    golden()
@@ -1,5 +1,10 @@
+from dataclasses import dataclass
 from math import cos, sin
-from typing import Callable, Generator
+from typing import Callable, Generator, Optional
+
+import numpy as np
+
+DEFAULT_BATCH_SIZE = 1024
 
 
 def equation_a(x: float, y: float, a: float) -> float:
@@ -39,6 +44,78 @@ def henon_mapping_generator(
             yield x, y
 
 
+def henon_mapping_chunk(
+    a_parameter: float,
+    initial_x: float,
+    initial_y: float,
+    count: int,
+) -> tuple[list[float], list[float]]:
+    """
+    Returns up to count successive data points of the Henon mapping as separate x and y lists.
+    Fewer points are returned if the mapping diverges, matching henon_mapping_generator.
+    """
+    cos_a = cos(a_parameter)
+    sin_a = sin(a_parameter)
+    x = initial_x
+    y = initial_y
+    xs: list[float] = []
+    ys: list[float] = []
+    append_x = xs.append
+    append_y = ys.append
+    try:
+        for _ in range(count):
+            x_squared = x**2
+            x, y = (x * cos_a) - ((y - x_squared) * sin_a), (x * sin_a) + (
+                (y - x_squared) * cos_a
+            )
+            append_x(x)
+            append_y(y)
+    except OverflowError:
+        pass
+    return xs, ys
+
+
+def orbit_starting_radii(starting_radius: float, radial_step: float) -> list[float]:
+    """
+    Returns the starting radius of each orbit of RadiallyExpandingHenonMappingsGenerator, accumulated
+    in the same way so that the values are identical.
+    """
+    radii = []
+    radius = starting_radius
+    while radius <= 1:
+        radii.append(radius)
+        radius += radial_step
+    return radii
+
+
+@dataclass(frozen=True)
+class HenonDataBatch:
+    x: np.ndarray
+    y: np.ndarray
+    orbit: np.ndarray
+    iteration: np.ndarray
+    new_orbit: np.ndarray
+    radius: Optional[np.ndarray] = None
+    a_parameter: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def __getitem__(self, index: slice) -> "HenonDataBatch":
+        return HenonDataBatch(
+            x=self.x[index],
+            y=self.y[index],
+            orbit=self.orbit[index],
+            iteration=self.iteration[index],
+            new_orbit=self.new_orbit[index],
+            radius=None if self.radius is None else self.radius[index],
+            a_parameter=None if self.a_parameter is None else self.a_parameter[index],
+        )
+
+    def data_points(self) -> list[tuple[float, float]]:
+        return list(zip(self.x.tolist(), self.y.tolist()))
+
+
 class RadiallyExpandingHenonMappingsGenerator:
     def __init__(
         self,
@@ -51,63 +128,221 @@ class RadiallyExpandingHenonMappingsGenerator:
         self.iterations_per_orbit = iterations_per_orbit
         self.starting_radius = starting_radius
         self.radial_step = radial_step
-        self.henon_mapping_generator = henon_mapping_generator(
-            a_parameter, starting_radius, starting_radius
-        )
-        self.data_point_generator = self._radially_expanding_henon_mappings_generator()
-        self.current_orbital_iteration = 0
-        self.current_iteration = 0
-        self.iteration_of_current_orbit = 0
         self.times_reset = 0
-        self.current_radius = starting_radius
-        self.current_data_point = (starting_radius, starting_radius)
+        self._buffer_x: list[float] = []
+        self._buffer_y: list[float] = []
+        self._buffer_position = 0
+        self._reset_pass()
 
     def generate_next_data_point(self) -> tuple[float, float]:
         """
         Returns the next data point in the sequence.
         If the sequence has reached the end, it will restart the sequence and return the first data point.
         """
-        try:
-            data_point = next(self.data_point_generator)
-        except StopIteration:
+        data_point = self._next_data_point()
+        if data_point is None:
             self.restart_data_point_generator()
-            data_point = next(self.data_point_generator)
+            data_point = self._next_data_point()
+            if data_point is None:
+                raise StopIteration
         return data_point
 
+    def next_batch(self, n: int = DEFAULT_BATCH_SIZE) -> HenonDataBatch:
+        """
+        Returns up to n of the next data points in the sequence as arrays, alongside the orbit,
+        orbit radius, iteration and new orbit flag of each point.
+        Unlike generate_next_data_point, the sequence is not restarted when it reaches the end,
+        fewer than n points (possibly none) are returned instead.
+        """
+        xs: list[list[float]] = []
+        ys: list[list[float]] = []
+        orbits: list[np.ndarray] = []
+        iterations: list[np.ndarray] = []
+        new_orbits: list[np.ndarray] = []
+        radii: list[np.ndarray] = []
+        remaining = n
+        while remaining > 0 and self._fill_orbit_buffer():
+            start = self._buffer_position
+            stop = min(len(self._buffer_x), start + remaining)
+            count = stop - start
+            xs.append(self._buffer_x[start:stop])
+            ys.append(self._buffer_y[start:stop])
+            orbits.append(np.full(count, self.current_orbital_iteration))
+            radii.append(np.full(count, self.current_radius))
+            iterations.append(
+                np.arange(
+                    self.current_iteration + 1, self.current_iteration + count + 1
+                )
+            )
+            new_orbit = np.zeros(count, dtype=bool)
+            if self.iteration_of_current_orbit == 0:
+                new_orbit[0] = True
+            new_orbits.append(new_orbit)
+
+            self._buffer_position = stop
+            self.current_iteration += count
+            self.iteration_of_current_orbit += count
+            self.current_data_point = (
+                self._buffer_x[stop - 1],
+                self._buffer_y[stop - 1],
+            )
+            remaining -= count
+
+        if not xs:
+            return HenonDataBatch(
+                x=np.empty(0),
+                y=np.empty(0),
+                orbit=np.empty(0, dtype=int),
+                iteration=np.empty(0, dtype=int),
+                new_orbit=np.empty(0, dtype=bool),
+                radius=np.empty(0),
+            )
+        return HenonDataBatch(
+            x=np.fromiter((x for chunk in xs for x in chunk), dtype=float),
+            y=np.fromiter((y for chunk in ys for y in chunk), dtype=float),
+            orbit=np.concatenate(orbits),
+            iteration=np.concatenate(iterations),
+            new_orbit=np.concatenate(new_orbits),
+            radius=np.concatenate(radii),
+        )
+
     def restart_data_point_generator(self):
         """
-        Creates a new data point generator. This is useful if you want to restart the sequence.
+        Restarts the sequence from the starting radius.
         """
         self.times_reset += 1
-        self.data_point_generator = self._radially_expanding_henon_mappings_generator()
+        self._reset_pass()
 
-    def _radially_expanding_henon_mappings_generator(
-        self,
-    ) -> Generator[tuple[float, float], None, None]:
+    def skip_to_radius(self, radius: float):
+        """
+        Abandons the current orbit and continues the sequence with a new orbit at radius.
+        Restarting the sequence still returns to the starting radius.
+        """
+        self.current_radius = radius
+        self._orbit_active = False
+        self._exhausted = False
+        self._orbit_points_remaining = 0
+        self._buffer_x = []
+        self._buffer_y = []
+        self._buffer_position = 0
+
+    def get_state(self) -> dict:
+        """
+        Returns the complete position in the sequence, including any data points already computed
+        but not yet read, as plain values that round trip through JSON exactly. A generator created
+        with from_state continues with the same data points, bit for bit.
+        """
+        kept = min(self._buffer_position, 1)
+        start = self._buffer_position - kept
+        return {
+            "a_parameter": self.a_parameter,
+            "iterations_per_orbit": self.iterations_per_orbit,
+            "starting_radius": self.starting_radius,
+            "radial_step": self.radial_step,
+            "times_reset": self.times_reset,
+            "current_radius": self.current_radius,
+            "current_iteration": self.current_iteration,
+            "current_orbital_iteration": self.current_orbital_iteration,
+            "iteration_of_current_orbit": self.iteration_of_current_orbit,
+            "current_data_point": list(self.current_data_point),
+            "orbit_active": self._orbit_active,
+            "exhausted": self._exhausted,
+            "orbit_points_remaining": self._orbit_points_remaining,
+            "buffer_x": list(self._buffer_x[start:]),
+            "buffer_y": list(self._buffer_y[start:]),
+            "buffer_position": kept,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "RadiallyExpandingHenonMappingsGenerator":
+        henon_mappings_generator = cls(
+            a_parameter=state["a_parameter"],
+            iterations_per_orbit=state["iterations_per_orbit"],
+            starting_radius=state["starting_radius"],
+            radial_step=state["radial_step"],
+        )
+        henon_mappings_generator.times_reset = state["times_reset"]
+        henon_mappings_generator.current_radius = state["current_radius"]
+        henon_mappings_generator.current_iteration = state["current_iteration"]
+        henon_mappings_generator.current_orbital_iteration = state[
+            "current_orbital_iteration"
+        ]
+        henon_mappings_generator.iteration_of_current_orbit = state[
+            "iteration_of_current_orbit"
+        ]
+        henon_mappings_generator.current_data_point = tuple(state["current_data_point"])
+        henon_mappings_generator._orbit_active = state["orbit_active"]
+        henon_mappings_generator._exhausted = state["exhausted"]
+        henon_mappings_generator._orbit_points_remaining = state[
+            "orbit_points_remaining"
+        ]
+        henon_mappings_generator._buffer_x = list(state["buffer_x"])
+        henon_mappings_generator._buffer_y = list(state["buffer_y"])
+        henon_mappings_generator._buffer_position = state["buffer_position"]
+        return henon_mappings_generator
+
+    def _reset_pass(self):
         self._reset_to_starting_radius()
         self.current_iteration = 0
         self.current_orbital_iteration = 0
         self.iteration_of_current_orbit = 0
+        self._orbit_active = False
+        self._exhausted = False
+        self._orbit_points_remaining = 0
+        self._buffer_x = []
+        self._buffer_y = []
+        self._buffer_position = 0
 
-        while self.current_radius <= 1:
-            self.iteration_of_current_orbit = 0
-            self.current_orbital_iteration += 1
-            self.henon_mapping_generator = henon_mapping_generator(
-                self.a_parameter, self.current_radius, self.current_radius
-            )
+    def _fill_orbit_buffer(self) -> bool:
+        """
+        Makes sure there is at least one unread data point in the orbit buffer, computing the next chunk
+        of the current orbit or moving on to the next orbit as needed.
+        Returns False once every orbit up to a radius of 1 has been read.
+        """
+        while self._buffer_position >= len(self._buffer_x):
+            if self._exhausted:
+                return False
+            if self._orbit_active and self._orbit_points_remaining > 0:
+                if self._buffer_x:
+                    x, y = self._buffer_x[-1], self._buffer_y[-1]
+                else:
+                    x, y = self.current_radius, self.current_radius
+                chunk_size = min(self._orbit_points_remaining, DEFAULT_BATCH_SIZE)
+                self._buffer_x, self._buffer_y = henon_mapping_chunk(
+                    self.a_parameter, x, y, chunk_size
+                )
+                self._buffer_position = 0
+                if len(self._buffer_x) < chunk_size:
+                    self._orbit_points_remaining = 0
+                else:
+                    self._orbit_points_remaining -= chunk_size
+                continue
 
-            while self.iteration_of_current_orbit < self.iterations_per_orbit:
-                try:
-                    data_point = next(self.henon_mapping_generator)
-                except StopIteration:
-                    break
-                self.current_data_point = data_point
-                self.current_iteration += 1
-                self.current_data_point = data_point
-                self.iteration_of_current_orbit += 1
-                yield data_point
+            if self._orbit_active:
+                self.current_radius += self.radial_step
+            if self.current_radius > 1:
+                self._orbit_active = False
+                self._exhausted = True
+                return False
+            self.current_orbital_iteration += 1
+            self.iteration_of_current_orbit = 0
+            self._orbit_active = True
+            self._orbit_points_remaining = self.iterations_per_orbit
+            self._buffer_x = []
+            self._buffer_y = []
+            self._buffer_position = 0
+        return True
 
-            self.current_radius += self.radial_step
+    def _next_data_point(self) -> Optional[tuple[float, float]]:
+        if not self._fill_orbit_buffer():
+            return None
+        position = self._buffer_position
+        data_point = (self._buffer_x[position], self._buffer_y[position])
+        self._buffer_position = position + 1
+        self.current_iteration += 1
+        self.iteration_of_current_orbit += 1
+        self.current_data_point = data_point
+        return data_point
 
     def _reset_to_starting_radius(self):
         self.current_radius = self.starting_radius
@@ -138,4 +373,7 @@ class RadiallyExpandingHenonMappingsGenerator:
         return self
 
     def __next__(self):
-        return next(self.data_point_generator)
+        data_point = self._next_data_point()
+        if data_point is None:
+            raise StopIteration
+        return data_point
@@ -0,0 +1,153 @@
+import struct
+import zlib
+
+import numpy as np
+
+from henon2midi.ascii_art import canvas_coordinates_from_data_values
+from henon2midi.bifurcation import BifurcationScanner, bifurcation_diagram_batch
+from henon2midi.henon_equations import (
+    HenonDataBatch,
+    RadiallyExpandingHenonMappingsGenerator,
+)
+
+GOLDEN_RATIO_CONJUGATE = 0.618033988749895
+IMAGE_FORMATS = ("png", "ppm")
+
+
+def orbit_colors(orbit: np.ndarray, saturation: float = 0.75) -> np.ndarray:
+    """
+    Returns an RGB colour in the range [0, 1] for each orbit index, spreading successive orbits
+    around the hue circle.
+    """
+    hue = (orbit * GOLDEN_RATIO_CONJUGATE) % 1.0
+    sector = np.floor(hue * 6).astype(np.int64) % 6
+    fraction = hue * 6 - np.floor(hue * 6)
+    value = np.ones_like(hue)
+    p = value * (1 - saturation)
+    q = value * (1 - saturation * fraction)
+    t = value * (1 - saturation * (1 - fraction))
+    red = np.choose(sector, [value, q, p, p, t, value])
+    green = np.choose(sector, [t, value, value, q, p, p])
+    blue = np.choose(sector, [p, p, t, value, value, q])
+    return np.stack([red, green, blue], axis=-1)
+
+
+class DensityImage:
+    """
+    A fixed size framebuffer that accumulates how many data points land on each pixel and the mean
+    colour of their orbits, one batch at a time. Points are mapped onto pixels with
+    canvas_coordinates_from_data_values, as on the ASCII art canvas.
+    """
+
+    def __init__(self, width: int = 1024, height: int = 1024, clip: bool = False):
+        self.width = width
+        self.height = height
+        self.clip = clip
+        self.density = np.zeros(width * height, dtype=np.float64)
+        self.color_sums = np.zeros((3, width * height), dtype=np.float64)
+
+    def add_batch(self, batch: HenonDataBatch):
+        columns, rows, drawn = canvas_coordinates_from_data_values(
+            batch.x, batch.y, self.width, self.height, clip=self.clip
+        )
+        pixel_indices = rows[drawn] * self.width + columns[drawn]
+        number_of_pixels = self.width * self.height
+        self.density += np.bincount(pixel_indices, minlength=number_of_pixels)
+        colors = orbit_colors(batch.orbit[drawn])
+        for channel in range(3):
+            self.color_sums[channel] += np.bincount(
+                pixel_indices, weights=colors[:, channel], minlength=number_of_pixels
+            )
+
+    def render(self) -> np.ndarray:
+        """
+        Returns the image as a height x width x 3 array of bytes, with brightness proportional to
+        the log of the density.
+        """
+        brightness = np.log1p(self.density)
+        max_brightness = brightness.max()
+        if max_brightness > 0:
+            brightness /= max_brightness
+        mean_colors = self.color_sums / np.maximum(self.density, 1)
+        pixels = (mean_colors * brightness * 255).round().astype(np.uint8)
+        return pixels.T.reshape(self.height, self.width, 3)
+
+    def save(self, path: str, image_format: str = ""):
+        image_format = image_format or path.rsplit(".", 1)[-1].lower()
+        pixels = self.render()
+        if image_format == "png":
+            data = encode_png(pixels)
+        elif image_format == "ppm":
+            data = encode_ppm(pixels)
+        else:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        with open(path, "wb") as image_file:
+            image_file.write(data)
+
+
+def encode_ppm(pixels: np.ndarray) -> bytes:
+    height, width, _ = pixels.shape
+    return f"P6\n{width} {height}\n255\n".encode() + pixels.tobytes()
+
+
+def encode_png(pixels: np.ndarray) -> bytes:
+    height, width, _ = pixels.shape
+    scanlines = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    scanlines[:, 1:] = pixels.reshape(height, width * 3)
+
+    def chunk(chunk_type: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data))
+            + chunk_type
+            + data
+            + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF)
+        )
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(scanlines.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def render_henon_image(
+    henon_mappings_generator: RadiallyExpandingHenonMappingsGenerator,
+    path: str,
+    width: int = 1024,
+    height: int = 1024,
+    clip: bool = False,
+) -> DensityImage:
+    """
+    Plots every remaining data point of the generator into a DensityImage and saves it to path, in
+    the format given by its extension.
+    """
+    density_image = DensityImage(width, height, clip=clip)
+    while True:
+        batch = henon_mappings_generator.next_batch()
+        if len(batch) == 0:
+            break
+        density_image.add_batch(batch)
+    density_image.save(path)
+    return density_image
+
+
+def render_bifurcation_image(
+    bifurcation_scanner: BifurcationScanner,
+    path: str,
+    width: int = 1024,
+    height: int = 1024,
+) -> DensityImage:
+    """
+    Plots a scan as a bifurcation diagram, with a increasing to the right and x increasing upwards,
+    into a DensityImage and saves it to path, in the format given by its extension.
+    """
+    density_image = DensityImage(width, height)
+    for batch in bifurcation_scanner.batches():
+        density_image.add_batch(
+            bifurcation_diagram_batch(
+                batch, bifurcation_scanner.a_start, bifurcation_scanner.a_stop
+            )
+        )
+    density_image.save(path)
+    return density_image
@@ -0,0 +1,330 @@
+import multiprocessing
+from multiprocessing import shared_memory
+from time import sleep
+from typing import Iterator, Optional
+
+import numpy as np
+
+from henon2midi.active_voices import SUSTAIN_CONTROL
+from henon2midi.midi import CONTROL_CHANGE, MIDI_EVENT_DTYPE, MidiMessagePlayer
+from henon2midi.midi_file import META_END_OF_TRACK, META_EVENT
+from henon2midi.render_plan import RenderPlan
+
+DEFAULT_LOOKAHEAD_BEATS = 4.0
+DEFAULT_RING_CAPACITY = 1 << 16
+# How long either process sleeps before looking at the ring again when it has to wait.
+POLL_INTERVAL_S = 0.001
+# The player hands at most this share of the lookahead window to the MIDI output at once, so the
+# window is refilled steadily while it plays.
+PLAY_SHARE_OF_LOOKAHEAD = 0.25
+
+# Slots of the counters at the start of the shared memory. The render process only writes the
+# first four and the playing process only the last four, so neither needs a lock.
+_WRITE_INDEX = 0
+_WRITE_TICK = 1
+_PRIMED = 2
+_OVERRUNS = 3
+_READ_INDEX = 4
+_READ_TICK = 5
+_UNDERRUNS = 6
+_STOPPED = 7
+_NUMBER_OF_COUNTERS = 8
+_COUNTERS_SIZE = _NUMBER_OF_COUNTERS * 8
+# Set in the primed slot once the render process has rendered everything.
+_FINISHED = 2
+
+
+class MidiEventRing:
+    """
+    A ring buffer of packed MIDI events (see MIDI_EVENT_DTYPE) in shared memory, written by one
+    process and read by another. The write and read indices count every event ever written and
+    read, and the write and read ticks the sum of their delta times, so the ticks written ahead of
+    playback are write_tick - read_tick. Each process only writes its own counters, and the write
+    index is only moved on after the events are in place.
+    Pickling the ring, e.g. to start a process with it, attaches the other process by name. Only
+    the process that created the ring unlinks it.
+    """
+
+    def __init__(
+        self, capacity: int = DEFAULT_RING_CAPACITY, name: Optional[str] = None
+    ):
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1: {capacity}")
+        self.capacity = capacity
+        self.shared_memory = shared_memory.SharedMemory(
+            name=name,
+            create=name is None,
+            size=_COUNTERS_SIZE + capacity * MIDI_EVENT_DTYPE.itemsize,
+        )
+        self.counters = np.ndarray(
+            _NUMBER_OF_COUNTERS, dtype=np.int64, buffer=self.shared_memory.buf
+        )
+        self.events = np.ndarray(
+            capacity,
+            dtype=MIDI_EVENT_DTYPE,
+            buffer=self.shared_memory.buf,
+            offset=_COUNTERS_SIZE,
+        )
+        if name is None:
+            self.counters[:] = 0
+
+    def __getstate__(self) -> tuple[int, str]:
+        return self.capacity, self.shared_memory.name
+
+    def __setstate__(self, state: tuple[int, str]):
+        capacity, name = state
+        self.__init__(capacity, name)  # type: ignore
+
+    @property
+    def underruns(self) -> int:
+        """
+        The number of times the player found the ring empty before everything was rendered.
+        """
+        return int(self.counters[_UNDERRUNS])
+
+    @property
+    def overruns(self) -> int:
+        """
+        The number of times the render process found the ring full while the lookahead window still
+        had room, meaning the ring is too small for the window.
+        """
+        return int(self.counters[_OVERRUNS])
+
+    @property
+    def buffered_events(self) -> int:
+        return int(self.counters[_WRITE_INDEX] - self.counters[_READ_INDEX])
+
+    @property
+    def buffered_ticks(self) -> int:
+        return int(self.counters[_WRITE_TICK] - self.counters[_READ_TICK])
+
+    @property
+    def primed(self) -> bool:
+        return bool(self.counters[_PRIMED])
+
+    @property
+    def finished(self) -> bool:
+        return self.counters[_PRIMED] == _FINISHED
+
+    @property
+    def stopped(self) -> bool:
+        return bool(self.counters[_STOPPED])
+
+    def write(self, events: np.ndarray, max_ticks: int) -> int:
+        """
+        Writes as many of events as fit in the ring without taking the ticks written ahead of
+        playback over max_ticks, and at least one if the ring is empty, and returns the number
+        written.
+        """
+        free = self.capacity - self.buffered_events
+        event_ticks = np.cumsum(events["tick"], dtype=np.int64)
+        count = min(free, int(np.searchsorted(event_ticks, max_ticks, side="right")))
+        if count == 0 and free == self.capacity and len(events):
+            count = 1
+        if count == 0:
+            return 0
+        start = int(self.counters[_WRITE_INDEX]) % self.capacity
+        end = min(start + count, self.capacity)
+        first_part = end - start
+        self.events[start:end] = events[:first_part]
+        self.events[: count - first_part] = events[first_part:count]
+        self.counters[_WRITE_TICK] += event_ticks[count - 1]
+        self.counters[_WRITE_INDEX] += count
+        return count
+
+    def read(self, max_ticks: int) -> np.ndarray:
+        """
+        Returns a view of the unread events up to the end of the ring whose delta times add up to at
+        most max_ticks, and at least one if there are any. They stay in place until released.
+        """
+        start = int(self.counters[_READ_INDEX]) % self.capacity
+        end = min(start + self.buffered_events, self.capacity)
+        events = self.events[start:end]
+        event_ticks = np.cumsum(events["tick"], dtype=np.int64)
+        count = max(1, int(np.searchsorted(event_ticks, max_ticks, side="right")))
+        return events[:count]
+
+    def release(self, events: np.ndarray):
+        """
+        Hands events, as returned by read, back to the render process once played.
+        """
+        self.counters[_READ_TICK] += int(events["tick"].sum(dtype=np.int64))
+        self.counters[_READ_INDEX] += len(events)
+
+    def close(self):
+        del self.counters, self.events
+        self.shared_memory.close()
+
+
+def iterate_packed_events(
+    render_plan: RenderPlan, continual_loop: bool = False
+) -> Iterator[np.ndarray]:
+    """
+    Yields the packed MIDI events (see MIDI_EVENT_DTYPE) of render_plan batch by batch, the same
+    events as the MIDI file of render_plan has, without creating any messages. The last event is
+    the end of track, a META_EVENT whose first data byte is META_END_OF_TRACK.
+    """
+    henon_mappings_generator = render_plan.create_generator()
+    data_points_to_midi_converter = render_plan.create_converter()
+    active_voice_table = render_plan.create_active_voice_table()
+    if render_plan.sustain:
+        events = np.array(
+            [(0, CONTROL_CHANGE, SUSTAIN_CONTROL, 127, 0)], dtype=MIDI_EVENT_DTYPE
+        )
+        if active_voice_table is not None:
+            events = active_voice_table.process_events(events)
+        yield events
+    while True:
+        batch = henon_mappings_generator.next_batch()
+        if len(batch) == 0:
+            if not continual_loop:
+                break
+            henon_mappings_generator.restart_data_point_generator()
+            continue
+        events, _ = data_points_to_midi_converter.convert_events(batch.x, batch.y)
+        if active_voice_table is not None:
+            events = active_voice_table.process_events(events)
+        yield events
+    if active_voice_table is not None:
+        yield active_voice_table.release_all_events()
+    yield np.array(
+        [(data_points_to_midi_converter.flush(), META_EVENT, META_END_OF_TRACK, 0, 0)],
+        dtype=MIDI_EVENT_DTYPE,
+    )
+
+
+def render_events_to_ring(
+    render_plan: RenderPlan,
+    midi_event_ring: MidiEventRing,
+    lookahead_ticks: int,
+    continual_loop: bool = False,
+):
+    """
+    Renders the MIDI events of render_plan as the live loop does into midi_event_ring, never more
+    than lookahead_ticks ahead of playback. The events only depend on render_plan, not on how fast
+    either process runs. Returns early once the ring is stopped.
+    """
+    try:
+        for events in iterate_packed_events(render_plan, continual_loop):
+            if midi_event_ring.stopped:
+                break
+            _write_events_to_ring(events, midi_event_ring, lookahead_ticks)
+        midi_event_ring.counters[_PRIMED] = _FINISHED
+    except KeyboardInterrupt:
+        pass
+    finally:
+        midi_event_ring.close()
+
+
+def _write_events_to_ring(
+    events: np.ndarray, midi_event_ring: MidiEventRing, lookahead_ticks: int
+):
+    overrunning = False
+    while len(events) and not midi_event_ring.stopped:
+        written = midi_event_ring.write(
+            events, lookahead_ticks - midi_event_ring.buffered_ticks
+        )
+        events = events[written:]
+        if written == 0 or len(events):
+            midi_event_ring.counters[_PRIMED] = 1
+            if (
+                midi_event_ring.buffered_events == midi_event_ring.capacity
+                and midi_event_ring.buffered_ticks < lookahead_ticks
+                and not overrunning
+            ):
+                midi_event_ring.counters[_OVERRUNS] += 1
+                overrunning = True
+            sleep(POLL_INTERVAL_S)
+        else:
+            overrunning = False
+
+
+class LookaheadRenderer:
+    """
+    Renders the MIDI events of a render plan in a separate process, up to lookahead_beats ahead of
+    playback, and plays them from a MidiEventRing of ring_capacity events, so a pause in either
+    process only delays the other once the window is used up. Playing does nothing but timed
+    writes of the packed events.
+    """
+
+    def __init__(
+        self,
+        render_plan: RenderPlan,
+        lookahead_beats: float = DEFAULT_LOOKAHEAD_BEATS,
+        ring_capacity: int = DEFAULT_RING_CAPACITY,
+        continual_loop: bool = False,
+    ):
+        self.lookahead_ticks = int(lookahead_beats * render_plan.ticks_per_beat)
+        if self.lookahead_ticks < 1:
+            raise ValueError(f"lookahead_beats must be positive: {lookahead_beats}")
+        self.play_ticks = max(1, int(self.lookahead_ticks * PLAY_SHARE_OF_LOOKAHEAD))
+        self.midi_event_ring = MidiEventRing(ring_capacity)
+        self.process = multiprocessing.Process(
+            target=render_events_to_ring,
+            args=(
+                render_plan,
+                self.midi_event_ring,
+                self.lookahead_ticks,
+                continual_loop,
+            ),
+            daemon=True,
+        )
+        self.process.start()
+
+    def wait_until_primed(self):
+        """
+        Waits until the lookahead window is full or everything is rendered.
+        """
+        while not self.midi_event_ring.primed:
+            self._check_render_process()
+            sleep(POLL_INTERVAL_S)
+
+    def play(self, midi_message_player: MidiMessagePlayer):
+        """
+        Plays every event rendered to midi_message_player, once the window is primed.
+        """
+        midi_event_ring = self.midi_event_ring
+        self.wait_until_primed()
+        underrunning = False
+        while True:
+            finished = midi_event_ring.finished
+            if midi_event_ring.buffered_events == 0:
+                if finished:
+                    return
+                self._check_render_process()
+                if not underrunning:
+                    midi_event_ring.counters[_UNDERRUNS] += 1
+                    underrunning = True
+                sleep(POLL_INTERVAL_S)
+                continue
+            underrunning = False
+            events = midi_event_ring.read(self.play_ticks)
+            if events["status"][-1] == META_EVENT:
+                # Only the end of track is rendered as a meta event, after everything else, and
+                # nothing is sent for it.
+                midi_message_player.send_events(events[:-1])
+                midi_message_player.advance(int(events["tick"][-1]))
+            else:
+                midi_message_player.send_events(events)
+            midi_event_ring.release(events)
+
+    def close(self):
+        """
+        Stops the render process and frees the ring.
+        """
+        self.midi_event_ring.counters[_STOPPED] = 1
+        self.process.join()
+        self.midi_event_ring.close()
+        self.midi_event_ring.shared_memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _check_render_process(self):
+        if not self.process.is_alive() and not self.midi_event_ring.finished:
+            raise RuntimeError(
+                f"The render process exited with code {self.process.exitcode}"
+            )
@@ -1,27 +1,91 @@
+from functools import lru_cache
+
+import numpy as np
+
+RANGE_MAPPER_MODES = ("clip", "discard", "mask")
+# The number of recently used range mappers kept by get_range_mapper. Ranges can be changed at any
+# time by live parameter control, so the cache is bounded.
+RANGE_MAPPER_CACHE_SIZE = 64
+
+
+class RangeMapper:
+    """
+    Rescales values from initial_range to new_range with the affine coefficients computed once.
+    Both entry points also return whether values were within initial_range. Values outside
+    initial_range are handled according to mode:
+        clip: clipped to initial_range before rescaling.
+        discard: dropped from the array results, rescaled as is by the scalar entry point.
+        mask: rescaled as is.
+    """
+
+    def __init__(
+        self,
+        initial_range: tuple[float, float],
+        new_range: tuple[float, float],
+        mode: str = "clip",
+    ):
+        if mode not in RANGE_MAPPER_MODES:
+            raise ValueError(f"Unknown range mapper mode: {mode}")
+        self.initial_range = initial_range
+        self.new_range = new_range
+        self.mode = mode
+        self.initial_range_min = initial_range[0]
+        self.initial_range_max = initial_range[1]
+        self.new_range_min = new_range[0]
+        self.scale_factor = (new_range[1] - new_range[0]) / (
+            initial_range[1] - initial_range[0]
+        )
+
+    def rescale(self, x: float) -> tuple[float, bool]:
+        valid = True
+        if x < self.initial_range_min:
+            valid = False
+            if self.mode == "clip":
+                x = self.initial_range_min
+        elif x > self.initial_range_max:
+            valid = False
+            if self.mode == "clip":
+                x = self.initial_range_max
+        x_rescaled = ((x - self.initial_range_min) * self.scale_factor) + (
+            self.new_range_min
+        )
+        return x_rescaled, valid
+
+    def rescale_array(self, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the rescaled values and a mask of which values were within initial_range.
+        In discard mode only the rescaled values that were within initial_range are returned.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        valid = (values >= self.initial_range_min) & (values <= self.initial_range_max)
+        if self.mode == "clip":
+            values = np.clip(values, self.initial_range_min, self.initial_range_max)
+        elif self.mode == "discard":
+            values = values[valid]
+        rescaled = ((values - self.initial_range_min) * self.scale_factor) + (
+            self.new_range_min
+        )
+        return rescaled, valid
+
+
+@lru_cache(maxsize=RANGE_MAPPER_CACHE_SIZE)
+def get_range_mapper(
+    initial_range: tuple[float, float],
+    new_range: tuple[float, float],
+    mode: str = "clip",
+) -> RangeMapper:
+    return RangeMapper(initial_range, new_range, mode)
+
+
 def rescale_number_to_range(
     x: float,
     initial_range: tuple[float, float],
     new_range: tuple[float, float],
     clip_value: bool = True,
 ) -> float:
-    if clip_value:
-        if x < initial_range[0]:
-            x = initial_range[0]
-        elif x > initial_range[1]:
-            x = initial_range[1]
-    else:
-        if x < initial_range[0] or x > initial_range[1]:
-            raise ValueError(f"x ({x}) is not within initial_range ({initial_range})")
-
-    initial_range_min = initial_range[0]
-    initial_range_max = initial_range[1]
-    initial_range_size = initial_range_max - initial_range_min
-
-    new_range_min = new_range[0]
-    new_range_max = new_range[1]
-    new_range_size = new_range_max - new_range_min
-
-    scale_factor = new_range_size / initial_range_size
-    x_rescaled = ((x - initial_range_min) * scale_factor) + new_range_min
-
+    x_rescaled, valid = get_range_mapper(
+        tuple(initial_range), tuple(new_range), "clip" if clip_value else "mask"
+    ).rescale(x)
+    if not valid and not clip_value:
+        raise ValueError(f"x ({x}) is not within initial_range ({initial_range})")
     return x_rescaled
@@ -1,6 +1,7 @@
 from time import sleep, time
-from typing import Optional, Union
+from typing import Callable, Optional, Union
 
+import numpy as np
 from mido import (
     Message,
     MetaMessage,
@@ -13,6 +14,67 @@ from mido import (
 )
 from mido.backends.rtmidi import Output
 
+# A packed MIDI event: delta time in ticks followed by up to three raw message bytes.
+MIDI_EVENT_DTYPE = np.dtype(
+    [
+        ("tick", "<u4"),
+        ("status", "u1"),
+        ("data1", "u1"),
+        ("data2", "u1"),
+        ("padding", "u1"),
+    ]
+)
+MIDI_EVENT_STATUS_OFFSET = 4
+
+# Number of bytes in a MIDI message, indexed by status byte. Data bytes, system exclusive, whose
+# length varies, and the undefined statuses are 0 as they cannot be packed.
+MIDI_MESSAGE_LENGTHS = np.zeros(256, dtype=np.uint8)
+MIDI_MESSAGE_LENGTHS[0x80:0xF0] = 3
+MIDI_MESSAGE_LENGTHS[0xC0:0xE0] = 2
+MIDI_MESSAGE_LENGTHS[[0xF1, 0xF3]] = 2
+MIDI_MESSAGE_LENGTHS[0xF2] = 3
+MIDI_MESSAGE_LENGTHS[[0xF6, 0xF8, 0xFA, 0xFB, 0xFC, 0xFE, 0xFF]] = 1
+
+DEFAULT_TEMPO = 500000
+
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+CONTROL_CHANGE = 0xB0
+
+# Controller resets sent on every channel by MidiMessagePlayer.reset:
+# sustain off, modulation 0, pan centre, reset all controllers and all notes off.
+RESET_CONTROLLER_BYTES = [
+    bytes([CONTROL_CHANGE | channel, control, value])
+    for channel in range(16)
+    for control, value in ((64, 0), (1, 0), (10, 64), (121, 0), (123, 0))
+]
+ALL_NOTE_OFF_BYTES = [
+    bytes([NOTE_OFF | channel, note, 0]) for channel in range(16) for note in range(128)
+]
+
+# Number of recent events whose lateness is kept by MidiMessagePlayer, a power of two.
+LATENESS_HISTORY_SIZE = 4096
+
+MidiEventBuffer = Union[np.ndarray, bytes, bytearray, memoryview]
+
+
+def pack_midi_messages(messages: list[Message]) -> np.ndarray:
+    events = np.zeros(len(messages), dtype=MIDI_EVENT_DTYPE)
+    for index, msg in enumerate(messages):
+        msg_bytes = msg.bytes()
+        if len(msg_bytes) != MIDI_MESSAGE_LENGTHS[msg_bytes[0]]:
+            raise ValueError(f"Only messages of up to 3 bytes can be packed: {msg}")
+        events[index] = (msg.time, *msg_bytes, *([0] * (4 - len(msg_bytes))))
+    return events
+
+
+def as_midi_event_array(events: MidiEventBuffer) -> np.ndarray:
+    if isinstance(events, np.ndarray):
+        if events.dtype != MIDI_EVENT_DTYPE:
+            raise ValueError(f"Expected events of dtype {MIDI_EVENT_DTYPE}")
+        return np.ascontiguousarray(events)
+    return np.frombuffer(events, dtype=MIDI_EVENT_DTYPE)
+
 
 class MidiMessagePlayer:
     def __init__(
@@ -23,6 +85,35 @@ class MidiMessagePlayer:
         self.tempo = bpm2tempo(bpm)
         self.playback_start_time = time()
         self.input_time = 0.0
+        # The position in ticks of the latest event, which unlike input_time is kept by reset.
+        self.tick = 0
+        self.sounding_notes = np.zeros((16, 128), dtype=bool)
+        self.events_sent = 0
+        # Seconds each recent event was sent after its scheduled time, as a ring buffer indexed by
+        # events_sent.
+        self.lateness_s = np.zeros(LATENESS_HISTORY_SIZE)
+        self._send_message = self._get_raw_message_sender()
+
+    def _get_raw_message_sender(self) -> Callable:
+        rtmidi_output = getattr(self.midi_output, "_rt", None)
+        if rtmidi_output is not None:
+            return rtmidi_output.send_message
+        return lambda data: self.midi_output.send(Message.from_bytes(bytes(data)))
+
+    def set_bpm(self, bpm: int):
+        """
+        Changes the tempo of events sent from now on, without moving events already sent.
+        """
+        self.tempo = bpm2tempo(bpm)
+
+    def advance(self, ticks: int):
+        """
+        Moves the time of the next event on by ticks without sending anything.
+        """
+        self.tick += ticks
+        self.input_time += tick2second(
+            ticks, ticks_per_beat=self.ticks_per_beat, tempo=self.tempo
+        )
 
     def send(self, messages: Union[Message, list[Message]]):
         if isinstance(messages, Message):
@@ -32,38 +123,129 @@ class MidiMessagePlayer:
                 msg.time, ticks_per_beat=self.ticks_per_beat, tempo=self.tempo
             )
             self.input_time += time_s
+            self.tick += msg.time
             current_playback_time = time() - self.playback_start_time
             duration_to_next_event_s = self.input_time - current_playback_time
 
             if duration_to_next_event_s > 0:
                 sleep(duration_to_next_event_s)
+                current_playback_time = time() - self.playback_start_time
 
             self.midi_output.send(msg)
+            self._record_lateness(current_playback_time - self.input_time)
+            if msg.type == "note_on" or msg.type == "note_off":
+                self.sounding_notes[msg.channel, msg.note] = (
+                    msg.type == "note_on" and msg.velocity > 0
+                )
+
+    def send_bytes(self, data: Union[bytes, bytearray, memoryview], ticks: int = 0):
+        """
+        Sends a single pre-encoded MIDI message, ticks after the previous one.
+        """
+        self.tick += ticks
+        self.input_time += tick2second(
+            ticks, ticks_per_beat=self.ticks_per_beat, tempo=self.tempo
+        )
+        duration_to_next_event_s = self.input_time - (time() - self.playback_start_time)
+        if duration_to_next_event_s > 0:
+            sleep(duration_to_next_event_s)
+            duration_to_next_event_s = self.input_time - (
+                time() - self.playback_start_time
+            )
+        self._send_message(data)
+        self._record_lateness(-duration_to_next_event_s)
+        message_type = data[0] & 0xF0
+        if message_type == NOTE_ON or message_type == NOTE_OFF:
+            self.sounding_notes[data[0] & 0x0F, data[1]] = (
+                message_type == NOTE_ON and data[2] > 0
+            )
+
+    def send_events(self, events: MidiEventBuffer):
+        """
+        Sends a buffer of packed MIDI events (see MIDI_EVENT_DTYPE) with the same timing as send.
+        Raw bytes are written straight to the rtmidi output when available.
+        """
+        events = as_midi_event_array(events)
+        if len(events) == 0:
+            return
+        seconds_per_tick = self.tempo * 1e-6 / self.ticks_per_beat
+        event_ticks = np.cumsum(events["tick"], dtype=np.int64)
+        event_times = self.input_time + event_ticks * seconds_per_tick
+        raw = events.view(np.uint8).data
+        message_starts = (
+            np.arange(len(events)) * MIDI_EVENT_DTYPE.itemsize
+            + MIDI_EVENT_STATUS_OFFSET
+        )
+        message_lengths = MIDI_MESSAGE_LENGTHS[events["status"]]
+        if not message_lengths.all():
+            raise ValueError(
+                "Events must start with the status byte of a packable message"
+            )
+        message_ends = message_starts + message_lengths
+        send_message = self._send_message
+        playback_start_time = self.playback_start_time
+        lateness_s = self.lateness_s
+        lateness_mask = LATENESS_HISTORY_SIZE - 1
+        events_sent = self.events_sent
 
-    def reset(self):
+        # Notes turned on anywhere in the buffer are marked as sounding up front so that a reset
+        # after an interrupted send still turns them off; the final state is recorded afterwards.
+        message_types = events["status"] & 0xF0
+        is_note_on = (message_types == NOTE_ON) & (events["data2"] > 0)
+        is_note_event = (message_types == NOTE_ON) | (message_types == NOTE_OFF)
+        note_channels = (events["status"] & 0x0F)[is_note_event]
+        notes = events["data1"][is_note_event]
+        notes_on = is_note_on[is_note_event]
+        self.sounding_notes[note_channels[notes_on], notes[notes_on]] = True
+
+        for event_time, message_start, message_end in zip(
+            event_times.tolist(), message_starts.tolist(), message_ends.tolist()
+        ):
+            duration_to_next_event_s = event_time - (time() - playback_start_time)
+            if duration_to_next_event_s > 0:
+                sleep(duration_to_next_event_s)
+                duration_to_next_event_s = event_time - (time() - playback_start_time)
+            send_message(raw[message_start:message_end])
+            lateness_s[events_sent & lateness_mask] = -duration_to_next_event_s
+            events_sent += 1
+        self.events_sent = events_sent
+        self.input_time = float(event_times[-1])
+        self.tick += int(event_ticks[-1])
+        # A note can be turned on and off several times in the buffer, and its last event decides
+        # whether it is left sounding.
+        note_keys = (note_channels.astype(np.intp) * 128 + notes)[::-1]
+        last_note_keys, last_indices = np.unique(note_keys, return_index=True)
+        self.sounding_notes.reshape(-1)[last_note_keys] = notes_on[::-1][last_indices]
+
+    def recent_lateness_s(self) -> np.ndarray:
+        """
+        Returns a copy of the lateness of up to LATENESS_HISTORY_SIZE of the most recent events, in
+        no particular order. Safe to call from another thread while events are being sent.
+        """
+        return self.lateness_s[: min(self.events_sent, LATENESS_HISTORY_SIZE)].copy()
+
+    def _record_lateness(self, lateness_s: float):
+        self.lateness_s[self.events_sent & (LATENESS_HISTORY_SIZE - 1)] = lateness_s
+        self.events_sent += 1
+
+    def reset(self, all_notes: bool = False):
+        """
+        Immediately turns off sounding notes and resets controllers on all channels, bypassing the
+        timing of send. Only notes tracked as sounding are sent note offs unless all_notes is set.
+        """
         self.playback_start_time = time()
         self.input_time = 0.0
-        self.midi_output.reset()
-
-        sustain_off_msg = Message("control_change", control=64, value=0)
-        reset_modulation_msg = Message("control_change", control=1, value=0)
-        reset_pan_msg = Message("control_change", control=10, value=64)
-        reset_all_controllers_msg = Message("control_change", control=121, value=0)
-        all_notes_off_msg = Message("control_change", control=123, value=0)
-        note_off_msgs = [
-            Message("note_off", note=note, velocity=0) for note in range(128)
-        ]
-
-        self.send(
-            [
-                sustain_off_msg,
-                reset_modulation_msg,
-                reset_pan_msg,
-                reset_all_controllers_msg,
-                all_notes_off_msg,
-            ]
-            + note_off_msgs
-        )
+        send_message = self._send_message
+
+        for reset_bytes in RESET_CONTROLLER_BYTES:
+            send_message(reset_bytes)
+        if all_notes:
+            for note_off_bytes in ALL_NOTE_OFF_BYTES:
+                send_message(note_off_bytes)
+        else:
+            for channel, note in zip(*np.nonzero(self.sounding_notes)):
+                send_message(ALL_NOTE_OFF_BYTES[channel * 128 + note])
+        self.sounding_notes[:] = False
 
 
 def get_available_midi_output_names():
@@ -0,0 +1,400 @@
+import heapq
+import io
+import mmap
+import struct
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import Generator, Iterator, Optional, Union
+
+import numpy as np
+from mido import MidiFile
+
+from henon2midi.henon_equations import DEFAULT_BATCH_SIZE
+from henon2midi.midi import (
+    CONTROL_CHANGE,
+    DEFAULT_TEMPO,
+    MIDI_EVENT_DTYPE,
+    MIDI_MESSAGE_LENGTHS,
+    MidiMessagePlayer,
+)
+
+PROGRAM_CHANGE = 0xC0
+META_EVENT = 0xFF
+META_MARKER = 0x06
+META_END_OF_TRACK = 0x2F
+META_SET_TEMPO = 0x51
+SYSEX_EVENTS = (0xF0, 0xF7)
+
+CHUNK_HEADER = struct.Struct(">4sI")
+MIDI_FILE_HEADER = struct.Struct(">HHH")
+
+ORBIT_MARKER_LABEL = "orbit"
+
+# A chunk following the track chunks that indexes the orbit markers of a file. Standard MIDI file
+# readers skip chunks of unknown types.
+ORBIT_INDEX_CHUNK_TYPE = b"HNoi"
+# orbit, track, tick of the orbit marker, file offset of the event after it and the tempo at it
+ORBIT_INDEX_ENTRY = struct.Struct(">IHQQI")
+
+ByteBuffer = Union[bytes, mmap.mmap]
+
+
+def format_orbit_marker(orbit: int, radius: float) -> str:
+    return f"{ORBIT_MARKER_LABEL} {orbit} radius {radius!r}"
+
+
+def parse_orbit_marker(text: str) -> Optional[tuple[int, float]]:
+    """
+    Returns the orbit index and radius of a marker written by format_orbit_marker, or None for any
+    other marker text.
+    """
+    prefix, _, fields = text.partition(" ")
+    if prefix != ORBIT_MARKER_LABEL:
+        return None
+    try:
+        orbit, label, radius = fields.split(" ")
+        if label != "radius":
+            return None
+        return int(orbit), float(radius)
+    except ValueError:
+        return None
+
+
+def read_variable_length_quantity(data: ByteBuffer, position: int) -> tuple[int, int]:
+    value = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, position
+
+
+# An event read from a track: absolute tick, status byte, meta type (0 unless a meta event), data and
+# the offset of the next event.
+TrackEvent = tuple[int, int, int, bytes, int]
+
+
+def iterate_chunks(data: ByteBuffer) -> Iterator[tuple[bytes, int, int]]:
+    """
+    Yields the type, data offset and data end offset of each chunk of a standard MIDI file.
+    """
+    position = 0
+    while position + CHUNK_HEADER.size <= len(data):
+        chunk_type, length = CHUNK_HEADER.unpack_from(data, position)
+        position += CHUNK_HEADER.size
+        yield chunk_type, position, min(position + length, len(data))
+        position += length
+
+
+def iterate_track_events(
+    data: ByteBuffer, position: int, end: int, tick: int = 0
+) -> Iterator[TrackEvent]:
+    """
+    Reads the events of one track chunk lazily from position, resolving running status. When starting
+    part way through a track, position must follow a meta or sysex event and tick must be its tick.
+    """
+    running_status = 0
+    while position < end:
+        delta, position = read_variable_length_quantity(data, position)
+        tick += delta
+        status = data[position]
+        if status & 0x80:
+            position += 1
+        elif running_status:
+            status = running_status
+        else:
+            raise ValueError(f"Data byte without running status at offset {position}")
+
+        if status == META_EVENT:
+            meta_type = data[position]
+            length, position = read_variable_length_quantity(data, position + 1)
+            payload_end = position + length
+            yield tick, status, meta_type, data[position:payload_end], payload_end
+            position = payload_end
+            running_status = 0
+        elif status in SYSEX_EVENTS:
+            length, position = read_variable_length_quantity(data, position)
+            payload_end = position + length
+            yield tick, status, 0, data[position:payload_end], payload_end
+            position = payload_end
+            running_status = 0
+        elif MIDI_MESSAGE_LENGTHS[status]:
+            payload_end = position + int(MIDI_MESSAGE_LENGTHS[status]) - 1
+            yield tick, status, 0, data[position:payload_end], payload_end
+            position = payload_end
+            running_status = status if status < 0xF0 else 0
+        else:
+            raise ValueError(f"Undefined status byte {status:#x} at offset {position}")
+
+
+@dataclass(frozen=True)
+class OrbitIndexEntry:
+    orbit: int
+    track: int
+    tick: int
+    offset: int
+    tempo: int
+
+
+def build_orbit_index(
+    data: ByteBuffer, track_ranges: list[tuple[int, int]]
+) -> list[OrbitIndexEntry]:
+    """
+    Reads every orbit marker of a standard MIDI file into orbit index entries, in order of tick.
+    """
+    tempo = DEFAULT_TEMPO
+    orbit_index = []
+    tagged_track_events = (
+        ((event, track) for event in iterate_track_events(data, start, end))
+        for track, (start, end) in enumerate(track_ranges)
+    )
+    for (tick, status, meta_type, payload, next_position), track in heapq.merge(
+        *tagged_track_events, key=lambda tagged_event: tagged_event[0][0]
+    ):
+        if status != META_EVENT:
+            continue
+        if meta_type == META_SET_TEMPO:
+            tempo = int.from_bytes(payload, "big")
+        elif meta_type == META_MARKER:
+            marker = parse_orbit_marker(bytes(payload).decode("latin-1"))
+            if marker is not None:
+                orbit_index.append(
+                    OrbitIndexEntry(marker[0], track, tick, next_position, tempo)
+                )
+    return orbit_index
+
+
+def encode_orbit_index(orbit_index: list[OrbitIndexEntry]) -> bytes:
+    data = b"".join(
+        ORBIT_INDEX_ENTRY.pack(
+            entry.orbit, entry.track, entry.tick, entry.offset, entry.tempo
+        )
+        for entry in orbit_index
+    )
+    return CHUNK_HEADER.pack(ORBIT_INDEX_CHUNK_TYPE, len(data)) + data
+
+
+def decode_orbit_index(data: ByteBuffer) -> list[OrbitIndexEntry]:
+    return [OrbitIndexEntry(*fields) for fields in ORBIT_INDEX_ENTRY.iter_unpack(data)]
+
+
+def encode_midi_file(mid: MidiFile, orbit_index: bool = True) -> bytes:
+    """
+    Encodes a MIDI file with mido, followed by an orbit index chunk if orbit_index is set and the
+    file has orbit markers.
+    """
+    midi_file_buffer = io.BytesIO()
+    mid.save(file=midi_file_buffer)
+    data = midi_file_buffer.getvalue()
+    if orbit_index:
+        track_ranges = [
+            (start, end)
+            for chunk_type, start, end in iterate_chunks(data)
+            if chunk_type == b"MTrk"
+        ]
+        orbit_index_entries = build_orbit_index(data, track_ranges)
+        if orbit_index_entries:
+            data += encode_orbit_index(orbit_index_entries)
+    return data
+
+
+def save_midi_file(mid: MidiFile, path: str, orbit_index: bool = True):
+    """
+    Saves a MIDI file encoded by encode_midi_file.
+    """
+    data = encode_midi_file(mid, orbit_index)
+    with open(path, "wb") as midi_file:
+        midi_file.write(data)
+
+
+@dataclass(frozen=True)
+class MidiFileEventBatch:
+    """
+    Packed channel events (see MIDI_EVENT_DTYPE) all played at tempo. The delta time of the first
+    event is measured from start_tick, and trailing_ticks pass after the last event before the next
+    batch starts.
+    """
+
+    events: np.ndarray
+    tempo: int
+    start_tick: int
+    trailing_ticks: int
+
+
+class MidiFilePlaybackSource:
+    """
+    Streams the channel events of a standard MIDI file by tick, reading the memory mapped file lazily
+    instead of loading it into mido messages. Tracks are merged by tick, meta and sysex events are
+    skipped except for tempo changes, which start a new batch.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        chunks = iterate_chunks(self._data)
+        chunk_type, start, end = next(chunks, (b"", 0, 0))
+        if chunk_type != b"MThd" or end - start < MIDI_FILE_HEADER.size:
+            raise ValueError(f"Not a standard MIDI file: {path}")
+        self.format, _, division = MIDI_FILE_HEADER.unpack_from(self._data, start)
+        if division & 0x8000:
+            raise ValueError("SMPTE time division is not supported")
+        self.ticks_per_beat = division
+
+        # Byte ranges of the track chunks. Chunks of any other type are skipped.
+        self.track_ranges: list[tuple[int, int]] = []
+        self.orbit_index: dict[int, OrbitIndexEntry] = {}
+        for chunk_type, start, end in chunks:
+            if chunk_type == b"MTrk":
+                self.track_ranges.append((start, end))
+            elif chunk_type == ORBIT_INDEX_CHUNK_TYPE:
+                self.orbit_index = {
+                    entry.orbit: entry
+                    for entry in decode_orbit_index(self._data[start:end])
+                }
+
+    def events(self) -> Iterator[TrackEvent]:
+        return heapq.merge(
+            *(
+                iterate_track_events(self._data, start, end)
+                for start, end in self.track_ranges
+            ),
+            key=itemgetter(0),
+        )
+
+    def batches(
+        self,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        start_tick: int = 0,
+        start_orbit: Optional[int] = None,
+    ) -> Generator[MidiFileEventBatch, None, None]:
+        """
+        Yields the events from start_tick, or from the marker of start_orbit, onwards. When starting
+        part way through, the tempo, and the latest value of every controller and program on each
+        channel, are taken from the events skipped, so playback resumes in the same state.
+        An orbit in the orbit index is found without reading the track before it, so its controllers
+        are not restored.
+        """
+        tempo = DEFAULT_TEMPO
+        track_events = [
+            iterate_track_events(self._data, start, end)
+            for start, end in self.track_ranges
+        ]
+        if start_orbit is not None:
+            orbit_index_entry = self.orbit_index.get(start_orbit)
+            if orbit_index_entry is None:
+                start_tick = self.find_orbit_tick(start_orbit)
+            else:
+                start_tick = orbit_index_entry.tick
+                tempo = orbit_index_entry.tempo
+                track_events[orbit_index_entry.track] = iterate_track_events(
+                    self._data,
+                    orbit_index_entry.offset,
+                    self.track_ranges[orbit_index_entry.track][1],
+                    tick=orbit_index_entry.tick,
+                )
+
+        chased: dict[tuple[int, int], bytes] = {}
+        events = np.zeros(batch_size, dtype=MIDI_EVENT_DTYPE)
+        count = 0
+        batch_start_tick = start_tick
+        previous_tick = start_tick
+        seeking = start_tick > 0
+
+        for tick, status, meta_type, payload, _ in heapq.merge(
+            *track_events, key=itemgetter(0)
+        ):
+            if seeking:
+                if tick < start_tick:
+                    message_type = status & 0xF0
+                    if status == META_EVENT and meta_type == META_SET_TEMPO:
+                        tempo = int.from_bytes(payload, "big")
+                    elif message_type == CONTROL_CHANGE:
+                        chased[(status, payload[0])] = payload
+                    elif message_type == PROGRAM_CHANGE:
+                        chased[(status, 0)] = payload
+                    continue
+                seeking = False
+                for (status_byte, _), chased_payload in chased.items():
+                    if count == batch_size:
+                        yield MidiFileEventBatch(
+                            events.copy(), tempo, batch_start_tick, 0
+                        )
+                        count = 0
+                        batch_start_tick = previous_tick
+                    events[count] = (0, status_byte, *chased_payload.ljust(3, b"\0"))
+                    count += 1
+
+            if status == META_EVENT:
+                if meta_type == META_SET_TEMPO:
+                    if count or tick > previous_tick:
+                        yield MidiFileEventBatch(
+                            events[:count].copy(),
+                            tempo,
+                            batch_start_tick,
+                            tick - previous_tick,
+                        )
+                    count = 0
+                    tempo = int.from_bytes(payload, "big")
+                    batch_start_tick = previous_tick = tick
+                continue
+            if status in SYSEX_EVENTS:
+                continue
+
+            if count == batch_size:
+                yield MidiFileEventBatch(events.copy(), tempo, batch_start_tick, 0)
+                count = 0
+                batch_start_tick = previous_tick
+            events[count] = (tick - previous_tick, status, *payload.ljust(3, b"\0"))
+            count += 1
+            previous_tick = tick
+
+        yield MidiFileEventBatch(events[:count].copy(), tempo, batch_start_tick, 0)
+
+    def find_orbit_tick(self, orbit: int) -> int:
+        """
+        Returns the tick of the marker of orbit, see format_orbit_marker, from the orbit index if the
+        file has one. Raises ValueError if the file has no marker for orbit.
+        """
+        if orbit in self.orbit_index:
+            return self.orbit_index[orbit].tick
+        for tick, status, meta_type, payload, _ in self.events():
+            if status == META_EVENT and meta_type == META_MARKER:
+                marker = parse_orbit_marker(payload.decode("latin-1"))
+                if marker is not None and marker[0] == orbit:
+                    return tick
+        raise ValueError(f"No marker for orbit {orbit} in {self.path}")
+
+    def close(self):
+        self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def play_midi_file(
+    midi_file_playback_source: MidiFilePlaybackSource,
+    midi_message_player: MidiMessagePlayer,
+    start_tick: int = 0,
+    start_orbit: Optional[int] = None,
+):
+    """
+    Plays the events of a MIDI file from start_tick, or from the marker of start_orbit, through
+    midi_message_player, which must use the same ticks per beat as the file.
+    """
+    if midi_message_player.ticks_per_beat != midi_file_playback_source.ticks_per_beat:
+        raise ValueError(
+            "The player must use the ticks per beat of the MIDI file: "
+            f"{midi_file_playback_source.ticks_per_beat}"
+        )
+    for batch in midi_file_playback_source.batches(
+        start_tick=start_tick, start_orbit=start_orbit
+    ):
+        midi_message_player.tempo = batch.tempo
+        midi_message_player.send_events(batch.events)
+        midi_message_player.advance(batch.trailing_ticks)
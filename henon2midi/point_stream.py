@@ -0,0 +1,242 @@
+import struct
+from dataclasses import dataclass
+from typing import BinaryIO, Generator, Optional
+
+import numpy as np
+
+from henon2midi.bifurcation import BifurcationScanner
+from henon2midi.henon_equations import (
+    DEFAULT_BATCH_SIZE,
+    HenonDataBatch,
+    RadiallyExpandingHenonMappingsGenerator,
+    orbit_starting_radii,
+)
+
+POINT_STREAM_MAGIC = b"HNPS"
+POINT_STREAM_VERSION = 1
+# magic, version, float size in bytes, a parameter, iterations per orbit, starting radius, radial step,
+# and for a scan of the a parameter the last a parameter and the number of steps, which are 0 otherwise
+POINT_STREAM_HEADER = struct.Struct("<4sHHdQdddQ8x")
+POINT_STREAM_FLOAT_DTYPES = {"float32": "<f4", "float64": "<f8"}
+
+
+def point_stream_record_dtype(float_dtype: str = "float64") -> np.dtype:
+    try:
+        float_format = POINT_STREAM_FLOAT_DTYPES[float_dtype]
+    except KeyError:
+        raise ValueError(f"Unsupported point stream float dtype: {float_dtype}")
+    return np.dtype(
+        [
+            ("x", float_format),
+            ("y", float_format),
+            ("orbit", "<u4"),
+            ("iteration", "<u8"),
+        ]
+    )
+
+
+@dataclass(frozen=True)
+class PointStreamHeader:
+    a_parameter: float
+    iterations_per_orbit: int
+    starting_radius: float
+    radial_step: float
+    float_dtype: str = "float64"
+    scan_a_stop: float = 0.0
+    scan_steps: int = 0
+
+    def pack(self) -> bytes:
+        return POINT_STREAM_HEADER.pack(
+            POINT_STREAM_MAGIC,
+            POINT_STREAM_VERSION,
+            point_stream_record_dtype(self.float_dtype)["x"].itemsize,
+            self.a_parameter,
+            self.iterations_per_orbit,
+            self.starting_radius,
+            self.radial_step,
+            self.scan_a_stop,
+            self.scan_steps,
+        )
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "PointStreamHeader":
+        (
+            magic,
+            version,
+            float_size,
+            a_parameter,
+            iterations_per_orbit,
+            starting_radius,
+            radial_step,
+            scan_a_stop,
+            scan_steps,
+        ) = POINT_STREAM_HEADER.unpack(data[: POINT_STREAM_HEADER.size])
+        if magic != POINT_STREAM_MAGIC:
+            raise ValueError("Not a Henon point stream file")
+        if version != POINT_STREAM_VERSION:
+            raise ValueError(f"Unsupported point stream version: {version}")
+        return cls(
+            a_parameter=a_parameter,
+            iterations_per_orbit=iterations_per_orbit,
+            starting_radius=starting_radius,
+            radial_step=radial_step,
+            float_dtype=f"float{float_size * 8}",
+            scan_a_stop=scan_a_stop,
+            scan_steps=scan_steps,
+        )
+
+    @classmethod
+    def from_generator(
+        cls,
+        henon_mappings_generator: RadiallyExpandingHenonMappingsGenerator,
+        float_dtype: str = "float64",
+    ) -> "PointStreamHeader":
+        return cls(
+            a_parameter=henon_mappings_generator.a_parameter,
+            iterations_per_orbit=henon_mappings_generator.iterations_per_orbit,
+            starting_radius=henon_mappings_generator.starting_radius,
+            radial_step=henon_mappings_generator.radial_step,
+            float_dtype=float_dtype,
+        )
+
+    @classmethod
+    def from_scanner(
+        cls, bifurcation_scanner: BifurcationScanner, float_dtype: str = "float64"
+    ) -> "PointStreamHeader":
+        """
+        Returns the header of a point stream of a scan, with the first a parameter as a_parameter
+        and the points collected per orbit as iterations_per_orbit.
+        """
+        return cls(
+            a_parameter=bifurcation_scanner.a_start,
+            iterations_per_orbit=bifurcation_scanner.points_per_orbit,
+            starting_radius=bifurcation_scanner.starting_radius,
+            radial_step=bifurcation_scanner.radial_step,
+            float_dtype=float_dtype,
+            scan_a_stop=bifurcation_scanner.a_stop,
+            scan_steps=bifurcation_scanner.steps,
+        )
+
+    def orbit_a_parameters(self, orbit: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Returns the a parameter of each orbit of a scan, or None if the stream is not of a scan.
+        """
+        if not self.scan_steps:
+            return None
+        a_values = np.linspace(self.a_parameter, self.scan_a_stop, self.scan_steps)
+        number_of_radii = len(
+            orbit_starting_radii(self.starting_radius, self.radial_step)
+        )
+        return a_values[orbit // number_of_radii]
+
+
+class PointStreamWriter:
+    """
+    Appends batches of Henon data points to a point stream file: a fixed size header holding the
+    generator parameters followed by packed x, y, orbit and iteration records.
+    """
+
+    def __init__(self, path: str, header: PointStreamHeader):
+        self.path = path
+        self.header = header
+        self.record_dtype = point_stream_record_dtype(header.float_dtype)
+        self.points_written = 0
+        self._file: BinaryIO = open(path, "wb")
+        self._file.write(header.pack())
+
+    def write_batch(self, batch: HenonDataBatch):
+        records = np.empty(len(batch), dtype=self.record_dtype)
+        records["x"] = batch.x
+        records["y"] = batch.y
+        records["orbit"] = batch.orbit
+        records["iteration"] = batch.iteration
+        self._file.write(records.tobytes())
+        self.points_written += len(batch)
+
+    def write_generator(
+        self, henon_mappings_generator: RadiallyExpandingHenonMappingsGenerator
+    ):
+        while True:
+            batch = henon_mappings_generator.next_batch()
+            if len(batch) == 0:
+                break
+            self.write_batch(batch)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PointStreamReader:
+    """
+    Memory maps a point stream file. The number of points is derived from the file size, so files
+    from interrupted runs can still be read up to the last complete record.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as point_stream_file:
+            self.header = PointStreamHeader.unpack(
+                point_stream_file.read(POINT_STREAM_HEADER.size)
+            )
+            point_stream_file.seek(0, 2)
+            file_size = point_stream_file.tell()
+        self.record_dtype = point_stream_record_dtype(self.header.float_dtype)
+        number_of_points = (
+            file_size - POINT_STREAM_HEADER.size
+        ) // self.record_dtype.itemsize
+        self.points: np.ndarray
+        if number_of_points > 0:
+            self.points = np.memmap(
+                path,
+                dtype=self.record_dtype,
+                mode="r",
+                offset=POINT_STREAM_HEADER.size,
+                shape=(number_of_points,),
+            )
+        else:
+            self.points = np.empty(0, dtype=self.record_dtype)
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def batches(
+        self, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> Generator[HenonDataBatch, None, None]:
+        previous_orbit = -1
+        for start in range(0, len(self.points), batch_size):
+            stop = start + batch_size
+            records = self.points[start:stop]
+            orbit = records["orbit"].astype(np.int64)
+            new_orbit = np.empty(len(records), dtype=bool)
+            new_orbit[0] = orbit[0] != previous_orbit
+            new_orbit[1:] = orbit[1:] != orbit[:-1]
+            previous_orbit = int(orbit[-1])
+            yield HenonDataBatch(
+                x=records["x"].astype(np.float64),
+                y=records["y"].astype(np.float64),
+                orbit=orbit,
+                iteration=records["iteration"].astype(np.int64),
+                new_orbit=new_orbit,
+                a_parameter=self.header.orbit_a_parameters(orbit),
+            )
+
+
+def write_point_stream(
+    path: str,
+    henon_mappings_generator: RadiallyExpandingHenonMappingsGenerator,
+    float_dtype: str = "float64",
+) -> int:
+    """
+    Writes every remaining data point of the generator to a point stream file and returns the number
+    of points written.
+    """
+    header = PointStreamHeader.from_generator(henon_mappings_generator, float_dtype)
+    with PointStreamWriter(path, header) as point_stream_writer:
+        point_stream_writer.write_generator(henon_mappings_generator)
+    return point_stream_writer.points_written
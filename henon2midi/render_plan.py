@@ -0,0 +1,354 @@
+import json
+import math
+from dataclasses import dataclass, field, fields, replace
+from typing import Any, Callable, Mapping, Optional, Union
+
+from henon2midi.active_voices import ActiveVoiceTable
+from henon2midi.data_point_to_midi_conversion import (
+    KEYS,
+    SCALES,
+    DataPointsToMidiConverter,
+    MidiMapping,
+    compile_midi_mapping,
+)
+from henon2midi.henon_equations import RadiallyExpandingHenonMappingsGenerator
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11
+    tomllib = None  # type: ignore
+
+RENDER_CONFIG_FORMATS = ("toml", "json")
+
+
+@dataclass(frozen=True)
+class LiveParameters:
+    a_parameter: float
+    iterations_per_orbit: int
+    radial_step: float
+    bpm: int
+    notes_per_beat: int
+    x_midi_parameter_mappings: frozenset[str]
+    y_midi_parameter_mappings: frozenset[str]
+    midi_range_x: tuple[int, int]
+    midi_range_y: tuple[int, int]
+    scale: str
+    key: str
+
+
+def parse_finite_float(value: Union[str, float]) -> float:
+    parsed = float(value)
+    if not math.isfinite(parsed):
+        raise ValueError(f"expected a finite number, got {value}")
+    return parsed
+
+
+def parse_midi_parameter_mappings(value: str) -> frozenset[str]:
+    return frozenset(name for name in value.split(",") if name)
+
+
+def parse_midi_value_range(value: str) -> tuple[int, int]:
+    value_split = value.split(",")
+    if len(value_split) != 2:
+        raise ValueError("midi value range must be a comma separated list of 2 values")
+    return int(value_split[0]), int(value_split[1])
+
+
+def parse_scale(value: str) -> str:
+    if value not in SCALES:
+        raise ValueError(f"Unknown scale: {value}")
+    return value
+
+
+def parse_key(value: str) -> str:
+    if value not in KEYS:
+        raise ValueError(f"Unknown key: {value}")
+    return value
+
+
+@dataclass(frozen=True)
+class RenderPlan:
+    """
+    Everything needed to render MIDI from Henon mappings, validated when the plan is created, with
+    the MIDI mapping compiled once into midi_mapping. Every output shares the same plan and creates
+    its own generator, converter and voice table from it.
+    """
+
+    a_parameter: float = 1.0
+    iterations_per_orbit: int = 100
+    starting_radius: float = 0.0
+    radial_step: float = 0.01
+    ticks_per_beat: int = 960
+    bpm: int = 120
+    notes_per_beat: int = 4
+    x_midi_parameter_mappings: frozenset[str] = frozenset({"note"})
+    y_midi_parameter_mappings: frozenset[str] = frozenset({"velocity"})
+    source_range_x: tuple[float, float] = (-1.0, 1.0)
+    source_range_y: tuple[float, float] = (-1.0, 1.0)
+    midi_range_x: tuple[int, int] = (0, 127)
+    midi_range_y: tuple[int, int] = (0, 127)
+    default_note: int = 64
+    default_velocity: int = 64
+    scale: str = "chromatic"
+    key: str = "C"
+    duration_grid_ticks: Optional[int] = None
+    duration_mode: str = "fixed"
+    min_duration_ticks: int = 60
+    max_duration_ticks: int = 960
+    articulation: float = 1.0
+    merge_rests: bool = False
+    clip: bool = False
+    sustain: bool = False
+    max_polyphony: Optional[int] = None
+    suppress_duplicate_notes: bool = False
+    orbit_markers: bool = False
+    midi_mapping: MidiMapping = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        for name in ("iterations_per_orbit", "ticks_per_beat", "bpm", "notes_per_beat"):
+            if getattr(self, name) < 1:
+                raise ValueError(f"{name} must be at least 1: {getattr(self, name)}")
+        if self.radial_step <= 0:
+            raise ValueError(f"radial_step must be positive: {self.radial_step}")
+        for name in ("source_range_x", "source_range_y"):
+            source_range = getattr(self, name)
+            if source_range[0] >= source_range[1]:
+                raise ValueError(f"{name} must be increasing: {source_range}")
+        for name in ("midi_range_x", "midi_range_y"):
+            if not all(0 <= value <= 127 for value in getattr(self, name)):
+                raise ValueError(
+                    f"{name} must be within 0 to 127: {getattr(self, name)}"
+                )
+        for name in ("default_note", "default_velocity"):
+            if not 0 <= getattr(self, name) <= 127:
+                raise ValueError(
+                    f"{name} must be within 0 to 127: {getattr(self, name)}"
+                )
+        if not 1 <= self.min_duration_ticks <= self.max_duration_ticks:
+            raise ValueError(
+                "min_duration_ticks must be at least 1 and at most max_duration_ticks"
+            )
+        for name in ("duration_grid_ticks", "max_polyphony"):
+            if getattr(self, name) is not None and getattr(self, name) < 1:
+                raise ValueError(
+                    f"{name} must be at least 1 or None: {getattr(self, name)}"
+                )
+        object.__setattr__(
+            self,
+            "midi_mapping",
+            compile_midi_mapping(
+                duration_ticks=int(self.ticks_per_beat / self.notes_per_beat),
+                clip=self.clip,
+                x_midi_parameter_mappings=self.x_midi_parameter_mappings,
+                y_midi_parameter_mappings=self.y_midi_parameter_mappings,
+                source_range_x=self.source_range_x,
+                source_range_y=self.source_range_y,
+                midi_range_x=self.midi_range_x,
+                midi_range_y=self.midi_range_y,
+                default_note=self.default_note,
+                default_velocity=self.default_velocity,
+                scale=self.scale,
+                key=self.key,
+                duration_grid_ticks=self.duration_grid_ticks,
+                duration_mode=self.duration_mode,
+                min_duration_ticks=self.min_duration_ticks,
+                max_duration_ticks=self.max_duration_ticks,
+                articulation=self.articulation,
+                merge_rests=self.merge_rests,
+            ),
+        )
+
+    def create_generator(self) -> RadiallyExpandingHenonMappingsGenerator:
+        return RadiallyExpandingHenonMappingsGenerator(
+            a_parameter=self.a_parameter,
+            iterations_per_orbit=self.iterations_per_orbit,
+            starting_radius=self.starting_radius,
+            radial_step=self.radial_step,
+        )
+
+    def create_converter(self) -> DataPointsToMidiConverter:
+        return DataPointsToMidiConverter(self.midi_mapping)
+
+    def create_active_voice_table(self) -> Optional[ActiveVoiceTable]:
+        if self.max_polyphony is None and not self.suppress_duplicate_notes:
+            return None
+        return ActiveVoiceTable(
+            max_polyphony=self.max_polyphony,
+            suppress_duplicate_notes=self.suppress_duplicate_notes,
+        )
+
+    def live_parameters(self) -> LiveParameters:
+        return LiveParameters(
+            **{
+                live_field.name: getattr(self, live_field.name)
+                for live_field in fields(LiveParameters)
+            }
+        )
+
+    def with_live_parameters(self, live_parameters: LiveParameters) -> "RenderPlan":
+        return replace(
+            self,
+            **{
+                live_field.name: getattr(live_parameters, live_field.name)
+                for live_field in fields(LiveParameters)
+            },
+        )
+
+
+def _parse_int(value: Any) -> int:
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"expected an integer, got {value!r}")
+    return value
+
+
+def _parse_optional_int(value: Any) -> Optional[int]:
+    """
+    Parses an integer where None, or 0 as on the command line, means off.
+    """
+    if value is None:
+        return None
+    return _parse_int(value) or None
+
+
+def _parse_float(value: Any) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"expected a number, got {value!r}")
+    return parse_finite_float(value)
+
+
+def _parse_bool(value: Any) -> bool:
+    if not isinstance(value, bool):
+        raise ValueError(f"expected true or false, got {value!r}")
+    return value
+
+
+def _parse_str(value: Any) -> str:
+    if not isinstance(value, str):
+        raise ValueError(f"expected a string, got {value!r}")
+    return value
+
+
+def _parse_midi_parameter_mappings(value: Any) -> frozenset[str]:
+    if isinstance(value, str):
+        return parse_midi_parameter_mappings(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return frozenset(_parse_str(name) for name in value)
+    raise ValueError(f"expected a list of names, got {value!r}")
+
+
+def _parse_range(parse_value: Callable[[Any], Any]) -> Callable[[Any], tuple]:
+    def parse_range(value: Any) -> tuple:
+        if isinstance(value, str):
+            value = parse_midi_value_range(value)
+        if not isinstance(value, (list, tuple)) or len(value) != 2:
+            raise ValueError(f"expected a list of 2 values, got {value!r}")
+        return parse_value(value[0]), parse_value(value[1])
+
+    return parse_range
+
+
+RENDER_SETTING_PARSERS: dict[str, Callable[[Any], Any]] = {
+    "a_parameter": _parse_float,
+    "iterations_per_orbit": _parse_int,
+    "starting_radius": _parse_float,
+    "radial_step": _parse_float,
+    "ticks_per_beat": _parse_int,
+    "bpm": _parse_int,
+    "notes_per_beat": _parse_int,
+    "x_midi_parameter_mappings": _parse_midi_parameter_mappings,
+    "y_midi_parameter_mappings": _parse_midi_parameter_mappings,
+    "source_range_x": _parse_range(_parse_float),
+    "source_range_y": _parse_range(_parse_float),
+    "midi_range_x": _parse_range(_parse_int),
+    "midi_range_y": _parse_range(_parse_int),
+    "default_note": _parse_int,
+    "default_velocity": _parse_int,
+    "scale": lambda value: parse_scale(_parse_str(value)),
+    "key": lambda value: parse_key(_parse_str(value)),
+    "duration_grid_ticks": _parse_optional_int,
+    "duration_mode": _parse_str,
+    "min_duration_ticks": _parse_int,
+    "max_duration_ticks": _parse_int,
+    "articulation": _parse_float,
+    "merge_rests": _parse_bool,
+    "clip": _parse_bool,
+    "sustain": _parse_bool,
+    "max_polyphony": _parse_optional_int,
+    "suppress_duplicate_notes": _parse_bool,
+    "orbit_markers": _parse_bool,
+}
+
+
+def compile_render_plan(settings: Mapping[str, Any]) -> RenderPlan:
+    """
+    Creates a RenderPlan from a mapping of setting names to values as found in a config file, with
+    ranges and mappings given as lists or as comma separated strings. Settings that are not given
+    keep their defaults. Raises ValueError naming the setting if any is unknown or invalid.
+    """
+    values = {}
+    for name, value in settings.items():
+        if name not in RENDER_SETTING_PARSERS:
+            raise ValueError(f"Unknown render setting: {name}")
+        try:
+            values[name] = RENDER_SETTING_PARSERS[name](value)
+        except ValueError as e:
+            raise ValueError(f"Invalid render setting {name}: {e}")
+    return RenderPlan(**values)
+
+
+def load_render_config(path: str) -> dict[str, Any]:
+    """
+    Reads a render config from a TOML or JSON file, by extension.
+    """
+    config_format = path.rsplit(".", 1)[-1].lower()
+    if config_format == "json":
+        with open(path) as config_file:
+            config = json.load(config_file)
+    elif config_format == "toml":
+        if tomllib is None:
+            raise ValueError("TOML configs need Python 3.11 or later, use JSON instead")
+        with open(path, "rb") as config_file:
+            config = tomllib.load(config_file)
+    else:
+        raise ValueError(f"Unsupported config format: {config_format}")
+    if not isinstance(config, dict):
+        raise ValueError("A render config must be a table of settings")
+    return config
+
+
+def compile_render_jobs(
+    config: Mapping[str, Any], overrides: Mapping[str, Any] = {}
+) -> list[tuple[str, RenderPlan]]:
+    """
+    Compiles a render config into the output path and RenderPlan of each of its jobs, before any of
+    them is rendered. The top level settings, including the out path, apply to every job. A config
+    without a jobs list is a single job, otherwise each table in jobs is a job that overrides the
+    top level settings and must have its own out path. overrides, e.g. from the command line, take
+    precedence over the config.
+    """
+    settings = dict(config)
+    jobs = settings.pop("jobs", None)
+    if jobs is None:
+        jobs = [{}]
+    elif not isinstance(jobs, list) or not jobs:
+        raise ValueError("jobs must be a list of tables of settings")
+    render_jobs = []
+    for job_number, job in enumerate(jobs):
+        if not isinstance(job, dict):
+            raise ValueError(f"Job {job_number} must be a table of settings")
+        job_settings = {**settings, **job, **overrides}
+        out = job_settings.pop("out", "")
+        if not isinstance(out, str):
+            raise ValueError(f"Job {job_number} out must be a path")
+        if len(jobs) > 1 and "out" not in job:
+            raise ValueError(f"Job {job_number} needs its own out path")
+        try:
+            render_jobs.append((out, compile_render_plan(job_settings)))
+        except ValueError as e:
+            if len(jobs) == 1:
+                raise
+            raise ValueError(f"Job {job_number}: {e}")
+    out_paths = [out for out, _ in render_jobs]
+    if len(jobs) > 1 and len(set(out_paths)) != len(out_paths):
+        raise ValueError("Every job needs a different out path")
+    return render_jobs
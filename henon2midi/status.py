@@ -0,0 +1,142 @@
+import json
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import time
+from typing import Optional, Union, cast
+
+import numpy as np
+
+from henon2midi.control import LiveParameterController, parse_tcp_address
+from henon2midi.lookahead import MidiEventRing
+from henon2midi.midi import MidiMessagePlayer
+
+LATENESS_PERCENTILES = (50, 90, 99)
+
+
+class LiveStatus:
+    """
+    Current state and performance counters of the live loop. The live loop only assigns attributes,
+    and snapshot copies them on the reading thread, so reading the status never blocks the loop.
+    """
+
+    def __init__(
+        self,
+        midi_message_player: MidiMessagePlayer,
+        live_parameter_controller: Optional[LiveParameterController] = None,
+        midi_event_ring: Optional[MidiEventRing] = None,
+    ):
+        self.midi_message_player = midi_message_player
+        self.live_parameter_controller = live_parameter_controller
+        self.midi_event_ring = midi_event_ring
+        self.start_time = time()
+        self.points = 0
+        self.iteration = 0
+        self.orbit = 0
+        self.data_point = (0.0, 0.0)
+        self.queued_points = 0
+
+    def record_point(
+        self,
+        iteration: int,
+        orbit: int,
+        data_point: tuple[float, float],
+        queued_points: int,
+    ):
+        """
+        Called by the live loop for every data point it plays, with the number of data points
+        already generated and waiting to be played after it.
+        """
+        self.iteration = iteration
+        self.orbit = orbit
+        self.data_point = data_point
+        self.queued_points = queued_points
+        self.points += 1
+
+    def snapshot(self) -> dict:
+        midi_message_player = self.midi_message_player
+        elapsed_s = max(time() - self.start_time, 1e-9)
+        events_sent = midi_message_player.events_sent
+        lateness_s = midi_message_player.recent_lateness_s()
+        if len(lateness_s) > 0:
+            lateness_ms = np.percentile(lateness_s, LATENESS_PERCENTILES) * 1000
+            lateness = {
+                f"p{percentile}": value
+                for percentile, value in zip(LATENESS_PERCENTILES, lateness_ms.tolist())
+            }
+            lateness["max"] = float(lateness_s.max()) * 1000
+        else:
+            lateness = {}
+        status = {
+            "uptime_s": elapsed_s,
+            "iteration": self.iteration,
+            "orbit": self.orbit,
+            "data_point": list(self.data_point),
+            "points": self.points,
+            "points_per_s": self.points / elapsed_s,
+            "events": events_sent,
+            "events_per_s": events_sent / elapsed_s,
+            "lateness_ms": lateness,
+            "queued_points": self.queued_points,
+            "scheduled_ahead_s": midi_message_player.input_time
+            - (time() - midi_message_player.playback_start_time),
+        }
+        if self.live_parameter_controller is not None:
+            status["parameter_changes_applied"] = (
+                self.live_parameter_controller.changes_applied
+            )
+        if self.midi_event_ring is not None:
+            status["lookahead"] = {
+                "underruns": self.midi_event_ring.underruns,
+                "overruns": self.midi_event_ring.overruns,
+                "buffered_events": self.midi_event_ring.buffered_events,
+                "buffered_ticks": self.midi_event_ring.buffered_ticks,
+            }
+        return status
+
+
+class _StatusServerMixin:
+    live_status: LiveStatus
+
+
+class _StatusRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ("/", "/status"):
+            self.send_error(404)
+            return
+        server = cast(_StatusServerMixin, self.server)
+        body = json.dumps(server.live_status.snapshot()).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _StatusTCPServer(_StatusServerMixin, ThreadingHTTPServer):
+    pass
+
+
+class _StatusUnixServer(_StatusServerMixin, socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def start_status_server(
+    address: str, live_status: LiveStatus
+) -> socketserver.TCPServer:
+    """
+    Serves a JSON snapshot of live_status over HTTP on a background thread, at / and /status, on a
+    TCP socket for a host:port address or on a Unix socket for any other address.
+    """
+    tcp_address = parse_tcp_address(address)
+    server: Union[_StatusTCPServer, _StatusUnixServer]
+    if tcp_address is not None:
+        server = _StatusTCPServer(tcp_address, _StatusRequestHandler)
+    else:
+        server = _StatusUnixServer(address, _StatusRequestHandler)
+    server.live_status = live_status
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
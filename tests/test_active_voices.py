@@ -0,0 +1,190 @@
+import json
+
+import numpy as np
+import pytest
+from mido import Message
+
+from henon2midi.active_voices import ActiveVoiceTable
+from henon2midi.midi import pack_midi_messages
+
+
+def note_pair(note, duration=10):
+    return [
+        Message("note_on", note=note, velocity=100),
+        Message("note_off", note=note, velocity=100, time=duration),
+    ]
+
+
+def test_active_voice_table_passes_through_non_overlapping_notes():
+    active_voice_table = ActiveVoiceTable(max_polyphony=1)
+    messages = note_pair(60) + note_pair(62) + note_pair(60)
+
+    assert active_voice_table.process(messages) == messages
+    assert not active_voice_table.sounding.any()
+
+
+def test_active_voice_table_suppresses_notes_sustained_by_pedal():
+    active_voice_table = ActiveVoiceTable(suppress_duplicate_notes=True)
+    sustain_on = Message("control_change", control=64, value=127)
+
+    output = active_voice_table.process([sustain_on] + note_pair(60) + note_pair(60))
+
+    assert output == [sustain_on] + note_pair(60)
+    assert active_voice_table.sounding[0, 60]
+    assert active_voice_table.suppressed_messages == 2
+
+
+def test_active_voice_table_carries_dropped_delta_times():
+    active_voice_table = ActiveVoiceTable(suppress_duplicate_notes=True)
+    sustain_on = Message("control_change", control=64, value=127)
+    sustain_off = Message("control_change", control=64, value=0, time=5)
+
+    output = active_voice_table.process(
+        [sustain_on] + note_pair(60) + note_pair(60) + [sustain_off]
+    )
+
+    assert output[-1] == sustain_off.copy(time=15)
+    assert not active_voice_table.sounding.any()
+
+
+def test_active_voice_table_steals_oldest_voice():
+    active_voice_table = ActiveVoiceTable(max_polyphony=2)
+    sustain_on = Message("control_change", control=64, value=127)
+
+    output = active_voice_table.process(
+        [sustain_on] + note_pair(60) + note_pair(62) + note_pair(64)
+    )
+
+    assert output == [sustain_on] + note_pair(60) + note_pair(62) + [
+        Message("control_change", control=64, value=0),
+        sustain_on,
+    ] + note_pair(64)
+    assert active_voice_table.sounding[0].nonzero()[0].tolist() == [64]
+    assert active_voice_table.stolen_voices == 1
+
+
+def test_active_voice_table_steals_voice_held_by_pedal():
+    active_voice_table = ActiveVoiceTable(max_polyphony=2)
+    sustain_on = Message("control_change", control=64, value=127)
+    sustain_off = Message("control_change", control=64, value=0)
+
+    output = active_voice_table.process(
+        [sustain_on]
+        + note_pair(60)
+        + [Message("note_on", note=62, velocity=100)]
+        + [Message("note_on", note=64, velocity=100, time=10)]
+    )
+
+    assert output == [sustain_on] + note_pair(60) + [
+        Message("note_on", note=62, velocity=100),
+        sustain_off.copy(time=10),
+        sustain_on,
+        Message("note_on", note=64, velocity=100),
+    ]
+    assert active_voice_table.sounding[0].nonzero()[0].tolist() == [62, 64]
+    assert active_voice_table.key_down[0].nonzero()[0].tolist() == [62, 64]
+    assert active_voice_table.stolen_voices == 1
+
+
+def test_active_voice_table_steals_key_held_under_pedal():
+    active_voice_table = ActiveVoiceTable(max_polyphony=1)
+    sustain_on = Message("control_change", control=64, value=127)
+
+    output = active_voice_table.process(
+        [
+            sustain_on,
+            Message("note_on", note=60, velocity=100),
+            Message("note_on", note=62, velocity=100, time=10),
+        ]
+    )
+
+    assert output == [
+        sustain_on,
+        Message("note_on", note=60, velocity=100),
+        Message("note_off", note=60, velocity=0, time=10),
+        Message("control_change", control=64, value=0),
+        sustain_on,
+        Message("note_on", note=62, velocity=100),
+    ]
+    assert active_voice_table.sounding[0].nonzero()[0].tolist() == [62]
+
+
+def test_active_voice_table_steals_held_voice_with_note_off():
+    active_voice_table = ActiveVoiceTable(max_polyphony=1)
+
+    output = active_voice_table.process(
+        [
+            Message("note_on", note=60, velocity=100),
+            Message("note_on", note=62, velocity=100, time=10),
+            Message("note_off", note=60, velocity=0, time=10),
+            Message("note_off", note=62, velocity=0),
+        ]
+    )
+
+    assert output == [
+        Message("note_on", note=60, velocity=100),
+        Message("note_off", note=60, velocity=0, time=10),
+        Message("note_on", note=62, velocity=100),
+        Message("note_off", note=62, velocity=0, time=10),
+    ]
+
+
+def test_active_voice_table_release_all():
+    active_voice_table = ActiveVoiceTable()
+    active_voice_table.process([Message("note_on", note=60, velocity=100, channel=2)])
+
+    assert active_voice_table.release_all() == [
+        Message("note_off", note=60, velocity=0, channel=2)
+    ]
+    assert not active_voice_table.key_down.any()
+
+
+def test_active_voice_table_invalid_max_polyphony():
+    with pytest.raises(ValueError):
+        ActiveVoiceTable(max_polyphony=0)
+
+
+def test_active_voice_table_state_round_trip():
+    active_voice_table = ActiveVoiceTable(
+        max_polyphony=2, suppress_duplicate_notes=True
+    )
+    sustain_on = Message("control_change", control=64, value=127)
+    active_voice_table.process([sustain_on] + note_pair(60) + note_pair(62))
+    restored = ActiveVoiceTable(max_polyphony=2, suppress_duplicate_notes=True)
+
+    restored.set_state(json.loads(json.dumps(active_voice_table.get_state())))
+
+    messages = note_pair(60) + note_pair(64) + [sustain_on.copy(value=0)]
+    assert restored.process(messages) == active_voice_table.process(messages)
+    assert restored.get_state() == active_voice_table.get_state()
+
+
+def test_active_voice_table_process_events_matches_process():
+    sustain_on = Message("control_change", control=64, value=127)
+    messages = (
+        [sustain_on]
+        + note_pair(60)
+        + [Message("note_on", note=62, velocity=100, channel=1)]
+        + note_pair(60)
+        + note_pair(64)
+        + [Message("program_change", program=3, time=5)]
+        + note_pair(65)
+        + [sustain_on.copy(value=0, time=7)]
+        + [Message("note_on", note=67, velocity=100)]
+    )
+    active_voice_table = ActiveVoiceTable(
+        max_polyphony=2, suppress_duplicate_notes=True
+    )
+    events_active_voice_table = ActiveVoiceTable(
+        max_polyphony=2, suppress_duplicate_notes=True
+    )
+
+    assert np.array_equal(
+        events_active_voice_table.process_events(pack_midi_messages(messages)),
+        pack_midi_messages(active_voice_table.process(messages)),
+    )
+    assert events_active_voice_table.get_state() == active_voice_table.get_state()
+    assert np.array_equal(
+        events_active_voice_table.release_all_events(),
+        pack_midi_messages(active_voice_table.release_all()),
+    )
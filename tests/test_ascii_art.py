@@ -0,0 +1,133 @@
+import os
+import threading
+from time import sleep, time
+
+import pytest
+
+from henon2midi.ascii_art import (
+    MAX_ADAPTIVE_FPS,
+    MIN_ADAPTIVE_FPS,
+    AsciiArtCanvas,
+    AsciiArtVisualizer,
+    draw_data_batch_on_canvas,
+)
+from henon2midi.henon_equations import RadiallyExpandingHenonMappingsGenerator
+
+
+def create_batches():
+    henon_mappings_generator = RadiallyExpandingHenonMappingsGenerator(
+        1.0, iterations_per_orbit=8, starting_radius=0.1, radial_step=0.1
+    )
+    return henon_mappings_generator.next_batch(20), henon_mappings_generator.next_batch(
+        20
+    )
+
+
+def test_ascii_art_visualizer_draws_every_played_point():
+    first_batch, second_batch = create_batches()
+    frames = []
+    ascii_art_visualizer = AsciiArtVisualizer(
+        lambda state_string, art_string: frames.append((state_string, art_string)),
+        size=(40, 20),
+    )
+
+    ascii_art_visualizer.show(first_batch)
+    for position in range(10):
+        ascii_art_visualizer.play(position)
+    ascii_art_visualizer.show(second_batch)
+    for position in range(5):
+        ascii_art_visualizer.play(position)
+    ascii_art_visualizer.close()
+
+    expected_canvas = AsciiArtCanvas(40, 20)
+    draw_data_batch_on_canvas(first_batch[:10], expected_canvas)
+    draw_data_batch_on_canvas(second_batch[:5], expected_canvas)
+    assert ascii_art_visualizer.points_drawn == 15
+    assert frames[-1][1] == expected_canvas.generate_string()
+    assert f"Current iteration: {second_batch.iteration[4]}\n" in frames[-1][0]
+    assert ascii_art_visualizer.frames == len(frames)
+
+
+def test_ascii_art_visualizer_without_art():
+    first_batch, _ = create_batches()
+    frames = []
+    ascii_art_visualizer = AsciiArtVisualizer(
+        lambda state_string, art_string: frames.append(art_string),
+        draw_art=False,
+        size=(40, 20),
+    )
+
+    ascii_art_visualizer.show(first_batch)
+    ascii_art_visualizer.play(0)
+    ascii_art_visualizer.close()
+
+    assert frames[-1] == ""
+    assert ascii_art_visualizer.points_drawn == 1
+
+
+def test_ascii_art_visualizer_never_blocks_the_loop():
+    first_batch, second_batch = create_batches()
+    screen_released = threading.Event()
+    ascii_art_visualizer = AsciiArtVisualizer(
+        lambda state_string, art_string: screen_released.wait(), size=(40, 20)
+    )
+
+    start_time = time()
+    for _ in range(100):
+        for batch in (first_batch, second_batch):
+            ascii_art_visualizer.show(batch)
+            for position in range(len(batch)):
+                ascii_art_visualizer.play(position)
+    elapsed_s = time() - start_time
+    screen_released.set()
+    ascii_art_visualizer.close()
+
+    assert elapsed_s < 0.5
+
+
+def test_ascii_art_visualizer_adapts_its_frame_rate():
+    ascii_art_visualizer = AsciiArtVisualizer(
+        lambda state_string, art_string: sleep(0.02), size=(40, 20)
+    )
+    sleep(0.5)
+    ascii_art_visualizer.close()
+
+    assert 1 / MAX_ADAPTIVE_FPS < ascii_art_visualizer.frame_interval_s
+    assert ascii_art_visualizer.frame_interval_s <= 1 / MIN_ADAPTIVE_FPS
+    assert ascii_art_visualizer.frame_time_s > 0.005
+
+
+def test_ascii_art_visualizer_fixed_frame_rate():
+    ascii_art_visualizer = AsciiArtVisualizer(
+        lambda state_string, art_string: None, fps=5, size=(40, 20)
+    )
+    ascii_art_visualizer.close()
+
+    assert ascii_art_visualizer.frame_interval_s == 0.2
+    with pytest.raises(ValueError):
+        AsciiArtVisualizer(lambda state_string, art_string: None, fps=0)
+
+
+def test_ascii_art_visualizer_fits_the_terminal(mocker):
+    mocker.patch(
+        "henon2midi.ascii_art.shutil.get_terminal_size",
+        return_value=os.terminal_size((100, 60)),
+    )
+    ascii_art_visualizer = AsciiArtVisualizer(
+        lambda state_string, art_string: None, reserved_lines=20
+    )
+    ascii_art_visualizer.close()
+
+    assert ascii_art_visualizer.canvas_size() == (99, 34)
+    assert ascii_art_visualizer.canvas is not None
+    assert ascii_art_visualizer.canvas.width == 99
+
+
+def test_ascii_art_visualizer_raises_drawing_errors_on_close():
+    def refresh_screen(state_string, art_string):
+        raise OSError("terminal gone")
+
+    ascii_art_visualizer = AsciiArtVisualizer(refresh_screen, size=(40, 20))
+
+    with pytest.raises(OSError):
+        ascii_art_visualizer.close()
@@ -0,0 +1,106 @@
+import wave
+
+import numpy as np
+import pytest
+from mido import Message
+
+from henon2midi.audio import BlockSynthesizer, render_midi_file_to_wav
+from henon2midi.midi import create_midi_file_from_messages
+
+
+def read_wav(path):
+    with wave.open(path, "rb") as wav_file:
+        assert wav_file.getnchannels() == 1
+        assert wav_file.getsampwidth() == 2
+        sample_rate = wav_file.getframerate()
+        frames = wav_file.readframes(wav_file.getnframes())
+    return sample_rate, np.frombuffer(frames, dtype="<i2")
+
+
+def test_render_midi_file_to_wav(tmp_path):
+    path = str(tmp_path / "henon.wav")
+    mid = create_midi_file_from_messages(
+        [
+            Message("note_on", note=69, velocity=127),
+            Message("note_off", note=69, velocity=0, time=480),
+            Message("note_on", note=72, velocity=127, time=480),
+            Message("note_off", note=72, velocity=0, time=480),
+        ],
+        ticks_per_beat=480,
+        bpm=120,
+    )
+
+    samples_written = render_midi_file_to_wav(
+        mid, path, sample_rate=8000, block_size=256, release_seconds=0.01
+    )
+    sample_rate, samples = read_wav(path)
+
+    assert sample_rate == 8000
+    assert len(samples) == samples_written >= 3 * 4000
+    assert np.abs(samples[100:3900]).max() > 5000
+    assert np.abs(samples[4200:7900]).max() == 0
+    assert np.abs(samples[8100:11900]).max() > 5000
+
+
+def test_render_midi_file_to_wav_holds_sustained_notes(tmp_path):
+    path = str(tmp_path / "henon.wav")
+    mid = create_midi_file_from_messages(
+        [
+            Message("control_change", control=64, value=127),
+            Message("note_on", note=69, velocity=127),
+            Message("note_off", note=69, velocity=0, time=480),
+            Message("control_change", control=64, value=0, time=480),
+        ],
+        ticks_per_beat=480,
+        bpm=120,
+    )
+
+    render_midi_file_to_wav(mid, path, sample_rate=8000, release_seconds=0.01)
+    _, samples = read_wav(path)
+
+    assert np.abs(samples[4200:7900]).max() > 5000
+    assert len(samples) > 8100
+    assert np.abs(samples[8100:]).max() == 0
+
+
+def test_block_synthesizer_limits_voices():
+    synthesizer = BlockSynthesizer(sample_rate=8000, max_voices=2)
+    for note in (60, 62, 64):
+        synthesizer.note_on(note, 100, 0)
+
+    assert [voice.note for voice in synthesizer.voices] == [62, 64]
+
+
+def test_block_synthesizer_fades_out_a_stolen_voice():
+    synthesizer = BlockSynthesizer(sample_rate=8000, max_voices=1, attack_seconds=0.001)
+    synthesizer.note_on(60, 100, 0)
+    first_block = synthesizer.render_block(0, 256)
+    synthesizer.note_on(72, 100, 256)
+
+    assert [(voice.note, voice.release) for voice in synthesizer.voices] == [
+        (60, 256),
+        (72, None),
+    ]
+    second_block = synthesizer.render_block(256, 256)
+    # The stolen voice carries on from where it was rather than stopping dead, and is gone once
+    # it has faded out.
+    assert abs(second_block[0] - first_block[-1]) < 0.02
+    assert [voice.note for voice in synthesizer.voices] == [72]
+
+
+def test_block_synthesizer_steals_the_quietest_voice():
+    synthesizer = BlockSynthesizer(sample_rate=8000, max_voices=2)
+    synthesizer.note_on(60, 100, 0)
+    synthesizer.note_on(62, 30, 0)
+    synthesizer.note_on(64, 100, 400)
+
+    assert [(voice.note, voice.stolen) for voice in synthesizer.voices] == [
+        (60, False),
+        (62, True),
+        (64, False),
+    ]
+
+
+def test_block_synthesizer_unknown_waveform():
+    with pytest.raises(ValueError):
+        BlockSynthesizer(waveform="noise")
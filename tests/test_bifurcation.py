@@ -0,0 +1,184 @@
+import numpy as np
+import pytest
+
+from henon2midi.bifurcation import (
+    BifurcationScanner,
+    bifurcation_diagram_batch,
+    create_bifurcation_midi_file,
+    generate_bifurcation_midi_messages,
+    parse_scan_range,
+)
+from henon2midi.henon_equations import RadiallyExpandingHenonMappingsGenerator
+from henon2midi.render_plan import RenderPlan
+
+
+def test_bifurcation_scanner_single_step_matches_generator():
+    bifurcation_scanner = BifurcationScanner(
+        1.333,
+        1.333,
+        1,
+        transient_iterations=0,
+        points_per_orbit=100,
+        starting_radius=0.0,
+        radial_step=0.05,
+    )
+
+    [batch] = bifurcation_scanner.batches()
+
+    expected = RadiallyExpandingHenonMappingsGenerator(
+        1.333, iterations_per_orbit=100, starting_radius=0.0, radial_step=0.05
+    ).next_batch(100000)
+    assert batch.x.tobytes() == expected.x.tobytes()
+    assert batch.y.tobytes() == expected.y.tobytes()
+    assert batch.orbit.tolist() == (expected.orbit - 1).tolist()
+    assert batch.iteration.tolist() == expected.iteration.tolist()
+    assert batch.new_orbit.tolist() == expected.new_orbit.tolist()
+    assert batch.radius.tobytes() == expected.radius.tobytes()
+
+
+def test_bifurcation_scanner_discards_transient():
+    bifurcation_scanner = BifurcationScanner(
+        0.5,
+        0.5,
+        1,
+        transient_iterations=20,
+        points_per_orbit=5,
+        starting_radius=0.3,
+        radial_step=1.0,
+    )
+
+    [batch] = bifurcation_scanner.batches()
+
+    expected = RadiallyExpandingHenonMappingsGenerator(
+        0.5, iterations_per_orbit=25, starting_radius=0.3, radial_step=1.0
+    ).next_batch(25)
+    assert np.array_equal(batch.x, expected.x[20:])
+    assert batch.new_orbit.tolist() == [True, False, False, False, False]
+
+
+def test_bifurcation_scanner_blocks_match_single_block():
+    def scan(lanes):
+        bifurcation_scanner = BifurcationScanner(
+            0.0,
+            3.0,
+            50,
+            transient_iterations=50,
+            points_per_orbit=10,
+            starting_radius=0.1,
+            radial_step=0.2,
+            lanes=lanes,
+        )
+        batches = list(bifurcation_scanner.batches())
+        return len(batches), {
+            field: np.concatenate([getattr(batch, field) for batch in batches])
+            for field in ("x", "y", "orbit", "iteration", "new_orbit", "a_parameter")
+        }
+
+    number_of_blocks, fields = scan(lanes=12)
+    [(number_of_single_blocks, single_block_fields)] = [scan(lanes=1000)]
+
+    assert (number_of_blocks, number_of_single_blocks) == (25, 1)
+    for field, values in fields.items():
+        assert np.array_equal(values, single_block_fields[field])
+
+
+def test_bifurcation_scanner_leaves_out_diverging_orbits():
+    bifurcation_scanner = BifurcationScanner(
+        1.0, 1.0, 1, transient_iterations=0, points_per_orbit=200, starting_radius=0.9
+    )
+
+    [batch] = bifurcation_scanner.batches()
+
+    assert np.isfinite(batch.x).all()
+    assert len(batch) < 200
+
+
+def test_bifurcation_diagram_batch():
+    [batch] = BifurcationScanner(
+        1.0,
+        2.0,
+        3,
+        transient_iterations=0,
+        points_per_orbit=1,
+        starting_radius=0.5,
+        radial_step=1.0,
+    ).batches()
+
+    diagram_batch = bifurcation_diagram_batch(batch, 1.0, 2.0)
+
+    assert diagram_batch.x.tolist() == [-1.0, 0.0, 1.0]
+    assert np.array_equal(diagram_batch.y, batch.x)
+
+
+def test_generate_bifurcation_midi_messages():
+    bifurcation_scanner = BifurcationScanner(
+        0.2,
+        2.8,
+        20,
+        transient_iterations=10,
+        points_per_orbit=20,
+        starting_radius=0.05,
+        radial_step=0.05,
+        lanes=50,
+    )
+    render_plan = RenderPlan(
+        notes_per_beat=2, x_midi_parameter_mappings=frozenset({"note", "pan"})
+    )
+
+    steps = list(
+        generate_bifurcation_midi_messages(bifurcation_scanner, render_plan, 4)
+    )
+
+    assert len(steps) == 20
+    for messages, new_step in steps:
+        assert new_step
+        assert [msg.type for msg in messages][:1] == ["control_change"]
+        note_ons = [msg for msg in messages if msg.type == "note_on"]
+        assert 1 <= len(note_ons) <= 4
+        assert all(msg.velocity > 0 for msg in note_ons)
+        assert sum(msg.time for msg in messages) == 480
+
+
+@pytest.mark.parametrize(("clip"), [False, True])
+def test_generate_bifurcation_midi_messages_drops_out_of_range_points(clip):
+    bifurcation_scanner = BifurcationScanner(
+        1.0,
+        1.2,
+        4,
+        transient_iterations=10,
+        points_per_orbit=20,
+        starting_radius=0.05,
+        radial_step=0.05,
+        lanes=50,
+    )
+    render_plan = RenderPlan(source_range_x=(5.0, 6.0), clip=clip)
+
+    note_ons = [
+        msg
+        for messages, _ in generate_bifurcation_midi_messages(
+            bifurcation_scanner, render_plan, 4
+        )
+        for msg in messages
+        if msg.type == "note_on"
+    ]
+
+    if clip:
+        assert note_ons and all(msg.note in (0, 127) for msg in note_ons)
+    else:
+        assert note_ons == []
+
+
+def test_create_bifurcation_midi_file_rests_for_diverged_steps():
+    bifurcation_scanner = BifurcationScanner(
+        1.0, 1.0, 3, transient_iterations=2000, points_per_orbit=1, starting_radius=1.0
+    )
+
+    mid = create_bifurcation_midi_file(bifurcation_scanner, RenderPlan())
+
+    assert [msg.type for msg in mid.tracks[0] if not msg.is_meta] == []
+
+
+@pytest.mark.parametrize(("value"), ["0,1", "0,1,x"])
+def test_parse_scan_range_invalid(value):
+    with pytest.raises(ValueError):
+        parse_scan_range(value)
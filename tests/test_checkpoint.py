@@ -0,0 +1,116 @@
+import json
+import os
+
+import pytest
+
+from henon2midi.checkpoint import (
+    CheckpointWriter,
+    capture_batch_state,
+    live_parameters_from_state,
+    read_checkpoint,
+    restore_live_checkpoint,
+    write_checkpoint,
+)
+from henon2midi.control import LiveParameterController
+from henon2midi.henon_equations import RadiallyExpandingHenonMappingsGenerator
+from henon2midi.render_plan import RenderPlan
+
+
+def test_write_checkpoint_replaces_atomically(tmp_path):
+    path = str(tmp_path / "henon.checkpoint")
+
+    write_checkpoint(path, {"position": 1})
+    write_checkpoint(path, {"position": 2})
+
+    assert read_checkpoint(path) == {"version": 1, "position": 2}
+    assert os.listdir(tmp_path) == ["henon.checkpoint"]
+
+
+def test_read_checkpoint_unsupported_version(tmp_path):
+    path = tmp_path / "henon.checkpoint"
+    path.write_text(json.dumps({"version": 99}))
+
+    with pytest.raises(ValueError):
+        read_checkpoint(str(path))
+
+
+def test_checkpoint_writer_writes_latest_checkpoint(tmp_path):
+    path = str(tmp_path / "henon.checkpoint")
+    checkpoint_writer = CheckpointWriter(path, interval_s=0.0)
+
+    assert checkpoint_writer.due()
+    checkpoint_writer.submit({"position": 1})
+    checkpoint_writer.submit({"position": 2})
+    checkpoint_writer.close()
+
+    assert read_checkpoint(path)["position"] == 2
+    assert 1 <= checkpoint_writer.checkpoints_written <= 2
+
+
+def test_checkpoint_writer_not_due_within_interval(tmp_path):
+    with CheckpointWriter(str(tmp_path / "henon.checkpoint"), 60.0) as writer:
+        assert not writer.due()
+
+
+def create_live_loop(render_plan, checkpoint=None):
+    def create_converter(live_parameters):
+        return render_plan.with_live_parameters(live_parameters).create_converter()
+
+    if checkpoint is None:
+        live_parameter_controller = LiveParameterController(
+            render_plan.live_parameters(),
+            render_plan.create_generator(),
+            create_converter,
+        )
+    else:
+        live_parameter_controller = LiveParameterController(
+            live_parameters_from_state(checkpoint["live_parameters"]),
+            RadiallyExpandingHenonMappingsGenerator.from_state(checkpoint["generator"]),
+            create_converter,
+        )
+    return live_parameter_controller.active, render_plan.create_active_voice_table()
+
+
+def play(live_render_state, active_voice_table, batches, start_position=0):
+    messages = []
+    for _ in range(batches):
+        batch = live_render_state.next_batch()
+        data_points_messages = live_render_state.data_points_to_midi_converter.convert(
+            batch.x, batch.y
+        )
+        for data_point_messages in data_points_messages[:start_position]:
+            active_voice_table.process(data_point_messages)
+        for data_point_messages in data_points_messages[start_position:]:
+            messages.extend(active_voice_table.process(data_point_messages))
+        start_position = 0
+    return messages
+
+
+def test_restore_live_checkpoint_resumes_exactly(mocker):
+    render_plan = RenderPlan(
+        iterations_per_orbit=300,
+        radial_step=0.05,
+        max_polyphony=3,
+        sustain=True,
+        duration_mode="distance",
+        merge_rests=True,
+        x_midi_parameter_mappings=frozenset({"note", "pan"}),
+    )
+    live_render_state, active_voice_table = create_live_loop(render_plan)
+    play(live_render_state, active_voice_table, 2)
+    batch_state = capture_batch_state(live_render_state, active_voice_table)
+    checkpoint = json.loads(
+        json.dumps({**batch_state, "position": 100, "player_tick": 1234})
+    )
+    expected = play(live_render_state, active_voice_table, 3, start_position=100)
+
+    live_render_state, active_voice_table = create_live_loop(render_plan, checkpoint)
+    midi_message_player = mocker.Mock(tick=0)
+    position = restore_live_checkpoint(
+        checkpoint, live_render_state, active_voice_table, midi_message_player
+    )
+
+    assert position == 100
+    assert midi_message_player.tick == 1234
+    midi_message_player.set_bpm.assert_called_once_with(120)
+    assert play(live_render_state, active_voice_table, 3, position) == expected
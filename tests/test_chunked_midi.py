@@ -0,0 +1,165 @@
+import json
+
+import pytest
+from mido import Message, MetaMessage, MidiFile
+
+from henon2midi.base import generate_midi_messages_from_data_generator
+from henon2midi.chunked_midi import (
+    ChunkedMidiFileWriter,
+    encode_variable_length_quantity,
+)
+from henon2midi.henon_equations import RadiallyExpandingHenonMappingsGenerator
+
+
+def read_manifest(path_prefix):
+    with open(f"{path_prefix}.manifest.json") as manifest_file:
+        return json.load(manifest_file)
+
+
+def read_chunk_messages(tmp_path, chunk):
+    return [
+        msg
+        for msg in MidiFile(str(tmp_path / chunk["path"])).tracks[0]
+        if not msg.is_meta
+    ]
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        (0, b"\x00"),
+        (0x7F, b"\x7f"),
+        (0x80, b"\x81\x00"),
+        (0x0FFFFFFF, b"\xff\xff\xff\x7f"),
+    ],
+)
+def test_encode_variable_length_quantity(value, expected):
+    assert encode_variable_length_quantity(value) == expected
+
+
+def test_rotate_by_bars(tmp_path):
+    path_prefix = str(tmp_path / "henon")
+    with ChunkedMidiFileWriter(
+        path_prefix, ticks_per_beat=480, rotate_every=1
+    ) as chunked_midi_file_writer:
+        chunked_midi_file_writer.write(
+            [
+                Message("control_change", control=64, value=127),
+                Message("note_on", note=60, velocity=100),
+                Message("note_off", note=60, time=1920),
+                Message("note_on", note=62, velocity=90, time=960),
+            ]
+        )
+        chunked_midi_file_writer.write([Message("note_off", note=62, time=1920)])
+
+    manifest = read_manifest(path_prefix)
+    assert manifest["complete"]
+    assert [
+        (chunk["start_tick"], chunk["end_tick"]) for chunk in manifest["chunks"]
+    ] == [
+        (0, 1920),
+        (1920, 3840),
+        (3840, 4800),
+    ]
+    first_chunk, second_chunk, third_chunk = (
+        read_chunk_messages(tmp_path, chunk) for chunk in manifest["chunks"]
+    )
+    assert [msg.type for msg in first_chunk] == [
+        "control_change",
+        "note_on",
+        "note_off",
+        "control_change",
+    ]
+    assert first_chunk[2].time == 1920
+    assert [(msg.type, msg.time) for msg in second_chunk] == [
+        ("control_change", 0),
+        ("note_on", 960),
+        ("note_off", 960),
+        ("control_change", 0),
+    ]
+    assert second_chunk[2].note == 62
+    assert [(msg.type, msg.time) for msg in third_chunk] == [
+        ("control_change", 0),
+        ("note_on", 0),
+        ("note_off", 960),
+        ("control_change", 0),
+    ]
+    assert third_chunk[1].velocity == 90
+
+
+def test_end_of_track_ends_the_last_file_after_its_rest(tmp_path):
+    path_prefix = str(tmp_path / "henon")
+    with ChunkedMidiFileWriter(
+        path_prefix, ticks_per_beat=480, rotate_every=1
+    ) as chunked_midi_file_writer:
+        chunked_midi_file_writer.write(
+            [
+                Message("note_on", note=60, velocity=100),
+                Message("note_off", note=60, time=480),
+            ]
+        )
+        chunked_midi_file_writer.write([MetaMessage("end_of_track", time=1440)])
+
+    manifest = read_manifest(path_prefix)
+    assert [
+        (chunk["start_tick"], chunk["end_tick"]) for chunk in manifest["chunks"]
+    ] == [(0, 1920)]
+    track = MidiFile(str(tmp_path / manifest["chunks"][0]["path"])).tracks[0]
+    assert [msg.type for msg in track].count("end_of_track") == 1
+    assert track[-1].time == 1440
+
+
+def test_rotate_by_orbits(tmp_path):
+    path_prefix = str(tmp_path / "henon")
+    with ChunkedMidiFileWriter(
+        path_prefix, rotate_every=3, rotation_mode="orbits"
+    ) as chunked_midi_file_writer:
+        chunked_midi_file_writer.write_all(
+            generate_midi_messages_from_data_generator(
+                RadiallyExpandingHenonMappingsGenerator(
+                    a_parameter=1.6, iterations_per_orbit=5, radial_step=0.1
+                )
+            )
+        )
+
+    manifest = read_manifest(path_prefix)
+    assert [chunk["orbits"] for chunk in manifest["chunks"]] == [3, 3, 3, 1]
+    assert sum(
+        len(read_chunk_messages(tmp_path, chunk)) for chunk in manifest["chunks"]
+    ) == sum(
+        len([msg for msg in messages if not msg.is_meta])
+        for messages, _ in generate_midi_messages_from_data_generator(
+            RadiallyExpandingHenonMappingsGenerator(
+                a_parameter=1.6, iterations_per_orbit=5, radial_step=0.1
+            )
+        )
+    )
+
+
+def test_rotate_by_megabytes(tmp_path):
+    path_prefix = str(tmp_path / "henon")
+    chunked_midi_file_writer = ChunkedMidiFileWriter(
+        path_prefix, rotate_every=1, rotation_mode="megabytes"
+    )
+    chunked_midi_file_writer.bytes_per_chunk = 100
+    for _ in range(40):
+        chunked_midi_file_writer.write(
+            [
+                Message("note_on", note=60, velocity=100),
+                Message("note_off", note=60, time=240),
+            ]
+        )
+    chunked_midi_file_writer.close()
+
+    manifest = read_manifest(path_prefix)
+    assert len(manifest["chunks"]) > 1
+    assert (
+        sum(len(read_chunk_messages(tmp_path, chunk)) for chunk in manifest["chunks"])
+        == 80
+    )
+    assert not list(tmp_path.glob("*.partial"))
+
+
+def test_invalid_rotation_mode(tmp_path):
+    with pytest.raises(ValueError):
+        ChunkedMidiFileWriter(str(tmp_path / "henon"), rotation_mode="beats")
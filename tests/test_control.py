@@ -0,0 +1,190 @@
+import json
+import socket
+
+import numpy as np
+import pytest
+
+from henon2midi.control import (
+    LiveParameterController,
+    start_control_server,
+    stop_socket_server,
+)
+from henon2midi.data_point_to_midi_conversion import (
+    DataPointsToMidiConverter,
+    compile_midi_mapping,
+)
+from henon2midi.henon_equations import RadiallyExpandingHenonMappingsGenerator
+from henon2midi.render_plan import LiveParameters
+
+
+def create_converter(live_parameters):
+    return DataPointsToMidiConverter(
+        compile_midi_mapping(
+            duration_ticks=960 // live_parameters.notes_per_beat,
+            x_midi_parameter_mappings=live_parameters.x_midi_parameter_mappings,
+            y_midi_parameter_mappings=live_parameters.y_midi_parameter_mappings,
+            midi_range_x=live_parameters.midi_range_x,
+            midi_range_y=live_parameters.midi_range_y,
+            scale=live_parameters.scale,
+            key=live_parameters.key,
+        )
+    )
+
+
+@pytest.fixture
+def live_parameter_controller():
+    return LiveParameterController(
+        LiveParameters(
+            a_parameter=1.6,
+            iterations_per_orbit=10,
+            radial_step=0.1,
+            bpm=120,
+            notes_per_beat=4,
+            x_midi_parameter_mappings=frozenset({"velocity"}),
+            y_midi_parameter_mappings=frozenset({"note"}),
+            midi_range_x=(0, 127),
+            midi_range_y=(0, 127),
+            scale="chromatic",
+            key="C",
+        ),
+        RadiallyExpandingHenonMappingsGenerator(
+            a_parameter=1.6, iterations_per_orbit=10, radial_step=0.1
+        ),
+        create_converter,
+    )
+
+
+def test_take_next_without_changes(live_parameter_controller):
+    batch = live_parameter_controller.active.next_batch(8)
+
+    assert live_parameter_controller.take_next(batch, 0) is None
+    assert live_parameter_controller.changes_applied == 0
+
+
+def test_converter_change_continues_the_current_generator(live_parameter_controller):
+    generator = live_parameter_controller.active.henon_mappings_generator
+    batch = live_parameter_controller.active.next_batch(8)
+
+    live_parameter_controller.update(bpm=140, notes_per_beat=2)
+    live_render_state = live_parameter_controller.take_next(batch, 5)
+
+    assert live_render_state is live_parameter_controller.active
+    assert live_render_state.parameters.bpm == 140
+    assert (
+        live_render_state.data_points_to_midi_converter.midi_mapping.duration_ticks
+        == 480
+    )
+    assert live_render_state.henon_mappings_generator is generator
+    np.testing.assert_array_equal(live_render_state.next_batch(8).x, batch.x[5:])
+    assert live_parameter_controller.take_next(batch, 6) is None
+
+
+def test_generator_change_starts_a_new_orbit_at_the_current_radius(
+    live_parameter_controller,
+):
+    live_parameter_controller.active.next_batch(25)
+    live_parameter_controller.update(a_parameter=1.2)
+    batch = live_parameter_controller.active.next_batch(8)
+    current_radius = (
+        live_parameter_controller.active.henon_mappings_generator.current_radius
+    )
+
+    live_render_state = live_parameter_controller.take_next(batch, 0)
+
+    expected_generator = RadiallyExpandingHenonMappingsGenerator(
+        a_parameter=1.2, iterations_per_orbit=10, starting_radius=current_radius
+    )
+    np.testing.assert_array_equal(
+        live_render_state.next_batch().x[:10], expected_generator.next_batch(10).x
+    )
+    assert live_render_state.henon_mappings_generator.starting_radius == 0.1
+
+
+def test_generator_change_keeps_batch_computed_ahead_if_radius_unchanged(
+    live_parameter_controller,
+):
+    live_parameter_controller.update(a_parameter=1.2)
+    pending_batch = live_parameter_controller._next.pending_batch
+
+    live_render_state = live_parameter_controller.take_next(
+        live_parameter_controller.active.next_batch(2), 0
+    )
+
+    assert live_render_state.next_batch() is pending_batch
+
+
+def test_generator_change_catches_up_with_orbits_played_since_built(
+    live_parameter_controller,
+):
+    live_parameter_controller.update(a_parameter=1.2)
+    for _ in range(3):
+        batch = live_parameter_controller.active.next_batch(10)
+
+    live_render_state = live_parameter_controller.take_next(batch, 10)
+
+    np.testing.assert_allclose(live_render_state.next_batch().radius[:10], 0.3)
+
+
+def test_later_converter_change_keeps_pending_generator_change(
+    live_parameter_controller,
+):
+    live_parameter_controller.update(a_parameter=1.2)
+    live_parameter_controller.update(bpm=100)
+    live_render_state = live_parameter_controller.take_next(
+        live_parameter_controller.active.next_batch(8), 0
+    )
+
+    assert live_render_state.parameters.a_parameter == 1.2
+    assert live_render_state.parameters.bpm == 100
+    assert live_render_state.henon_mappings_generator.a_parameter == 1.2
+
+
+@pytest.mark.parametrize(
+    ("command", "expected_reply"),
+    [
+        ("/a_parameter 1.2", "ok"),
+        ("/a_parameter nan", "error expected a finite number, got nan"),
+        ("/radial_step inf", "error expected a finite number, got inf"),
+        ("/x_midi_parameter_mappings note,velocity", "ok"),
+        ("/midi_range_y 36,84", "ok"),
+        ("/scale klingon", "error Unknown scale: klingon"),
+        ("/bpm fast", "error invalid literal for int() with base 10: 'fast'"),
+        ("/tempo 120", "error unknown address: /tempo"),
+    ],
+)
+def test_handle_command(live_parameter_controller, command, expected_reply):
+    assert live_parameter_controller.handle_command(command) == expected_reply
+
+
+@pytest.mark.parametrize(
+    ("command"), [("/midi_range_x 1,2,3"), ("/a_parameter nan"), ("/radial_step -inf")]
+)
+def test_invalid_command_leaves_parameters_unchanged(
+    live_parameter_controller, command
+):
+    parameters = live_parameter_controller.parameters
+
+    live_parameter_controller.handle_command(command)
+    assert live_parameter_controller.parameters == parameters
+    assert (
+        live_parameter_controller.take_next(
+            live_parameter_controller.active.next_batch(8), 0
+        )
+        is None
+    )
+
+
+def test_control_server(live_parameter_controller):
+    server = start_control_server("127.0.0.1:0", live_parameter_controller)
+    try:
+        with socket.create_connection(server.server_address) as connection:
+            connection_file = connection.makefile("rw")
+            connection_file.write("/bpm 90\n/parameters\n")
+            connection_file.flush()
+            assert connection_file.readline() == "ok\n"
+            parameters = json.loads(connection_file.readline())
+    finally:
+        stop_socket_server(server)
+
+    assert parameters["bpm"] == 90
+    assert parameters["y_midi_parameter_mappings"] == ["note"]
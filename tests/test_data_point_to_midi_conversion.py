@@ -0,0 +1,222 @@
+import json
+
+import numpy as np
+import pytest
+
+from henon2midi.data_point_to_midi_conversion import (
+    DataPointsToMidiConverter,
+    compile_midi_mapping,
+    create_midi_messages_from_data_point,
+    create_midi_messages_from_data_points,
+    create_scale_note_table,
+    quantize_ticks,
+)
+from henon2midi.midi import pack_midi_messages
+
+
+@pytest.mark.parametrize(
+    ("kwargs"),
+    [
+        ({}),
+        ({"clip": True}),
+        (
+            {
+                "x_midi_parameter_mappings": {"note", "pan"},
+                "y_midi_parameter_mappings": {"velocity", "modulation"},
+                "midi_range_x": (20, 100),
+            }
+        ),
+    ],
+)
+def test_create_midi_messages_from_data_points_matches_data_point(kwargs):
+    x = np.array([-1.5, -1.0, -0.25, 0.0, 0.5, 1.0, 0.3])
+    y = np.array([0.0, 0.2, -0.9, 1.2, 0.5, -1.0, -2.0])
+
+    messages = create_midi_messages_from_data_points(x, y, duration_ticks=240, **kwargs)
+
+    assert messages == [
+        create_midi_messages_from_data_point(data_point, duration_ticks=240, **kwargs)
+        for data_point in zip(x.tolist(), y.tolist())
+    ]
+
+
+def test_create_midi_messages_from_data_points_unknown_mapping():
+    with pytest.raises(ValueError):
+        create_midi_messages_from_data_points(
+            np.zeros(1), np.zeros(1), x_midi_parameter_mappings={"wobble"}
+        )
+
+
+def test_create_scale_note_table():
+    note_table = create_scale_note_table("major", "D", (60, 72))
+
+    assert note_table[60:73].tolist() == [
+        61,
+        61,
+        62,
+        62,
+        64,
+        64,
+        66,
+        67,
+        67,
+        69,
+        69,
+        71,
+        71,
+    ]
+    assert note_table[0] == 61
+    assert note_table[127] == 71
+
+
+def test_create_scale_note_table_unknown_scale():
+    with pytest.raises(ValueError):
+        create_scale_note_table("bebop")
+
+
+@pytest.mark.parametrize(
+    ("ticks", "grid_ticks", "expected"),
+    [
+        (240, 240, 240),
+        (320, 240, 240),
+        (400, 240, 480),
+        (10, 240, 240),
+    ],
+)
+def test_quantize_ticks(ticks, grid_ticks, expected):
+    assert quantize_ticks(ticks, grid_ticks) == expected
+
+
+def test_create_midi_messages_from_data_points_quantized():
+    messages = create_midi_messages_from_data_points(
+        np.array([-1.0, 0.0, 1.0]),
+        np.array([0.0, 0.0, 0.0]),
+        duration_ticks=320,
+        scale="minor_pentatonic",
+        key="A",
+        duration_grid_ticks=240,
+    )
+
+    assert [data_point_messages[0].note for data_point_messages in messages] == [
+        0,
+        64,
+        127,
+    ]
+    assert all(data_point_messages[-1].time == 240 for data_point_messages in messages)
+
+
+def test_data_points_to_midi_converter_merges_rests():
+    data_points_to_midi_converter = DataPointsToMidiConverter(
+        compile_midi_mapping(duration_ticks=240, merge_rests=True)
+    )
+
+    first_batch = data_points_to_midi_converter.convert(
+        np.array([0.0, 2.0]), np.array([0.0, 0.0])
+    )
+    second_batch = data_points_to_midi_converter.convert(
+        np.array([3.0, 0.5]), np.array([0.0, 0.0])
+    )
+
+    assert [len(messages) for messages in first_batch + second_batch] == [2, 0, 0, 2]
+    assert second_batch[-1][0].time == 480
+    assert second_batch[-1][1].time == 240
+
+
+def test_data_points_to_midi_converter_flush():
+    data_points_to_midi_converter = DataPointsToMidiConverter(
+        compile_midi_mapping(duration_ticks=240, merge_rests=True)
+    )
+
+    data_points_to_midi_converter.convert(np.array([0.0, 2.0]), np.array([0.0, 0.0]))
+
+    assert data_points_to_midi_converter.flush() == 240
+    assert data_points_to_midi_converter.flush() == 0
+
+
+def test_data_points_to_midi_converter_distance_durations():
+    data_points_to_midi_converter = DataPointsToMidiConverter(
+        compile_midi_mapping(
+            duration_mode="distance",
+            min_duration_ticks=100,
+            max_duration_ticks=300,
+            duration_source_range=(0.0, 1.0),
+            articulation=0.5,
+        )
+    )
+
+    messages = data_points_to_midi_converter.convert(
+        np.array([0.0, 0.5, 0.5]), np.array([0.0, 0.0, 1.0])
+    )
+
+    assert [data_point_messages[1].time for data_point_messages in messages] == [
+        50,
+        100,
+        150,
+    ]
+    assert [data_point_messages[0].time for data_point_messages in messages] == [
+        0,
+        50,
+        100,
+    ]
+
+
+def test_compile_midi_mapping_invalid_options():
+    with pytest.raises(ValueError):
+        compile_midi_mapping(duration_mode="random")
+    with pytest.raises(ValueError):
+        compile_midi_mapping(articulation=1.5)
+
+
+@pytest.mark.parametrize(
+    ("settings"),
+    [
+        ({}),
+        ({"clip": True, "articulation": 0.5}),
+        ({"duration_mode": "distance", "merge_rests": True, "articulation": 0.25}),
+        (
+            {
+                "x_midi_parameter_mappings": {"note", "pan"},
+                "y_midi_parameter_mappings": {"velocity", "modulation"},
+                "source_range_x": (-0.5, 0.5),
+                "duration_grid_ticks": 120,
+                "duration_mode": "x",
+                "merge_rests": True,
+            }
+        ),
+    ],
+)
+def test_data_points_to_midi_converter_convert_events_matches_convert(settings):
+    midi_mapping = compile_midi_mapping(**settings)
+    converter = DataPointsToMidiConverter(midi_mapping)
+    events_converter = DataPointsToMidiConverter(midi_mapping)
+    rng = np.random.default_rng(0)
+
+    for number_of_points in (7, 0, 1, 50):
+        x = rng.uniform(-1.5, 1.5, number_of_points)
+        y = rng.uniform(-1.5, 1.5, number_of_points)
+        messages = converter.convert(x, y)
+        events, offsets = events_converter.convert_events(x, y)
+
+        assert np.array_equal(
+            events,
+            pack_midi_messages(
+                [msg for data_point_messages in messages for msg in data_point_messages]
+            ),
+        )
+        assert np.diff(offsets).tolist() == [
+            len(data_point_messages) for data_point_messages in messages
+        ]
+        assert events_converter.get_state() == converter.get_state()
+
+
+def test_data_points_to_midi_converter_state_round_trip():
+    x = np.array([-1.5, -1.0, -0.25, 0.0, 0.5, 1.0, 0.3])
+    y = np.array([0.0, 0.2, -0.9, 1.2, 0.5, -1.0, -2.0])
+    midi_mapping = compile_midi_mapping(duration_mode="distance", merge_rests=True)
+    converter = DataPointsToMidiConverter(midi_mapping)
+    converter.convert(x, y)
+    restored = DataPointsToMidiConverter(midi_mapping)
+
+    restored.set_state(json.loads(json.dumps(converter.get_state())))
+
+    assert restored.convert(y, x) == converter.convert(y, x)
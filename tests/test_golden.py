@@ -0,0 +1,146 @@
+import json
+import os
+
+import pytest
+
+import henon2midi.golden
+from henon2midi.golden import (
+    GOLDEN_BLOCK_SIZE,
+    check_golden_digests,
+    diff_events,
+    digest_events,
+    golden_digests,
+    golden_render_plans,
+    iterate_golden_events,
+    iterate_packable_events,
+    iterate_packed_golden_events,
+    render_golden_file,
+)
+from henon2midi.midi_file import CHUNK_HEADER, MIDI_FILE_HEADER
+from henon2midi.render_plan import RenderPlan
+
+GOLDEN_DIGESTS_PATH = os.path.join(os.path.dirname(__file__), "golden", "digests.json")
+
+
+@pytest.fixture
+def render_plans():
+    return {"small": RenderPlan(iterations_per_orbit=100, radial_step=0.05)}
+
+
+def test_golden_digests_match():
+    with open(GOLDEN_DIGESTS_PATH) as digests_file:
+        digests = json.load(digests_file)
+
+    assert check_golden_digests(digests, golden_render_plans()) == []
+    assert digests["cases"].keys() == golden_render_plans().keys()
+
+
+def test_iterate_golden_events_resolves_running_status():
+    track = bytes([0, 0x90, 60, 100, 10, 62, 100, 5, 0xFF, 0x2F, 0])
+    data = (
+        CHUNK_HEADER.pack(b"MThd", MIDI_FILE_HEADER.size)
+        + MIDI_FILE_HEADER.pack(0, 1, 960)
+        + CHUNK_HEADER.pack(b"MTrk", len(track))
+        + track
+    )
+
+    assert list(iterate_golden_events(data)) == [
+        (0, bytes([0x90, 60, 100])),
+        (10, bytes([0x90, 62, 100])),
+        (15, bytes([0xFF, 0x2F])),
+    ]
+
+
+def test_diff_events():
+    expected = [(0, b"\x90\x3c\x64"), (240, b"\x80\x3c\x00"), (240, b"\x90\x3e\x64")]
+
+    assert diff_events(expected, iter(expected)) is None
+    event_difference = diff_events(
+        expected, [(0, b"\x90\x3c\x64"), (241, b"\x80\x3c\x00")]
+    )
+    assert event_difference is not None
+    assert (event_difference.index, event_difference.tick) == (1, 240)
+    assert "80 3c 00 at tick 241" in str(event_difference)
+    event_difference = diff_events(expected, expected[:2])
+    assert event_difference is not None
+    assert event_difference.actual is None
+    assert "end of stream" in str(event_difference)
+
+
+def test_digest_events_blocks():
+    events = [(tick, b"\x90\x3c\x64") for tick in range(GOLDEN_BLOCK_SIZE + 1)]
+
+    event_stream_digest = digest_events(events)
+
+    assert (event_stream_digest.events, event_stream_digest.ticks) == (
+        GOLDEN_BLOCK_SIZE + 1,
+        GOLDEN_BLOCK_SIZE,
+    )
+    assert [tick for tick, _ in event_stream_digest.blocks] == [0, GOLDEN_BLOCK_SIZE]
+    events[-1] = (GOLDEN_BLOCK_SIZE, b"\x90\x3c\x65")
+    assert digest_events(events).first_divergent_block(event_stream_digest) == 1
+
+
+def test_check_golden_digests_locates_the_first_divergent_block(render_plans):
+    digests = golden_digests(render_plans)
+    digests["cases"]["small"]["digest"] = "0"
+    digests["cases"]["small"]["blocks"][1][1] = "0"
+
+    [mismatch] = check_golden_digests(digests, render_plans)
+
+    assert mismatch.startswith("small: ")
+    assert f"events {GOLDEN_BLOCK_SIZE} to {2 * GOLDEN_BLOCK_SIZE - 1}" in mismatch
+
+
+def test_check_golden_digests_diffs_golden_midi_files(tmp_path, render_plans):
+    digests = golden_digests(render_plans)
+    digests["cases"]["small"]["digest"] = "0"
+    other_render_plan = RenderPlan(
+        a_parameter=1.01, iterations_per_orbit=100, radial_step=0.05
+    )
+    (tmp_path / "small.mid").write_bytes(render_golden_file(other_render_plan))
+
+    [mismatch] = check_golden_digests(digests, render_plans, str(tmp_path))
+
+    assert "first difference at event " in mismatch
+
+
+def test_check_golden_digests_new_case(render_plans):
+    digests = golden_digests({})
+
+    assert check_golden_digests(digests, render_plans) == [
+        "small: no golden digest, update the golden digests"
+    ]
+
+
+def test_check_golden_digests_checks_packed_events(mocker, render_plans):
+    digests = golden_digests(render_plans)
+    iterate_packed_events = henon2midi.golden.iterate_packed_events
+    mocker.patch(
+        "henon2midi.golden.iterate_packed_events",
+        side_effect=lambda render_plan: list(iterate_packed_events(render_plan))[:-1],
+    )
+
+    assert check_golden_digests(digests, render_plans) == [
+        "small: packed events differ from the golden packed digest",
+        mocker.ANY,
+    ]
+    assert "packed events differ from the MIDI file at event " in (
+        check_golden_digests(digests, render_plans)[1]
+    )
+
+
+def test_packed_events_match_midi_file():
+    render_plan = RenderPlan(
+        iterations_per_orbit=50, radial_step=0.1, sustain=True, max_polyphony=3
+    )
+
+    assert (
+        diff_events(
+            iterate_packable_events(
+                iterate_golden_events(render_golden_file(render_plan))
+            ),
+            iterate_packed_golden_events(render_plan),
+        )
+        is None
+    )
@@ -1,3 +1,5 @@
+import json
+
 import pytest
 
 from henon2midi.henon_equations import RadiallyExpandingHenonMappingsGenerator
@@ -138,3 +140,86 @@ def test_radially_expanding_henon_mappings_generator_is_iterable():
 
     assert iter(data_point_generator) == data_point_generator
     assert (len(list(data_point_generator))) == expected_number_of_iterations
+
+
+def test_radially_expanding_henon_mappings_generator_next_batch_matches_data_points():
+    iterations_per_orbit = 7
+    starting_radius = 0.0
+    radial_step = 0.2
+    batch_generator = RadiallyExpandingHenonMappingsGenerator(
+        a_parameter=1.333,
+        iterations_per_orbit=iterations_per_orbit,
+        starting_radius=starting_radius,
+        radial_step=radial_step,
+    )
+    data_point_generator = RadiallyExpandingHenonMappingsGenerator(
+        a_parameter=1.333,
+        iterations_per_orbit=iterations_per_orbit,
+        starting_radius=starting_radius,
+        radial_step=radial_step,
+    )
+
+    batch = batch_generator.next_batch(10)
+
+    assert len(batch) == 10
+    for index in range(10):
+        data_point = data_point_generator.generate_next_data_point()
+        assert (batch.x[index], batch.y[index]) == data_point
+        assert batch.iteration[index] == data_point_generator.get_current_iteration()
+        assert (
+            batch.orbit[index] == data_point_generator.get_current_orbital_iteration()
+        )
+        assert batch.new_orbit[index] == data_point_generator.is_new_orbit()
+    assert batch_generator.get_current_iteration() == 10
+    assert batch_generator.get_current_orbital_iteration() == 2
+    assert batch_generator.get_current_data_point() == data_point
+
+
+def test_radially_expanding_henon_mappings_generator_next_batch_stops_at_end_of_sequence():
+    iterations_per_orbit = 5
+    starting_radius = 0.0
+    radial_step = 0.2
+    data_point_generator = RadiallyExpandingHenonMappingsGenerator(
+        a_parameter=1.333,
+        iterations_per_orbit=iterations_per_orbit,
+        starting_radius=starting_radius,
+        radial_step=radial_step,
+    )
+    end_radius = 1.0
+    number_of_orbits = int(end_radius / radial_step) + 1
+    expected_number_of_iterations = number_of_orbits * iterations_per_orbit
+
+    batch = data_point_generator.next_batch(expected_number_of_iterations + 10)
+
+    assert len(batch) == expected_number_of_iterations
+    assert batch.new_orbit.sum() == number_of_orbits
+    assert len(data_point_generator.next_batch(10)) == 0
+    assert data_point_generator.get_times_reset() == 0
+
+
+@pytest.mark.parametrize(("points_read"), [0, 1, 150, 1024, 1500, 2000])
+def test_radially_expanding_henon_mappings_generator_state_round_trip(points_read):
+    henon_mappings_generator = RadiallyExpandingHenonMappingsGenerator(
+        a_parameter=1.333,
+        iterations_per_orbit=1500,
+        starting_radius=0.1,
+        radial_step=0.3,
+    )
+    henon_mappings_generator.next_batch(points_read)
+
+    restored = RadiallyExpandingHenonMappingsGenerator.from_state(
+        json.loads(json.dumps(henon_mappings_generator.get_state()))
+    )
+
+    while True:
+        expected = henon_mappings_generator.next_batch(700)
+        batch = restored.next_batch(700)
+        assert batch.x.tobytes() == expected.x.tobytes()
+        assert batch.y.tobytes() == expected.y.tobytes()
+        assert batch.orbit.tolist() == expected.orbit.tolist()
+        assert batch.iteration.tolist() == expected.iteration.tolist()
+        assert batch.new_orbit.tolist() == expected.new_orbit.tolist()
+        assert batch.radius.tobytes() == expected.radius.tobytes()
+        if len(batch) == 0:
+            break
+    assert restored.get_state() == henon_mappings_generator.get_state()
@@ -0,0 +1,111 @@
+import struct
+import zlib
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+from henon2midi.ascii_art import AsciiArtCanvas, draw_data_batch_on_canvas
+from henon2midi.henon_equations import (
+    HenonDataBatch,
+    RadiallyExpandingHenonMappingsGenerator,
+)
+from henon2midi.image import DensityImage, encode_png, encode_ppm, render_henon_image
+
+
+def create_batch(x, y, orbit):
+    return HenonDataBatch(
+        x=np.array(x, dtype=np.float64),
+        y=np.array(y, dtype=np.float64),
+        orbit=np.array(orbit, dtype=np.int64),
+        iteration=np.arange(len(x), dtype=np.int64),
+        new_orbit=np.zeros(len(x), dtype=bool),
+    )
+
+
+def test_density_image_accumulates_across_batches():
+    density_image = DensityImage(width=3, height=3)
+    density_image.add_batch(create_batch([0.0, 1.0], [0.0, 1.0], [0, 0]))
+    density_image.add_batch(create_batch([0.0, 5.0], [0.0, 0.0], [1, 1]))
+
+    density = density_image.density.reshape(3, 3)
+    assert density[1, 1] == 2
+    assert density[0, 2] == 1
+    assert density.sum() == 3
+
+
+def test_density_image_rows_match_ascii_art_canvas():
+    batch = create_batch([-1.0, 0.0, 1.0], [-1.0, 0.5, 1.0], [0, 0, 0])
+    # The canvas is cleared at the first iteration of an orbit.
+    batch = replace(batch, iteration=batch.iteration + 2)
+    density_image = DensityImage(width=4, height=5)
+    ascii_art_canvas = AsciiArtCanvas(width=4, height=5)
+
+    density_image.add_batch(batch)
+    draw_data_batch_on_canvas(batch, ascii_art_canvas)
+
+    drawn_on_canvas = np.array(
+        [[cell != " " for cell in row] for row in ascii_art_canvas.canvas]
+    )
+    assert np.array_equal(density_image.density.reshape(5, 4) > 0, drawn_on_canvas)
+    assert drawn_on_canvas[4, 0] and drawn_on_canvas[0, 3]
+
+
+def test_density_image_skips_non_finite_values_when_clipping():
+    density_image = DensityImage(width=3, height=3, clip=True)
+    density_image.add_batch(create_batch([np.nan, 5.0], [0.0, 0.0], [0, 0]))
+
+    density = density_image.density.reshape(3, 3)
+    assert density[1, 2] == 1
+    assert density.sum() == 1
+
+
+def test_density_image_render_is_brightest_at_highest_density():
+    density_image = DensityImage(width=2, height=2)
+    density_image.add_batch(
+        create_batch([-1.0, -1.0, 1.0], [1.0, 1.0, -1.0], [0, 0, 0])
+    )
+
+    pixels = density_image.render()
+    assert pixels.shape == (2, 2, 3)
+    assert pixels.dtype == np.uint8
+    assert pixels[0, 0].max() == 255
+    assert 0 < pixels[1, 1].max() < 255
+    assert pixels[0, 1].max() == 0
+
+
+def test_encode_ppm():
+    pixels = np.arange(2 * 3 * 3, dtype=np.uint8).reshape(2, 3, 3)
+
+    data = encode_ppm(pixels)
+    assert data.startswith(b"P6\n3 2\n255\n")
+    assert data.endswith(pixels.tobytes())
+
+
+def test_encode_png():
+    pixels = np.arange(2 * 3 * 3, dtype=np.uint8).reshape(2, 3, 3)
+
+    data = encode_png(pixels)
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    assert data[12:16] == b"IHDR"
+    assert struct.unpack(">II", data[16:24]) == (3, 2)
+    idat_length = struct.unpack(">I", data[33:37])[0]
+    assert data[37:41] == b"IDAT"
+    scanlines = zlib.decompress(data[41 : 41 + idat_length])
+    assert scanlines == b"\x00" + pixels[0].tobytes() + b"\x00" + pixels[1].tobytes()
+
+
+def test_render_henon_image(tmp_path):
+    generator = RadiallyExpandingHenonMappingsGenerator(
+        a_parameter=1.6, iterations_per_orbit=100, starting_radius=0.1, radial_step=0.1
+    )
+    path = tmp_path / "henon.ppm"
+
+    density_image = render_henon_image(generator, str(path), width=16, height=8)
+    assert density_image.density.sum() > 0
+    assert path.read_bytes().startswith(b"P6\n16 8\n255\n")
+
+
+def test_save_unsupported_format(tmp_path):
+    with pytest.raises(ValueError):
+        DensityImage(width=2, height=2).save(str(tmp_path / "henon.gif"))
@@ -0,0 +1,146 @@
+import numpy as np
+import pytest
+from mido import Message
+
+from henon2midi.base import generate_midi_messages_from_render_plan
+from henon2midi.lookahead import LookaheadRenderer, MidiEventRing, render_events_to_ring
+from henon2midi.midi import MIDI_EVENT_DTYPE, pack_midi_messages
+from henon2midi.midi_file import META_END_OF_TRACK, META_EVENT
+from henon2midi.render_plan import RenderPlan
+
+
+@pytest.fixture
+def midi_event_ring():
+    midi_event_ring = MidiEventRing(capacity=8)
+    yield midi_event_ring
+    midi_event_ring.shared_memory.unlink()
+    midi_event_ring.close()
+
+
+def note_events(ticks: list[int]) -> np.ndarray:
+    return pack_midi_messages(
+        [
+            Message("note_on", note=note, velocity=100, time=tick)
+            for note, tick in enumerate(ticks)
+        ]
+    )
+
+
+def render_plan_messages(render_plan: RenderPlan) -> np.ndarray:
+    messages = [
+        msg
+        for data_point_messages, _ in generate_midi_messages_from_render_plan(
+            render_plan.create_generator(), render_plan
+        )
+        for msg in data_point_messages
+    ]
+    end_of_track = messages.pop()
+    assert end_of_track.type == "end_of_track"
+    return np.concatenate(
+        [
+            pack_midi_messages(messages),
+            np.array(
+                [(end_of_track.time, META_EVENT, META_END_OF_TRACK, 0, 0)],
+                dtype=MIDI_EVENT_DTYPE,
+            ),
+        ]
+    )
+
+
+def test_midi_event_ring_wraps_around(midi_event_ring):
+    assert midi_event_ring.write(note_events([10] * 5), max_ticks=1000) == 5
+    midi_event_ring.release(midi_event_ring.read(max_ticks=1000))
+    events = note_events([1, 2, 3, 4, 5, 6])
+
+    assert midi_event_ring.write(events, max_ticks=1000) == 6
+    first_part = midi_event_ring.read(max_ticks=1000)
+    midi_event_ring.release(first_part)
+    second_part = midi_event_ring.read(max_ticks=1000)
+
+    assert np.array_equal(np.concatenate([first_part, second_part]), events)
+    assert len(first_part) == 3
+    assert midi_event_ring.buffered_ticks == 15
+    midi_event_ring.release(second_part)
+    assert (midi_event_ring.buffered_events, midi_event_ring.buffered_ticks) == (0, 0)
+
+
+def test_midi_event_ring_write_limits(midi_event_ring):
+    assert midi_event_ring.write(note_events([100, 100, 100]), max_ticks=250) == 2
+    assert midi_event_ring.write(note_events([100]), max_ticks=50) == 0
+    assert midi_event_ring.write(note_events([0] * 10), max_ticks=0) == 6
+    assert midi_event_ring.buffered_events == 8
+
+
+def test_midi_event_ring_writes_one_event_longer_than_the_window_when_empty(
+    midi_event_ring,
+):
+    assert midi_event_ring.write(note_events([500, 500]), max_ticks=100) == 1
+
+
+def test_midi_event_ring_read_limits_ticks(midi_event_ring):
+    midi_event_ring.write(note_events([100, 100, 100]), max_ticks=1000)
+
+    assert len(midi_event_ring.read(max_ticks=250)) == 2
+    assert len(midi_event_ring.read(max_ticks=50)) == 1
+
+
+def test_render_events_to_ring():
+    render_plan = RenderPlan(
+        iterations_per_orbit=20, starting_radius=0.8, radial_step=0.1, sustain=True
+    )
+    midi_event_ring = MidiEventRing(capacity=1024)
+    shared_memory = midi_event_ring.shared_memory
+
+    render_events_to_ring(render_plan, midi_event_ring, lookahead_ticks=10**9)
+
+    midi_event_ring = MidiEventRing(capacity=1024, name=shared_memory.name)
+    events = midi_event_ring.read(max_ticks=10**9)
+    assert midi_event_ring.finished
+    assert np.array_equal(events, render_plan_messages(render_plan))
+    midi_event_ring.close()
+    shared_memory.unlink()
+
+
+@pytest.mark.parametrize(("ring_capacity"), [4, 1024])
+def test_lookahead_renderer_plays_every_event(mocker, ring_capacity):
+    render_plan = RenderPlan(
+        iterations_per_orbit=50,
+        starting_radius=0.5,
+        radial_step=0.05,
+        max_polyphony=4,
+        scale="major",
+    )
+    played = []
+    midi_message_player = mocker.Mock()
+    midi_message_player.send_events.side_effect = lambda events: played.append(
+        events.copy()
+    )
+
+    with LookaheadRenderer(
+        render_plan, lookahead_beats=1, ring_capacity=ring_capacity
+    ) as lookahead_renderer:
+        lookahead_renderer.play(midi_message_player)
+        assert lookahead_renderer.midi_event_ring.buffered_events == 0
+
+    events = render_plan_messages(render_plan)
+    assert np.array_equal(np.concatenate(played), events[:-1])
+    midi_message_player.advance.assert_called_once_with(int(events["tick"][-1]))
+    assert all(
+        events["tick"][1:].sum() <= lookahead_renderer.play_ticks for events in played
+    )
+
+
+def test_lookahead_renderer_reports_a_failed_render_process(mocker):
+    mocker.patch(
+        "henon2midi.render_plan.RenderPlan.create_generator",
+        side_effect=ValueError("no generator"),
+    )
+
+    with LookaheadRenderer(RenderPlan()) as lookahead_renderer:
+        with pytest.raises(RuntimeError):
+            lookahead_renderer.play(mocker.Mock())
+
+
+def test_lookahead_renderer_rejects_an_empty_window():
+    with pytest.raises(ValueError):
+        LookaheadRenderer(RenderPlan(), lookahead_beats=0)
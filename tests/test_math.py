@@ -1,6 +1,12 @@
+import numpy as np
 import pytest
 
-from henon2midi.math import rescale_number_to_range
+from henon2midi.math import (
+    RANGE_MAPPER_CACHE_SIZE,
+    RangeMapper,
+    get_range_mapper,
+    rescale_number_to_range,
+)
 
 
 @pytest.mark.parametrize(
@@ -50,3 +56,47 @@ def test_rescale_number_to_range_value_out_of_initial_range_raises_error(
 ):
     with pytest.raises(ValueError):
         rescale_number_to_range(value, initial_range, new_range, clip_value=False)
+
+
+@pytest.mark.parametrize(
+    ("mode", "expected_values", "expected_valid"),
+    [
+        ("clip", [0.0, 0.0, 63.5, 127.0, 127.0], [False, True, True, True, False]),
+        ("mask", [-63.5, 0.0, 63.5, 127.0, 190.5], [False, True, True, True, False]),
+        ("discard", [0.0, 63.5, 127.0], [False, True, True, True, False]),
+    ],
+)
+def test_range_mapper_rescale_array(mode, expected_values, expected_valid):
+    range_mapper = RangeMapper((-1.0, 1.0), (0, 127), mode=mode)
+
+    values, valid = range_mapper.rescale_array(np.array([-2.0, -1.0, 0.0, 1.0, 2.0]))
+
+    assert values.tolist() == expected_values
+    assert valid.tolist() == expected_valid
+
+
+@pytest.mark.parametrize(
+    ("mode", "value", "expected"),
+    [
+        ("clip", 0.0, (63.5, True)),
+        ("clip", 2.0, (127.0, False)),
+        ("mask", 2.0, (190.5, False)),
+    ],
+)
+def test_range_mapper_rescale(mode, value, expected):
+    assert RangeMapper((-1.0, 1.0), (0, 127), mode=mode).rescale(value) == expected
+
+
+def test_range_mapper_unknown_mode():
+    with pytest.raises(ValueError):
+        RangeMapper((-1.0, 1.0), (0, 127), mode="wrap")
+
+
+def test_get_range_mapper_cache_is_bounded():
+    for high in range(RANGE_MAPPER_CACHE_SIZE * 2):
+        get_range_mapper((-1.0, 1.0), (0, high), "clip")
+
+    assert get_range_mapper.cache_info().currsize <= RANGE_MAPPER_CACHE_SIZE
+    assert get_range_mapper((-1.0, 1.0), (0, 5), "clip") is get_range_mapper(
+        (-1.0, 1.0), (0, 5), "clip"
+    )
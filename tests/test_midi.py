@@ -1,6 +1,14 @@
+import numpy as np
 import pytest
+from mido import Message
 
-from henon2midi.midi import get_default_midi_output_name
+from henon2midi.midi import (
+    MIDI_EVENT_DTYPE,
+    RESET_CONTROLLER_BYTES,
+    MidiMessagePlayer,
+    get_default_midi_output_name,
+    pack_midi_messages,
+)
 
 
 @pytest.fixture
@@ -20,3 +28,183 @@ def test_get_default_midi_output_name(mock_get_output_names):
 def test_get_default_midi_output_name_empty(mock_get_output_names_empty):
     with pytest.raises(Exception):
         get_default_midi_output_name()
+
+
+@pytest.fixture
+def mock_sleep(mocker):
+    return mocker.patch("henon2midi.midi.sleep")
+
+
+def test_pack_midi_messages():
+    events = pack_midi_messages(
+        [
+            Message("note_on", note=60, velocity=100),
+            Message("control_change", control=1, value=20, time=10),
+            Message("program_change", program=5, time=20),
+        ]
+    )
+
+    assert events.dtype == MIDI_EVENT_DTYPE
+    assert events["tick"].tolist() == [0, 10, 20]
+    assert events["status"].tolist() == [0x90, 0xB0, 0xC0]
+    assert events["data1"].tolist() == [60, 1, 5]
+    assert events["data2"].tolist() == [100, 20, 0]
+
+
+def test_pack_midi_messages_rejects_non_channel_messages():
+    with pytest.raises(ValueError):
+        pack_midi_messages([Message("sysex", data=[1, 2, 3])])
+    with pytest.raises(ValueError):
+        pack_midi_messages([Message("sysex", data=[])])
+
+
+def test_midi_message_player_send_events_sends_system_messages_by_length(
+    mocker, mock_sleep
+):
+    midi_output = mocker.patch("henon2midi.midi.open_output").return_value
+    midi_message_player = MidiMessagePlayer("Bus 1")
+    messages = [
+        Message("clock"),
+        Message("tune_request"),
+        Message("song_select", song=3),
+        Message("songpos", pos=300),
+        Message("pitchwheel", pitch=100),
+        Message("stop"),
+    ]
+
+    midi_message_player.send_events(pack_midi_messages(messages))
+
+    sent = [bytes(call.args[0]) for call in midi_output._rt.send_message.call_args_list]
+    assert sent == [bytes(msg.bytes()) for msg in messages]
+
+
+def test_midi_message_player_send_events_rejects_unpackable_statuses(
+    mocker, mock_sleep
+):
+    midi_output = mocker.patch("henon2midi.midi.open_output").return_value
+    midi_message_player = MidiMessagePlayer("Bus 1")
+    events = np.zeros(2, dtype=MIDI_EVENT_DTYPE)
+    events["status"] = [0x90, 0xF0]
+
+    with pytest.raises(ValueError):
+        midi_message_player.send_events(events)
+    midi_output._rt.send_message.assert_not_called()
+
+
+def test_midi_message_player_send_events_writes_raw_bytes(mocker, mock_sleep):
+    midi_output = mocker.patch("henon2midi.midi.open_output").return_value
+    midi_message_player = MidiMessagePlayer("Bus 1")
+    events = pack_midi_messages(
+        [
+            Message("note_on", note=60, velocity=100),
+            Message("program_change", program=5, time=480),
+        ]
+    )
+
+    midi_message_player.send_events(memoryview(events.tobytes()))
+
+    sent = [bytes(call.args[0]) for call in midi_output._rt.send_message.call_args_list]
+    assert sent == [bytes([0x90, 60, 100]), bytes([0xC0, 5])]
+    assert midi_message_player.input_time == pytest.approx(0.25)
+    midi_output.send.assert_not_called()
+
+
+def test_midi_message_player_send_events_falls_back_to_mido_port(mocker, mock_sleep):
+    midi_output = mocker.Mock(spec=["send", "reset"])
+    mocker.patch("henon2midi.midi.open_output", return_value=midi_output)
+    midi_message_player = MidiMessagePlayer("Bus 1")
+
+    midi_message_player.send_events(
+        pack_midi_messages([Message("note_off", note=60, velocity=0, time=960)])
+    )
+
+    midi_output.send.assert_called_once_with(Message("note_off", note=60, velocity=0))
+
+
+def test_midi_message_player_send_events_keeps_last_state_of_repeated_notes(
+    mocker, mock_sleep
+):
+    mocker.patch("henon2midi.midi.open_output")
+    midi_message_player = MidiMessagePlayer("Bus 1")
+    events = pack_midi_messages(
+        [Message("note_on", note=60, velocity=100), Message("note_on", note=62)]
+        + [Message("note_off", note=60), Message("note_off", note=62)] * 20
+        + [Message("note_on", note=60, velocity=100), Message("note_on", note=62)]
+        + [Message("note_off", note=62)]
+    )
+
+    midi_message_player.send_events(events)
+
+    assert midi_message_player.sounding_notes[0].nonzero()[0].tolist() == [60]
+
+
+def test_midi_message_player_reset_turns_off_only_sounding_notes(mocker, mock_sleep):
+    midi_output = mocker.patch("henon2midi.midi.open_output").return_value
+    midi_message_player = MidiMessagePlayer("Bus 1")
+    midi_message_player.send_events(
+        pack_midi_messages(
+            [
+                Message("note_on", note=60, velocity=100),
+                Message("note_on", note=62, velocity=100, channel=3),
+                Message("note_off", note=60, velocity=0),
+            ]
+        )
+    )
+    midi_output._rt.send_message.reset_mock()
+
+    midi_message_player.reset()
+
+    sent = [bytes(call.args[0]) for call in midi_output._rt.send_message.call_args_list]
+    assert sent == RESET_CONTROLLER_BYTES + [bytes([0x83, 62, 0])]
+    assert not midi_message_player.sounding_notes.any()
+    assert midi_message_player.input_time == 0.0
+    mock_sleep.assert_not_called()
+
+
+def test_midi_message_player_reset_all_notes(mocker):
+    midi_output = mocker.patch("henon2midi.midi.open_output").return_value
+    midi_message_player = MidiMessagePlayer("Bus 1")
+
+    midi_message_player.reset(all_notes=True)
+
+    assert midi_output._rt.send_message.call_count == len(RESET_CONTROLLER_BYTES) + (
+        16 * 128
+    )
+
+
+def test_midi_message_player_records_lateness(mocker, mock_sleep):
+    mocker.patch("henon2midi.midi.open_output")
+    mocker.patch("henon2midi.midi.time", side_effect=[0.0, 0.0, 0.1, 0.3])
+    midi_message_player = MidiMessagePlayer("Bus 1", ticks_per_beat=960, bpm=120)
+    events = pack_midi_messages(
+        [
+            Message("note_on", note=60, velocity=100),
+            Message("note_off", note=60, time=480),
+        ]
+    )
+
+    midi_message_player.send_events(events)
+
+    assert midi_message_player.events_sent == 2
+    assert midi_message_player.recent_lateness_s().tolist() == pytest.approx(
+        [0.0, 0.05]
+    )
+
+
+def test_midi_message_player_tracks_tick(mocker, mock_sleep):
+    mocker.patch("henon2midi.midi.open_output")
+    midi_message_player = MidiMessagePlayer("Bus 1", ticks_per_beat=960, bpm=120)
+
+    midi_message_player.send_events(
+        pack_midi_messages(
+            [
+                Message("note_on", note=60, velocity=100, time=10),
+                Message("note_off", note=60, time=480),
+            ]
+        )
+    )
+    midi_message_player.send(Message("note_on", note=62, velocity=100, time=30))
+    midi_message_player.advance(100)
+    midi_message_player.reset()
+
+    assert midi_message_player.tick == 620
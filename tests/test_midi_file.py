@@ -0,0 +1,192 @@
+from itertools import islice
+
+import numpy as np
+import pytest
+from mido import Message, MetaMessage, MidiFile, MidiTrack
+
+from henon2midi.base import create_midi_file_from_data_generator
+from henon2midi.henon_equations import RadiallyExpandingHenonMappingsGenerator
+from henon2midi.midi_file import (
+    MidiFilePlaybackSource,
+    format_orbit_marker,
+    iterate_track_events,
+    parse_orbit_marker,
+    play_midi_file,
+    save_midi_file,
+)
+
+
+@pytest.fixture
+def midi_file_path(tmp_path):
+    mid = MidiFile(ticks_per_beat=480)
+    track = MidiTrack(
+        [
+            MetaMessage("set_tempo", tempo=400000),
+            MetaMessage("marker", text=format_orbit_marker(1, 0.1)),
+            Message("control_change", control=64, value=127),
+            Message("note_on", note=60, velocity=100),
+            Message("note_off", note=60, time=240),
+            MetaMessage("marker", text=format_orbit_marker(2, 0.2), time=10),
+            Message("control_change", control=64, value=0, time=20),
+            Message("program_change", program=3),
+            Message("note_on", note=62, velocity=90, time=30),
+            MetaMessage("set_tempo", tempo=600000, time=100),
+            Message("note_off", note=62, time=200),
+        ]
+    )
+    other_track = MidiTrack(
+        [
+            Message("note_on", channel=1, note=40, velocity=80, time=250),
+            Message("note_off", channel=1, note=40, time=500),
+        ]
+    )
+    mid.tracks.extend([track, other_track])
+    path = tmp_path / "test.mid"
+    mid.save(str(path))
+    return str(path)
+
+
+def test_orbit_marker_round_trip():
+    assert parse_orbit_marker(format_orbit_marker(12, 0.35)) == (12, 0.35)
+    assert parse_orbit_marker("orbital 12 radius 0.35") is None
+    assert parse_orbit_marker("orbit twelve radius 0.35") is None
+
+
+def test_batches_match_merged_mido_tracks(midi_file_path):
+    with MidiFilePlaybackSource(midi_file_path) as midi_file_playback_source:
+        assert midi_file_playback_source.ticks_per_beat == 480
+        batches = list(midi_file_playback_source.batches(batch_size=3))
+
+    events = np.concatenate([batch.events for batch in batches])
+    expected_ticks = []
+    expected_bytes = []
+    ticks_since_event = 0
+    for msg in MidiFile(midi_file_path).merged_track:
+        ticks_since_event += msg.time
+        if msg.type == "set_tempo":
+            # The ticks before a tempo change are returned as trailing_ticks.
+            ticks_since_event = 0
+        elif not msg.is_meta:
+            expected_ticks.append(ticks_since_event)
+            expected_bytes.append(msg.bytes())
+            ticks_since_event = 0
+
+    assert events["tick"].tolist() == expected_ticks
+    assert [
+        bytes(event[["status", "data1", "data2"]].tolist())[: len(expected_msg)]
+        for event, expected_msg in zip(events, expected_bytes)
+    ] == [bytes(msg) for msg in expected_bytes]
+    assert [batch.tempo for batch in batches][-1] == 600000
+    tempo_change_batch = [batch for batch in batches if batch.trailing_ticks][0]
+    assert tempo_change_batch.tempo == 400000
+    assert tempo_change_batch.trailing_ticks == 100
+
+
+def test_batches_from_start_tick_chase_controllers(midi_file_path):
+    with MidiFilePlaybackSource(midi_file_path) as midi_file_playback_source:
+        start_tick = midi_file_playback_source.find_orbit_tick(2)
+        batches = list(midi_file_playback_source.batches(start_tick=start_tick))
+
+    assert start_tick == 250
+    events = batches[0].events
+    assert batches[0].tempo == 400000
+    assert events["status"].tolist()[:3] == [0xB0, 0x91, 0xB0]
+    assert events["tick"].tolist()[:3] == [0, 0, 20]
+    assert events["data2"].tolist()[:3] == [127, 80, 0]
+
+
+def test_find_orbit_tick_missing(midi_file_path):
+    with MidiFilePlaybackSource(midi_file_path) as midi_file_playback_source:
+        with pytest.raises(ValueError):
+            midi_file_playback_source.find_orbit_tick(3)
+
+
+def test_not_a_midi_file(tmp_path):
+    path = tmp_path / "test.mid"
+    path.write_bytes(b"RIFF" + bytes(20))
+
+    with pytest.raises(ValueError):
+        MidiFilePlaybackSource(str(path))
+
+
+def test_iterate_track_events_lengths():
+    data = bytes([0, 0x90, 60, 100, 10, 0xC0, 5, 0, 0xF6, 0, 0xF2, 1, 2, 0, 0xF4])
+    events = iterate_track_events(data, 0, len(data))
+
+    assert [
+        (tick, status, bytes(payload))
+        for tick, status, _, payload, _ in islice(events, 4)
+    ] == [
+        (0, 0x90, bytes([60, 100])),
+        (10, 0xC0, bytes([5])),
+        (10, 0xF6, b""),
+        (10, 0xF2, bytes([1, 2])),
+    ]
+    with pytest.raises(ValueError):
+        next(events)
+
+
+def test_play_midi_file(mocker, midi_file_path):
+    midi_message_player = mocker.Mock(ticks_per_beat=480)
+
+    with MidiFilePlaybackSource(midi_file_path) as midi_file_playback_source:
+        play_midi_file(midi_file_playback_source, midi_message_player)
+
+    sent = np.concatenate(
+        [call.args[0] for call in midi_message_player.send_events.call_args_list]
+    )
+    assert len(sent) == 9
+    assert midi_message_player.tempo == 600000
+    assert [call.args[0] for call in midi_message_player.advance.call_args_list] == [
+        100,
+        0,
+    ]
+
+
+def test_play_midi_file_ticks_per_beat_mismatch(mocker, midi_file_path):
+    with MidiFilePlaybackSource(midi_file_path) as midi_file_playback_source:
+        with pytest.raises(ValueError):
+            play_midi_file(midi_file_playback_source, mocker.Mock(ticks_per_beat=960))
+
+
+@pytest.fixture
+def orbit_marked_midi_file_path(tmp_path):
+    mid = create_midi_file_from_data_generator(
+        RadiallyExpandingHenonMappingsGenerator(
+            a_parameter=1.6, iterations_per_orbit=20, radial_step=0.1
+        ),
+        orbit_markers=True,
+    )
+    path = tmp_path / "henon.mid"
+    save_midi_file(mid, str(path))
+    return str(path)
+
+
+def test_orbit_markers_are_exported(orbit_marked_midi_file_path):
+    mid = MidiFile(orbit_marked_midi_file_path)
+    markers = [msg for msg in mid.tracks[0] if msg.type == "marker"]
+
+    assert [parse_orbit_marker(marker.text) for marker in markers[:3]] == [
+        (1, 0.1),
+        (2, 0.2),
+        (3, 0.30000000000000004),
+    ]
+    assert len(mid.tracks) == 1
+
+
+def test_orbit_index(orbit_marked_midi_file_path):
+    with MidiFilePlaybackSource(
+        orbit_marked_midi_file_path
+    ) as midi_file_playback_source:
+        orbit_index = midi_file_playback_source.orbit_index
+        assert sorted(orbit_index) == list(range(1, 11))
+        assert orbit_index[1].tick == 0
+        assert orbit_index[3].tick == 2 * 20 * 240
+        assert midi_file_playback_source.find_orbit_tick(3) == orbit_index[3].tick
+
+        indexed = next(midi_file_playback_source.batches(start_orbit=3)).events
+        midi_file_playback_source.orbit_index = {}
+        scanned = next(midi_file_playback_source.batches(start_orbit=3)).events
+
+    assert indexed.tolist() == scanned[-len(indexed) :].tolist()
+    assert indexed["status"][0] == 0x90
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from henon2midi.bifurcation import BifurcationScanner
+from henon2midi.henon_equations import RadiallyExpandingHenonMappingsGenerator
+from henon2midi.point_stream import (
+    PointStreamHeader,
+    PointStreamReader,
+    PointStreamWriter,
+    write_point_stream,
+)
+
+
+def create_generator():
+    return RadiallyExpandingHenonMappingsGenerator(
+        a_parameter=1.333,
+        iterations_per_orbit=5,
+        starting_radius=0.0,
+        radial_step=0.2,
+    )
+
+
+def test_point_stream_round_trip(tmp_path):
+    path = str(tmp_path / "henon.hps")
+
+    points_written = write_point_stream(path, create_generator())
+    point_stream_reader = PointStreamReader(path)
+
+    assert len(point_stream_reader) == points_written == 30
+    assert point_stream_reader.header == PointStreamHeader(
+        a_parameter=1.333,
+        iterations_per_orbit=5,
+        starting_radius=0.0,
+        radial_step=0.2,
+    )
+    expected_batch = create_generator().next_batch(30)
+    batches = list(point_stream_reader.batches(batch_size=7))
+    assert len(batches) == 5
+    for field in ("x", "y", "orbit", "iteration", "new_orbit"):
+        assert np.array_equal(
+            np.concatenate([getattr(batch, field) for batch in batches]),
+            getattr(expected_batch, field),
+        )
+
+
+def test_point_stream_float32(tmp_path):
+    path = str(tmp_path / "henon.hps")
+
+    write_point_stream(path, create_generator(), float_dtype="float32")
+    point_stream_reader = PointStreamReader(path)
+
+    assert point_stream_reader.header.float_dtype == "float32"
+    assert point_stream_reader.points["x"].dtype == np.float32
+    assert np.allclose(
+        point_stream_reader.points["x"], create_generator().next_batch(30).x
+    )
+
+
+def test_point_stream_reader_ignores_incomplete_record(tmp_path):
+    path = str(tmp_path / "henon.hps")
+    write_point_stream(path, create_generator())
+    with open(path, "ab") as point_stream_file:
+        point_stream_file.write(b"\x00" * 5)
+
+    assert len(PointStreamReader(path)) == 30
+
+
+def test_point_stream_reader_rejects_other_files(tmp_path):
+    path = tmp_path / "henon.mid"
+    path.write_bytes(b"MThd" + b"\x00" * 100)
+
+    with pytest.raises(ValueError):
+        PointStreamReader(str(path))
+
+
+def test_point_stream_of_scan(tmp_path):
+    path = str(tmp_path / "scan.hps")
+    bifurcation_scanner = BifurcationScanner(
+        1.0,
+        2.0,
+        5,
+        transient_iterations=10,
+        points_per_orbit=3,
+        starting_radius=0.2,
+        radial_step=0.3,
+    )
+
+    with PointStreamWriter(
+        path, PointStreamHeader.from_scanner(bifurcation_scanner)
+    ) as point_stream_writer:
+        for batch in bifurcation_scanner.batches():
+            point_stream_writer.write_batch(batch)
+    point_stream_reader = PointStreamReader(path)
+
+    assert point_stream_reader.header.scan_a_stop == 2.0
+    assert point_stream_reader.header.scan_steps == 5
+    [expected_batch] = bifurcation_scanner.batches()
+    [batch] = point_stream_reader.batches()
+    assert np.array_equal(batch.a_parameter, expected_batch.a_parameter)
+    assert np.array_equal(batch.x, expected_batch.x)
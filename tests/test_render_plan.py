@@ -0,0 +1,220 @@
+import json
+
+import numpy as np
+import pytest
+from mido import MetaMessage, bpm2tempo
+
+from henon2midi.base import (
+    create_midi_file_from_data_generator,
+    create_midi_file_from_render_plan,
+)
+from henon2midi.data_point_to_midi_conversion import (
+    CONTROL_NUMBERS,
+    DataPointsToMidiConverter,
+    compile_midi_mapping,
+)
+from henon2midi.henon_equations import RadiallyExpandingHenonMappingsGenerator
+from henon2midi.render_plan import (
+    LiveParameters,
+    RenderPlan,
+    compile_render_jobs,
+    compile_render_plan,
+    load_render_config,
+)
+
+
+def test_compile_render_plan_resolves_midi_mapping():
+    render_plan = compile_render_plan(
+        {
+            "notes_per_beat": 2,
+            "x_midi_parameter_mappings": ["note", "pan"],
+            "y_midi_parameter_mappings": "velocity,modulation",
+            "midi_range_x": [20, 100],
+            "scale": "minor",
+            "duration_mode": "distance",
+            "duration_grid_ticks": 0,
+        }
+    )
+
+    midi_mapping = render_plan.midi_mapping
+    assert render_plan.midi_range_x == (20, 100)
+    assert render_plan.duration_grid_ticks is None
+    assert midi_mapping.duration_ticks == 480
+    assert midi_mapping.note_axis == "x"
+    assert midi_mapping.velocity_axis == "y"
+    assert sorted(midi_mapping.controls) == sorted(
+        [(CONTROL_NUMBERS["pan"], "x"), (CONTROL_NUMBERS["modulation"], "y")]
+    )
+    assert midi_mapping.note_table is not None
+    assert midi_mapping.duration_source_kernel is not None
+
+
+@pytest.mark.parametrize(
+    ("settings"),
+    [
+        ({"wobble": 1}),
+        ({"bpm": "fast"}),
+        ({"bpm": 0}),
+        ({"clip": 1}),
+        ({"x_midi_parameter_mappings": ["note", "wobble"]}),
+        ({"midi_range_x": [0, 200]}),
+        ({"midi_range_y": [0, 64, 127]}),
+        ({"source_range_x": [1, -1]}),
+        ({"scale": "klingon"}),
+        ({"key": "H"}),
+        ({"duration_mode": "random"}),
+        ({"articulation": 1.5}),
+        ({"min_duration_ticks": 960, "max_duration_ticks": 60}),
+    ],
+)
+def test_compile_render_plan_invalid(settings):
+    with pytest.raises(ValueError):
+        compile_render_plan(settings)
+
+
+def test_render_plan_matches_keyword_arguments():
+    render_plan = RenderPlan(
+        iterations_per_orbit=20,
+        sustain=True,
+        max_polyphony=4,
+        x_midi_parameter_mappings=frozenset({"note", "pan"}),
+        midi_range_x=(30, 90),
+        orbit_markers=True,
+    )
+
+    mid = create_midi_file_from_render_plan(render_plan.create_generator(), render_plan)
+
+    assert (
+        mid.tracks
+        == create_midi_file_from_data_generator(
+            RadiallyExpandingHenonMappingsGenerator(
+                1.0, iterations_per_orbit=20, starting_radius=0.0, radial_step=0.01
+            ),
+            sustain=True,
+            max_polyphony=4,
+            x_midi_parameter_mappings_set={"note", "pan"},
+            midi_range_x=(30, 90),
+            orbit_markers=True,
+        ).tracks
+    )
+
+
+def test_keyword_arguments_are_validated_as_render_settings():
+    with pytest.raises(ValueError, match="midi_range_x must be within 0 to 127"):
+        create_midi_file_from_data_generator(
+            RadiallyExpandingHenonMappingsGenerator(1.0, iterations_per_orbit=5),
+            midi_range_x=(0, 200),
+        )
+    with pytest.raises(ValueError, match="Invalid render setting scale"):
+        create_midi_file_from_data_generator(
+            RadiallyExpandingHenonMappingsGenerator(1.0, iterations_per_orbit=5),
+            scale="klingon",
+        )
+
+
+def test_keyword_arguments_keep_their_positions():
+    mid = create_midi_file_from_data_generator(
+        RadiallyExpandingHenonMappingsGenerator(1.0, iterations_per_orbit=5), 480, 90
+    )
+
+    assert mid.ticks_per_beat == 480
+    assert mid.tracks[0][0] == MetaMessage("set_tempo", tempo=bpm2tempo(90))
+
+
+def test_midi_file_ends_after_the_last_rest():
+    render_plan = RenderPlan(
+        iterations_per_orbit=20, radial_step=0.1, clip=True, articulation=0.5
+    )
+    data_points_to_midi_converter = render_plan.create_converter()
+    henon_mappings_generator = render_plan.create_generator()
+    while len(batch := henon_mappings_generator.next_batch()):
+        data_points_to_midi_converter.convert(batch.x, batch.y)
+
+    mid = create_midi_file_from_render_plan(render_plan.create_generator(), render_plan)
+
+    assert data_points_to_midi_converter.pending_ticks > 0
+    assert mid.tracks[0][-1] == MetaMessage(
+        "end_of_track", time=data_points_to_midi_converter.pending_ticks
+    )
+
+
+def test_render_plan_converter_matches_converter():
+    x = np.array([-1.5, -1.0, -0.25, 0.0, 0.5, 1.0, 0.3])
+    y = np.array([0.0, 0.2, -0.9, 1.2, 0.5, -1.0, -2.0])
+    render_plan = RenderPlan(scale="major", key="D", duration_mode="x")
+
+    assert render_plan.create_converter().convert(x, y) == DataPointsToMidiConverter(
+        compile_midi_mapping(
+            duration_ticks=240, scale="major", key="D", duration_mode="x"
+        )
+    ).convert(x, y)
+
+
+def test_render_plan_with_live_parameters():
+    render_plan = RenderPlan(clip=True)
+    live_parameters = render_plan.live_parameters()
+
+    changed = render_plan.with_live_parameters(
+        LiveParameters(
+            **{
+                **live_parameters.__dict__,
+                "notes_per_beat": 8,
+                "y_midi_parameter_mappings": frozenset({"velocity", "pan"}),
+            }
+        )
+    )
+
+    assert changed.clip
+    assert changed.midi_mapping.duration_ticks == 120
+    assert changed.midi_mapping.controls == ((CONTROL_NUMBERS["pan"], "y"),)
+    assert render_plan.midi_mapping.controls == ()
+
+
+def test_compile_render_jobs(tmp_path):
+    config_path = tmp_path / "jobs.toml"
+    config_path.write_text(
+        'bpm = 90\nscale = "minor"\n'
+        '[[jobs]]\nout = "a.mid"\n'
+        '[[jobs]]\nout = "b.mid"\nbpm = 100\n'
+    )
+
+    render_jobs = compile_render_jobs(
+        load_render_config(str(config_path)), {"key": "E"}
+    )
+
+    assert [(out, plan.bpm, plan.scale, plan.key) for out, plan in render_jobs] == [
+        ("a.mid", 90, "minor", "E"),
+        ("b.mid", 100, "minor", "E"),
+    ]
+
+
+def test_compile_render_jobs_single_job(tmp_path):
+    config_path = tmp_path / "job.json"
+    config_path.write_text(json.dumps({"out": "henon.mid", "a_parameter": 1.2}))
+
+    [(out, render_plan)] = compile_render_jobs(load_render_config(str(config_path)))
+
+    assert out == "henon.mid"
+    assert render_plan.a_parameter == 1.2
+
+
+@pytest.mark.parametrize(
+    ("config"),
+    [
+        ({"jobs": [{"out": "a.mid"}, {"bpm": 90}]}),
+        ({"jobs": [{"out": "a.mid"}, {"out": "a.mid"}]}),
+        ({"jobs": [{"out": "a.mid"}, {"out": "b.mid", "bpm": -1}]}),
+        ({"jobs": []}),
+    ],
+)
+def test_compile_render_jobs_invalid(config):
+    with pytest.raises(ValueError):
+        compile_render_jobs(config)
+
+
+def test_load_render_config_unsupported_format(tmp_path):
+    config_path = tmp_path / "job.yaml"
+    config_path.write_text("bpm: 90")
+
+    with pytest.raises(ValueError):
+        load_render_config(str(config_path))
@@ -0,0 +1,79 @@
+import json
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+
+from henon2midi.control import stop_socket_server
+from henon2midi.status import LiveStatus, start_status_server
+
+
+@pytest.fixture
+def midi_message_player(mocker):
+    midi_message_player = mocker.Mock()
+    midi_message_player.events_sent = 4
+    midi_message_player.recent_lateness_s.return_value = np.array(
+        [0.0, 0.001, 0.002, 0.004]
+    )
+    midi_message_player.input_time = 10.0
+    midi_message_player.playback_start_time = 0.0
+    return midi_message_player
+
+
+def test_live_status_snapshot(mocker, midi_message_player):
+    mocker.patch("henon2midi.status.time", return_value=1000.0)
+    live_status = LiveStatus(midi_message_player)
+    live_status.record_point(1, 1, (0.1, 0.2), 9)
+    live_status.record_point(2, 1, (0.3, 0.4), 8)
+    mocker.patch("henon2midi.status.time", return_value=1002.0)
+
+    status = live_status.snapshot()
+    assert status["iteration"] == 2
+    assert status["orbit"] == 1
+    assert status["data_point"] == [0.3, 0.4]
+    assert status["points"] == 2
+    assert status["points_per_s"] == pytest.approx(1.0)
+    assert status["events_per_s"] == pytest.approx(2.0)
+    assert status["queued_points"] == 8
+    assert status["lateness_ms"]["p50"] == pytest.approx(1.5)
+    assert status["lateness_ms"]["max"] == pytest.approx(4.0)
+    assert "parameter_changes_applied" not in status
+
+
+def test_live_status_snapshot_with_lookahead(mocker, midi_message_player):
+    midi_event_ring = mocker.Mock(
+        underruns=2, overruns=1, buffered_events=30, buffered_ticks=3840
+    )
+
+    status = LiveStatus(midi_message_player, midi_event_ring=midi_event_ring).snapshot()
+
+    assert status["lookahead"] == {
+        "underruns": 2,
+        "overruns": 1,
+        "buffered_events": 30,
+        "buffered_ticks": 3840,
+    }
+
+
+def test_live_status_snapshot_before_any_events(midi_message_player):
+    midi_message_player.recent_lateness_s.return_value = np.empty(0)
+
+    assert LiveStatus(midi_message_player).snapshot()["lateness_ms"] == {}
+
+
+def test_status_server(midi_message_player):
+    live_status = LiveStatus(midi_message_player)
+    live_status.record_point(5, 2, (0.1, 0.2), 0)
+    server = start_status_server("127.0.0.1:0", live_status)
+    host, port = server.server_address
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}/status") as response:
+            status = json.loads(response.read())
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://{host}:{port}/other")
+    finally:
+        stop_socket_server(server)
+
+    assert status["iteration"] == 5
+    assert status["events"] == 4